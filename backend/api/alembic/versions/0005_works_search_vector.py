@@ -0,0 +1,54 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE works ADD COLUMN IF NOT EXISTS search_vector tsvector;")
+
+    # Сгенерированная колонка не может ссылаться на authors/work_tags/work_fandoms,
+    # поэтому вектор собирает функция; normalizer вызывает её после upsert связей.
+    # Конфиг выбирается по языку работы: english для en*, иначе russian.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION public.works_search_vector(wid integer)
+        RETURNS tsvector
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT
+                setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(w.title, ''))), 'A') ||
+                setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(a.name, ''))), 'B') ||
+                setweight(to_tsvector(c.cfg, public.f_unaccent(
+                    coalesce((SELECT string_agg(wt.tag, ' ') FROM work_tags wt WHERE wt.work_id = w.id), '') || ' ' ||
+                    coalesce((SELECT string_agg(wf.fandom, ' ') FROM work_fandoms wf WHERE wf.work_id = w.id), '')
+                )), 'C') ||
+                setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(w.summary, ''))), 'D')
+            FROM works w
+            LEFT JOIN authors a ON a.id = w.author_id
+            CROSS JOIN LATERAL (
+                SELECT (CASE WHEN w.language LIKE 'en%' THEN 'english' ELSE 'russian' END)::regconfig AS cfg
+            ) c
+            WHERE w.id = wid
+        $$;
+        """
+    )
+
+    op.execute("UPDATE works SET search_vector = public.works_search_vector(id);")
+
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_works_search_vector
+        ON works USING GIN (search_vector);
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_works_search_vector;")
+    op.execute("DROP FUNCTION IF EXISTS public.works_search_vector(integer);")
+    op.execute("ALTER TABLE works DROP COLUMN IF EXISTS search_vector;")
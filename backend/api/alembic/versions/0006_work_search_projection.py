@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Денормализованная проекция для фильтров поиска: теги/фандомы/предупреждения
+    # работы одним рядом, чтобы фильтры были предикатами @> / && по GIN-индексам
+    op.create_table(
+        'work_search',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('tags', postgresql.ARRAY(sa.Text()), nullable=False, server_default='{}'),
+        sa.Column('fandoms', postgresql.ARRAY(sa.Text()), nullable=False, server_default='{}'),
+        sa.Column('warnings', postgresql.ARRAY(sa.Text()), nullable=False, server_default='{}'),
+    )
+
+    op.execute(
+        """
+        INSERT INTO work_search (work_id, tags, fandoms, warnings)
+        SELECT w.id,
+            COALESCE((SELECT array_agg(DISTINCT wt.tag) FROM work_tags wt WHERE wt.work_id = w.id), '{}'),
+            COALESCE((SELECT array_agg(DISTINCT wf.fandom) FROM work_fandoms wf WHERE wf.work_id = w.id), '{}'),
+            COALESCE((SELECT array_agg(DISTINCT ww.warning) FROM work_warnings ww WHERE ww.work_id = w.id), '{}')
+        FROM works w;
+        """
+    )
+
+    op.execute("CREATE INDEX IF NOT EXISTS idx_work_search_tags ON work_search USING GIN (tags);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_work_search_fandoms ON work_search USING GIN (fandoms);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_work_search_warnings ON work_search USING GIN (warnings);")
+
+
+def downgrade() -> None:
+    op.drop_table('work_search')
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Время последнего upsert работы — водяная отметка для инкрементального
+    # обновления in-process индексов (bitmap-индекс поиска)
+    op.add_column(
+        'works',
+        sa.Column('changed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('ix_works_changed_at', 'works', ['changed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_works_changed_at', table_name='works')
+    op.drop_column('works', 'changed_at')
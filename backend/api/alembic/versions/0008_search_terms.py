@@ -0,0 +1,49 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Словарь различных значений тегов/фандомов с частотой использования — для автодополнения
+    op.create_table(
+        'search_terms',
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=200), nullable=False),
+        sa.Column('normalized', sa.String(length=200), nullable=False),
+        sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('kind', 'value'),
+    )
+
+    op.execute(
+        """
+        INSERT INTO search_terms (kind, value, normalized, usage_count)
+        SELECT 'tag', tag, public.f_unaccent(lower(tag)), count(*) FROM work_tags GROUP BY tag
+        UNION ALL
+        SELECT 'fandom', fandom, public.f_unaccent(lower(fandom)), count(*) FROM work_fandoms GROUP BY fandom;
+        """
+    )
+
+    # префиксный поиск — btree text_pattern_ops, подстрока — триграммы (pg_trgm из 0002)
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_search_terms_prefix
+        ON search_terms (kind, normalized text_pattern_ops);
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_search_terms_trgm
+        ON search_terms USING GIN (normalized gin_trgm_ops);
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_search_terms_trgm;")
+    op.execute("DROP INDEX IF EXISTS idx_search_terms_prefix;")
+    op.drop_table('search_terms')
@@ -0,0 +1,176 @@
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+BATCH = 5000
+
+# Замороженная копия backend/parsers/dates.py на момент миграции: её повторный
+# прогон не должен зависеть от последующих правок разбора дат в приложении
+MSK = timezone(timedelta(hours=3), "MSK")
+
+# по основе слова: "января", "янв.", "январь" → 1
+_MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "мая": 5, "май": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+_UNITS = {
+    "секунд": timedelta(seconds=1), "сек": timedelta(seconds=1),
+    "минут": timedelta(minutes=1), "мин": timedelta(minutes=1),
+    "час": timedelta(hours=1),
+    "дн": timedelta(days=1), "ден": timedelta(days=1), "сутк": timedelta(days=1),
+    "недел": timedelta(weeks=1),
+    "месяц": timedelta(days=30),
+    "год": timedelta(days=365), "лет": timedelta(days=365),
+}
+
+_DAY_WORDS = {"сегодня": 0, "вчера": 1, "позавчера": 2}
+
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+_NUMERIC_RE = re.compile(r"\b(\d{1,2})\.(\d{1,2})\.(\d{2}|\d{4})\b")
+_WORDY_RE = re.compile(r"\b(\d{1,2})\s+([а-яёa-z]+)\.?(?:\s+(\d{4}))?", re.I)
+_AGO_RE = re.compile(r"(?:(\d+|[а-яё]+)\s+)?([а-яё]+)\s+назад", re.I)
+_NUMBER_WORDS = {"один": 1, "одну": 1, "одна": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5}
+
+
+def _at(d: date, text: str) -> datetime:
+    m = _TIME_RE.search(text)
+    t = time(int(m.group(1)), int(m.group(2))) if m else time(0, 0)
+    return datetime.combine(d, t, tzinfo=MSK)
+
+
+def _unit(word: str) -> Optional[timedelta]:
+    word = word.lower()
+    for stem, delta in _UNITS.items():
+        if word.startswith(stem):
+            return delta
+    return None
+
+
+def parse_ru_datetime(value: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Дата/время с часовым поясом или None, если строку разобрать не удалось."""
+    if not value:
+        return None
+    text = " ".join(str(value).split()).strip()
+    if not text:
+        return None
+    now = (now or datetime.now(MSK)).astimezone(MSK)
+
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=MSK)
+    except ValueError:
+        pass
+
+    lower = text.lower()
+    if "только что" in lower:
+        return now
+
+    for word, days_back in sorted(_DAY_WORDS.items(), key=lambda kv: -len(kv[0])):
+        if word in lower:
+            return _at(now.date() - timedelta(days=days_back), lower)
+
+    m = _AGO_RE.search(lower)
+    if m:
+        count_word, unit_word = m.group(1) or "", m.group(2)
+        if unit_word == "полчаса":
+            return now - timedelta(minutes=30)
+        delta = _unit(unit_word)
+        if delta is not None:
+            count = int(count_word) if count_word.isdigit() else _NUMBER_WORDS.get(count_word, 1)
+            return now - count * delta
+
+    m = _NUMERIC_RE.search(lower)
+    if m:
+        day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if year < 100:
+            year += 2000
+        try:
+            return _at(date(year, month, day), lower[m.end():])
+        except ValueError:
+            return None
+
+    for m in _WORDY_RE.finditer(lower):
+        month = _MONTHS.get(m.group(2)[:3])
+        if month is None:
+            continue
+        day = int(m.group(1))
+        year = int(m.group(3)) if m.group(3) else now.year
+        try:
+            result = _at(date(year, month, day), lower[m.end():])
+            # "15 декабря" без года в январе — это прошлый год
+            if not m.group(3) and result > now + timedelta(days=1):
+                result = result.replace(year=year - 1)
+        except ValueError:
+            return None
+        return result
+    return None
+
+
+def _backfill(bind) -> None:
+    # Текст со страниц ("3 марта 2023 г.", "вчера в 18:05", "2024-01-15") разбирает копия
+    # нормализатора парсеров; относительные даты — от changed_at (последний upsert).
+    # Неразборчивые значения становятся NULL.
+    select = sa.text(
+        "SELECT id, updated_at, published_at, changed_at FROM works WHERE id > :last ORDER BY id LIMIT :batch"
+    )
+    update = sa.text("UPDATE works SET updated_ts = :u, published_ts = :p WHERE id = :id")
+    last = 0
+    while True:
+        rows = bind.execute(select, {"last": last, "batch": BATCH}).fetchall()
+        if not rows:
+            break
+        params = [
+            {"id": r.id, "u": parse_ru_datetime(r.updated_at, r.changed_at), "p": parse_ru_datetime(r.published_at, r.changed_at)}
+            for r in rows
+            if r.updated_at or r.published_at
+        ]
+        if params:
+            bind.execute(update, params)
+        last = rows[-1].id
+
+
+def upgrade() -> None:
+    op.add_column('works', sa.Column('updated_ts', sa.DateTime(timezone=True)))
+    op.add_column('works', sa.Column('published_ts', sa.DateTime(timezone=True)))
+    _backfill(op.get_bind())
+
+    op.drop_index('ix_works_updated_at', table_name='works')
+    op.drop_column('works', 'updated_at')
+    op.drop_column('works', 'published_at')
+    op.alter_column('works', 'updated_ts', new_column_name='updated_at')
+    op.alter_column('works', 'published_ts', new_column_name='published_at')
+
+    # B-tree под фильтры date_*_after/before; сортировка идёт по COALESCE с датой-заглушкой
+    # (search.NO_DATE_SQL) и id в конце, поэтому для неё — индексы по тому же выражению
+    op.create_index('ix_works_updated_at', 'works', ['updated_at'])
+    op.create_index('ix_works_published_at', 'works', ['published_at'])
+    op.execute("CREATE INDEX ix_works_updated_sort ON works ((COALESCE(updated_at, '1900-01-01 00:00+00'::timestamptz)), id)")
+    op.execute("CREATE INDEX ix_works_published_sort ON works ((COALESCE(published_at, '1900-01-01 00:00+00'::timestamptz)), id)")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_works_published_sort', table_name='works')
+    op.drop_index('ix_works_updated_sort', table_name='works')
+    op.drop_index('ix_works_published_at', table_name='works')
+    op.drop_index('ix_works_updated_at', table_name='works')
+    op.alter_column(
+        'works', 'updated_at', type_=sa.String(length=20),
+        postgresql_using="to_char(updated_at AT TIME ZONE 'Europe/Moscow', 'YYYY-MM-DD HH24:MI')",
+    )
+    op.alter_column(
+        'works', 'published_at', type_=sa.String(length=20),
+        postgresql_using="to_char(published_at AT TIME ZONE 'Europe/Moscow', 'YYYY-MM-DD HH24:MI')",
+    )
+    op.create_index('ix_works_updated_at', 'works', ['updated_at'])
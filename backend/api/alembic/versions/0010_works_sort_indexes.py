@@ -0,0 +1,42 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+NO_DATE = "'1900-01-01 00:00+00'::timestamptz"
+LIKES = "COALESCE(likes_count, 0)"
+COMMENTS = "COALESCE(comments_count, 0)"
+UPDATED = f"COALESCE(updated_at, {NO_DATE})"
+
+# Выражения — ровно ключи search.SORT_MAP (и пороги likes_min/comments_min): только
+# при точном совпадении планировщик отдаёт первую страницу сканом индекса с LIMIT,
+# без сортировки всей выборки. id в конце — tie-breaker keyset-пагинации.
+INDEXES = {
+    'ix_works_likes_sort': f"({LIKES}), id",
+    'ix_works_comments_sort': f"({COMMENTS}), id",
+    'ix_works_popularity_sort': f"(({LIKES} + {COMMENTS})), id",
+    # сортировка по умолчанию (relevance без текста)
+    'ix_works_relevance_sort': f"({UPDATED}), ({LIKES}), id",
+    # частые пары "фильтр по равенству + сортировка": сайт и статус
+    'ix_works_site_likes_sort': f"site_id, ({LIKES}), id",
+    'ix_works_site_updated_sort': f"site_id, ({UPDATED}), id",
+    'ix_works_status_updated_sort': f"status, ({UPDATED}), id",
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON works ({columns})")
+    # одиночные индексы по site_id и status — префиксы составных выше, лишняя цена upsert'а
+    op.drop_index('ix_works_site_id', table_name='works')
+    op.drop_index('ix_works_status', table_name='works')
+
+
+def downgrade() -> None:
+    op.create_index('ix_works_status', 'works', ['status'])
+    op.create_index('ix_works_site_id', 'works', ['site_id'])
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
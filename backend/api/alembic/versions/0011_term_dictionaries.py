@@ -0,0 +1,162 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+# (связь, словарь, прежняя текстовая колонка, новая колонка id)
+RELATIONS = [
+    ('work_tags', 'tags', 'tag', 'tag_id'),
+    ('work_fandoms', 'fandoms', 'fandom', 'fandom_id'),
+    ('work_warnings', 'warnings', 'warning', 'warning_id'),
+]
+# словари, по которым есть автодополнение
+AUTOCOMPLETE = ['tags', 'fandoms']
+
+SEARCH_VECTOR_SQL = """
+CREATE OR REPLACE FUNCTION public.works_search_vector(wid integer)
+RETURNS tsvector
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(w.title, ''))), 'A') ||
+        setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(a.name, ''))), 'B') ||
+        setweight(to_tsvector(c.cfg, public.f_unaccent(
+            coalesce(({tags}), '') || ' ' || coalesce(({fandoms}), '')
+        )), 'C') ||
+        setweight(to_tsvector(c.cfg, public.f_unaccent(coalesce(w.summary, ''))), 'D')
+    FROM works w
+    LEFT JOIN authors a ON a.id = w.author_id
+    CROSS JOIN LATERAL (
+        SELECT (CASE WHEN w.language LIKE 'en%' THEN 'english' ELSE 'russian' END)::regconfig AS cfg
+    ) c
+    WHERE w.id = wid
+$$;
+"""
+
+
+def _create_work_search(array_type, columns, by_name: bool) -> None:
+    """work_search с колонками columns (по одной на связь из RELATIONS): массивы id или имён."""
+    op.create_table(
+        'work_search',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        *[sa.Column(c, postgresql.ARRAY(array_type), nullable=False, server_default='{}') for c in columns],
+    )
+    # одна группировка на связь, а не подзапрос на каждую работу
+    joins, values = [], []
+    for i, ((relation, dictionary, _, id_column), column) in enumerate(zip(RELATIONS, columns)):
+        value = "d.name" if by_name else f"r.{id_column}"
+        source = f"{relation} r JOIN {dictionary} d ON d.id = r.{id_column}" if by_name else f"{relation} r"
+        joins.append(f"LEFT JOIN (SELECT r.work_id, array_agg({value} ORDER BY r.position) AS v FROM {source} GROUP BY r.work_id) a{i} ON a{i}.work_id = w.id")
+        values.append(f"COALESCE(a{i}.v, '{{}}')")
+    op.execute(f"INSERT INTO work_search (work_id, {', '.join(columns)}) SELECT w.id, {', '.join(values)} FROM works w {' '.join(joins)};")
+    for c in columns:
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_work_search_{c} ON work_search USING GIN ({c});")
+
+
+def upgrade() -> None:
+    # Строка тега/фандома/предупреждения хранится один раз в словаре, связи — пары
+    # целых (work_id, term_id) с составным первичным ключом вместо суррогатного id
+    for relation, dictionary, column, id_column in RELATIONS:
+        op.create_table(
+            dictionary,
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('name', sa.String(length=200), nullable=False, unique=True),
+            sa.Column('normalized', sa.String(length=200), nullable=False),
+            sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        )
+        op.execute(f"""
+            INSERT INTO {dictionary} (name, normalized, usage_count)
+            SELECT {column}, public.f_unaccent(lower({column})), count(DISTINCT work_id)
+            FROM {relation} GROUP BY {column};
+        """)
+
+        op.rename_table(relation, f'{relation}_old')
+        op.execute(f"ALTER INDEX {relation}_pkey RENAME TO {relation}_old_pkey;")
+        op.create_table(
+            relation,
+            sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column(id_column, sa.Integer(), sa.ForeignKey(f'{dictionary}.id'), primary_key=True),
+            # порядок значений на странице источника
+            sa.Column('position', sa.SmallInteger(), nullable=False),
+        )
+        # повторы значения у одной работы схлопываются, порядок — по первому вхождению
+        op.execute(f"""
+            INSERT INTO {relation} (work_id, {id_column}, position)
+            SELECT work_id, term_id, row_number() OVER (PARTITION BY work_id ORDER BY first_id)
+            FROM (
+                SELECT o.work_id, d.id AS term_id, min(o.id) AS first_id
+                FROM {relation}_old o JOIN {dictionary} d ON d.name = o.{column}
+                GROUP BY o.work_id, d.id
+            ) s;
+        """)
+        op.drop_table(f'{relation}_old')
+        # фильтры идут от значения к работам; PK (work_id, term_id) обслуживает чтение связей работы
+        op.create_index(f'ix_{relation}_{id_column}_work_id', relation, [id_column, 'work_id'])
+
+    # словарь автодополнения переезжает в сами словари
+    for dictionary in AUTOCOMPLETE:
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_{dictionary}_prefix ON {dictionary} (normalized text_pattern_ops);")
+        op.execute(f"CREATE INDEX IF NOT EXISTS idx_{dictionary}_trgm ON {dictionary} USING GIN (normalized gin_trgm_ops);")
+    op.drop_table('search_terms')
+
+    # проекция — массивы int4 вместо строк
+    op.drop_table('work_search')
+    _create_work_search(sa.Integer(), ['tag_ids', 'fandom_ids', 'warning_ids'], by_name=False)
+
+    op.execute(SEARCH_VECTOR_SQL.format(
+        tags="SELECT string_agg(t.name, ' ') FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id = w.id",
+        fandoms="SELECT string_agg(f.name, ' ') FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id WHERE wf.work_id = w.id",
+    ))
+
+
+def downgrade() -> None:
+    op.create_table(
+        'search_terms',
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=200), nullable=False),
+        sa.Column('normalized', sa.String(length=200), nullable=False),
+        sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('kind', 'value'),
+    )
+    op.execute("""
+        INSERT INTO search_terms (kind, value, normalized, usage_count)
+        SELECT 'tag', name, normalized, usage_count FROM tags
+        UNION ALL
+        SELECT 'fandom', name, normalized, usage_count FROM fandoms;
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_search_terms_prefix ON search_terms (kind, normalized text_pattern_ops);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_search_terms_trgm ON search_terms USING GIN (normalized gin_trgm_ops);")
+
+    op.drop_table('work_search')
+    _create_work_search(sa.Text(), ['tags', 'fandoms', 'warnings'], by_name=True)
+
+    for relation, dictionary, column, id_column in RELATIONS:
+        op.rename_table(relation, f'{relation}_new')
+        op.execute(f"ALTER INDEX {relation}_pkey RENAME TO {relation}_new_pkey;")
+        op.create_table(
+            relation,
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE')),
+            sa.Column(column, sa.String(length=200)),
+        )
+        op.execute(f"""
+            INSERT INTO {relation} (work_id, {column})
+            SELECT r.work_id, d.name FROM {relation}_new r JOIN {dictionary} d ON d.id = r.{id_column}
+            ORDER BY r.work_id, r.position;
+        """)
+        op.drop_table(f'{relation}_new')
+        op.drop_table(dictionary)
+        op.create_index(f'ix_{relation}_work_id', relation, ['work_id'])
+        op.create_index(f'ix_{relation}_{column}', relation, [column])
+
+    # тело SQL-функции проверяется при создании — только когда текстовые колонки вернулись
+    op.execute(SEARCH_VECTOR_SQL.format(
+        tags="SELECT string_agg(wt.tag, ' ') FROM work_tags wt WHERE wt.work_id = w.id",
+        fandoms="SELECT string_agg(wf.fandom, ' ') FROM work_fandoms wf WHERE wf.work_id = w.id",
+    ))
@@ -0,0 +1,50 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0012'
+down_revision = '0011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # "Похожие работы": модель, эмбеддинги и top-K соседей строит пакетная задача
+    # backend/cli/similar_works.py; API только читает work_similar
+    op.create_table(
+        'similar_model',
+        # одна строка: модель последней полной сборки
+        sa.Column('id', sa.SmallInteger(), primary_key=True),
+        sa.Column('built_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        # works.changed_at, до которого учтены изменения (инкрементальные прогоны двигают её)
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=False),
+        # float32-массивы: idf признаков, компоненты SVD, центроиды кластеров
+        sa.Column('idf', sa.LargeBinary(), nullable=False),
+        sa.Column('components', sa.LargeBinary(), nullable=False),
+        sa.Column('centroids', sa.LargeBinary(), nullable=False),
+    )
+    op.create_table(
+        'work_embeddings',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        # ближайший центроид: кандидаты в соседи ищутся только в близких кластерах
+        sa.Column('cluster', sa.Integer(), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=False),
+    )
+    op.create_index('ix_work_embeddings_cluster', 'work_embeddings', ['cluster'])
+    op.create_table(
+        'work_similar',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        # по убыванию score; удалённые соседи отсекаются JOIN'ом при чтении
+        sa.Column('neighbour_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('scores', postgresql.ARRAY(sa.Float(precision=24)), nullable=False),
+        sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    # инкрементальный прогон ищет списки, в которых есть изменённые работы
+    op.execute("CREATE INDEX IF NOT EXISTS ix_work_similar_neighbour_ids ON work_similar USING GIN (neighbour_ids);")
+
+
+def downgrade() -> None:
+    op.drop_table('work_similar')
+    op.drop_table('work_embeddings')
+    op.drop_table('similar_model')
@@ -0,0 +1,67 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # reading_history есть в моделях и create_tables.sql, но ни одна миграция её не создавала
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS reading_history (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            work_id INTEGER NOT NULL REFERENCES works(id) ON DELETE CASCADE,
+            chapter_id INTEGER REFERENCES chapters(id) ON DELETE SET NULL,
+            progress FLOAT DEFAULT 0.0,
+            updated_at TIMESTAMP DEFAULT now()
+        );
+    """)
+    # таблица из create_tables.sql: upsert пересоздаёт главы работы, и ссылка на
+    # главу без ON DELETE роняла бы перезалив любой работы, которую кто-то читал.
+    # "Читали также" нужна только пара (user_id, work_id)
+    op.execute("""
+        ALTER TABLE reading_history
+            ALTER COLUMN chapter_id DROP NOT NULL,
+            DROP CONSTRAINT IF EXISTS reading_history_work_id_fkey,
+            DROP CONSTRAINT IF EXISTS reading_history_chapter_id_fkey,
+            ADD CONSTRAINT reading_history_work_id_fkey
+                FOREIGN KEY (work_id) REFERENCES works(id) ON DELETE CASCADE,
+            ADD CONSTRAINT reading_history_chapter_id_fkey
+                FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE SET NULL;
+    """)
+    # история пользователя (эндпоинты /history, персональные рекомендации) и
+    # инкрементальный пересчёт "читали также" — по активным после водяной отметки
+    op.execute("CREATE INDEX IF NOT EXISTS ix_reading_history_user_id ON reading_history (user_id, updated_at);")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_reading_history_updated_at ON reading_history (updated_at);")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_bookmarks_user_id ON bookmarks (user_id, created_at);")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_bookmarks_created_at ON bookmarks (created_at);")
+
+    # "Читали также": top-K по косинусу совместных чтений, строит backend/cli/also_read.py
+    op.create_table(
+        'work_also_read',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('neighbour_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.Column('scores', postgresql.ARRAY(sa.Float(precision=24)), nullable=False),
+        sa.Column('computed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_work_also_read_neighbour_ids ON work_also_read USING GIN (neighbour_ids);")
+    op.create_table(
+        'also_read_state',
+        sa.Column('id', sa.SmallInteger(), primary_key=True),
+        # история и закладки, изменённые до неё, уже учтены
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('also_read_state')
+    op.drop_table('work_also_read')
+    op.execute("DROP INDEX IF EXISTS ix_bookmarks_created_at")
+    op.execute("DROP INDEX IF EXISTS ix_bookmarks_user_id")
+    op.execute("DROP INDEX IF EXISTS ix_reading_history_updated_at")
+    op.execute("DROP INDEX IF EXISTS ix_reading_history_user_id")
@@ -0,0 +1,41 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0014'
+down_revision = '0013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Поиск дублей и кросспостов (backend/workers/normalizer/dedup.py):
+    # MinHash-подпись текста глав на работу и LSH-корзины по полосам подписи
+    op.create_table(
+        'work_minhash',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        # uint32 на каждую хеш-функцию
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.Column('shingles', sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        'minhash_buckets',
+        sa.Column('band', sa.SmallInteger(), primary_key=True),
+        sa.Column('bucket', sa.BigInteger(), primary_key=True),
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+    )
+    # замена корзин работы при повторном upsert
+    op.create_index('ix_minhash_buckets_work_id', 'minhash_buckets', ['work_id'])
+    # строки только у неканонических работ кластера: collapse_duplicates — NOT EXISTS по PK
+    op.create_table(
+        'work_duplicates',
+        sa.Column('work_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('canonical_id', sa.Integer(), sa.ForeignKey('works.id', ondelete='CASCADE'), nullable=False),
+    )
+    op.create_index('ix_work_duplicates_canonical_id', 'work_duplicates', ['canonical_id'])
+
+
+def downgrade() -> None:
+    op.drop_table('work_duplicates')
+    op.drop_table('minhash_buckets')
+    op.drop_table('work_minhash')
@@ -0,0 +1,65 @@
+import hashlib
+import html
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+BATCH = 2000
+
+# Замороженные копии word_count/content_hash из backend/api/app/chapters.py на момент
+# миграции: повторный прогон не зависит от последующих правок приложения
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+HASH_BYTES = 16
+
+
+def word_count(content_html: str) -> int:
+    return len(_WORD_RE.findall(html.unescape(_TAG_RE.sub(" ", content_html or ""))))
+
+
+def content_hash(content_html: str) -> bytes:
+    return hashlib.sha256((content_html or "").encode("utf-8")).digest()[:HASH_BYTES]
+
+
+def _backfill(bind) -> None:
+    # копии функций нормализатора: хеш и число слов совпадут с upsert этой ревизии
+    select = sa.text("SELECT id, content_html FROM chapters WHERE id > :last ORDER BY id LIMIT :batch")
+    update = sa.text("UPDATE chapters SET word_count = :wc, content_hash = :hash WHERE id = :id")
+    last = 0
+    while True:
+        rows = bind.execute(select, {"last": last, "batch": BATCH}).fetchall()
+        if not rows:
+            break
+        bind.execute(update, [
+            {"id": r.id, "wc": word_count(r.content_html), "hash": content_hash(r.content_html)} for r in rows
+        ])
+        last = rows[-1].id
+
+
+def upgrade() -> None:
+    op.add_column('chapters', sa.Column('word_count', sa.Integer()))
+    op.add_column('chapters', sa.Column('content_hash', sa.LargeBinary()))
+    _backfill(op.get_bind())
+    op.alter_column('chapters', 'word_count', nullable=False)
+    op.alter_column('chapters', 'content_hash', nullable=False)
+
+    # оглавление (/api/v1/works/{id}/toc) — index-only scan без тел глав; тот же индекс
+    # отдаёт главы по номеру и диапазоны from/to, поэтому ix_chapters_work_id не нужен
+    op.execute(
+        "CREATE INDEX ix_chapters_toc ON chapters (work_id, chapter_number) INCLUDE (title, word_count, content_hash)"
+    )
+    op.drop_index('ix_chapters_work_id', table_name='chapters')
+
+
+def downgrade() -> None:
+    op.create_index('ix_chapters_work_id', 'chapters', ['work_id'])
+    op.drop_index('ix_chapters_toc', table_name='chapters')
+    op.drop_column('chapters', 'content_hash')
+    op.drop_column('chapters', 'word_count')
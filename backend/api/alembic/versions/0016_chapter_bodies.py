@@ -0,0 +1,78 @@
+from alembic import op
+import sqlalchemy as sa
+import zstandard
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+BATCH = 2000
+
+
+def upgrade() -> None:
+    # Тексты глав, сжатые zstd со словарём (backend/api/app/chapters.py). Перенос
+    # существующих content_html — backend/cli/chapter_bodies.py migrate, по пачкам
+    # и с возобновлением: в миграции он занял бы часы на всей базе
+    op.create_table(
+        'chapter_dictionaries',
+        sa.Column('id', sa.SmallInteger(), primary_key=True),
+        sa.Column('dictionary', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        'chapter_bodies',
+        sa.Column('content_hash', sa.LargeBinary(), primary_key=True),
+        # NULL — сжат без словаря (словарь ещё не обучен)
+        sa.Column('dict_id', sa.SmallInteger(), sa.ForeignKey('chapter_dictionaries.id')),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+    )
+    # уже сжато: без повторной попытки pglz при записи в TOAST
+    op.execute("ALTER TABLE chapter_bodies ALTER COLUMN body SET STORAGE EXTERNAL")
+    op.alter_column('chapters', 'content_html', nullable=True)
+
+
+def _decode(bind, rows) -> list:
+    """Тексты глав из chapter_bodies: своя распаковка, без кэшей и настроек
+    backend/api/app/chapters.py — откат работает при любой версии приложения."""
+    dict_ids = sorted({r["dict_id"] for r in rows if r["dict_id"] is not None})
+    dictionaries = {
+        dict_id: zstandard.ZstdCompressionDict(bytes(raw))
+        for dict_id, raw in bind.execute(
+            sa.text("SELECT id, dictionary FROM chapter_dictionaries WHERE id = ANY(:ids)"), {"ids": dict_ids},
+        ).all()
+    } if dict_ids else {}
+    decompressors = {}
+    out = []
+    for r in rows:
+        if r["content_html"] is not None:
+            text = r["content_html"]
+        elif r["body"] is None:
+            text = ""
+        else:
+            dict_id = r["dict_id"]
+            if dict_id not in decompressors:
+                decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionaries.get(dict_id))
+            text = decompressors[dict_id].decompress(bytes(r["body"])).decode("utf-8")
+        out.append({"id": r["id"], "html": text})
+    return out
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    select = sa.text("""
+        SELECT c.id, c.content_html, b.dict_id, b.body FROM chapters c
+        LEFT JOIN chapter_bodies b ON b.content_hash = c.content_hash
+        WHERE c.content_html IS NULL AND c.id > :last ORDER BY c.id LIMIT :batch
+    """)
+    last = 0
+    while True:
+        rows = bind.execute(select, {"last": last, "batch": BATCH}).mappings().all()
+        if not rows:
+            break
+        bind.execute(sa.text("UPDATE chapters SET content_html = :html WHERE id = :id"), _decode(bind, rows))
+        last = rows[-1]["id"]
+    op.alter_column('chapters', 'content_html', nullable=False)
+    op.drop_table('chapter_bodies')
+    op.drop_table('chapter_dictionaries')
@@ -0,0 +1,25 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0017'
+down_revision = '0016'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ETag/Last-Modified работы (backend/api/app/etags.py): версия считается при upsert
+    op.add_column('works', sa.Column('version_hash', sa.LargeBinary()))
+    op.add_column('works', sa.Column('modified_at', sa.DateTime(timezone=True), server_default=sa.func.now()))
+    # до первого upsert версия — от changed_at: любая правка работы с 0007 его сдвигала.
+    # Первый upsert заменит её настоящей и один раз сдвинет modified_at
+    op.execute("""
+        UPDATE works SET version_hash = substring(decode(md5(id || ':' || changed_at), 'hex') from 1 for 16),
+                         modified_at = changed_at
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('works', 'modified_at')
+    op.drop_column('works', 'version_hash')
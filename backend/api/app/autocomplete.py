@@ -0,0 +1,63 @@
+"""
+Автодополнение тегов и фандомов по словарям tags/fandoms.
+
+- Короткий запрос (< 3 символов) — только префикс, btree text_pattern_ops.
+- Длиннее — подстрока через триграммный GIN, префиксные совпадения выше.
+- Внутри — по частоте использования (usage_count), не больше limit.
+- Самые частые короткие префиксы держатся в in-process кэше с TTL: это
+  первые нажатия клавиш, на них приходится большая часть запросов.
+"""
+import os
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from .cache import TTLCache
+from .dictionaries import KINDS
+
+AUTOCOMPLETE_LIMIT_MAX = 100
+AUTOCOMPLETE_CACHE_PREFIX_LEN = int(os.getenv("AUTOCOMPLETE_CACHE_PREFIX_LEN", "3"))
+_prefix_cache = TTLCache(
+    maxsize=int(os.getenv("AUTOCOMPLETE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("AUTOCOMPLETE_CACHE_TTL", "300")),
+)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def suggest(conn: Connection, kind: str, q: str, limit: int = 20) -> List[str]:
+    q = (q or "").strip()
+    limit = min(max(limit, 1), AUTOCOMPLETE_LIMIT_MAX)
+
+    cacheable = len(q) <= AUTOCOMPLETE_CACHE_PREFIX_LEN
+    cache_key = (kind, q.lower(), limit)
+    if cacheable:
+        cached = _prefix_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    table = KINDS[kind]
+    params = {"limit": limit, "q": _escape_like(q)}
+    if len(q) < 3:
+        # триграммы на 1–2 символах бесполезны — только префикс
+        sql = f"""
+        SELECT name FROM {table}
+        WHERE usage_count > 0
+          AND normalized LIKE public.f_unaccent(lower(:q)) || '%'
+        ORDER BY usage_count DESC, name
+        LIMIT :limit
+        """
+    else:
+        sql = f"""
+        SELECT name FROM {table}
+        WHERE usage_count > 0
+          AND normalized LIKE '%' || public.f_unaccent(lower(:q)) || '%'
+        ORDER BY (normalized LIKE public.f_unaccent(lower(:q)) || '%') DESC, usage_count DESC, name
+        LIMIT :limit
+        """
+    values = list(conn.execute(text(sql), params).scalars())
+
+    if cacheable:
+        _prefix_cache.set(cache_key, values)
+    return values
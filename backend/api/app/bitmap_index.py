@@ -0,0 +1,244 @@
+"""
+In-process bitmap-индекс для горячих фильтров поиска.
+
+- Для каждого значения тега, фандома, рейтинга, статуса и сайта держит сжатый
+  roaring-bitmap id работ; include/exclude тегов — это AND (или OR при
+  include_tags_mode=any)/ANDNOT битмапов.
+- Postgres после этого получает только `works.id = ANY(:candidate_ids)` и остальные
+  фильтры, сортирует кандидатов и отдаёт страницу.
+- Строится при старте API из works/work_tags/work_fandoms (битмапы — по именам
+  значений, как они приходят в фильтрах), затем инкрементально
+  догружает работы с works.changed_at новее водяной отметки.
+- Индекс отстаёт от БД до следующего refresh. Кэш поиска хранит результат под
+  поколением (cache.bump_search_versions), поэтому индекс помнит поколение, до
+  которого он покрывает изменения, и не отвечает на запросы более нового
+  поколения — иначе отставший результат лёг бы в кэш под новой версией.
+  Сообщение об инвалидации будит refresh, не дожидаясь периода.
+- Включается переменной SEARCH_BITMAP_INDEX=1; нужен пакет pyroaring.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from .models import SearchFilters
+from .cache import current_generation, on_invalidation
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pragma: no cover - зависит от окружения
+    BitMap = None
+
+log = logging.getLogger(__name__)
+
+SEARCH_BITMAP_INDEX = os.getenv("SEARCH_BITMAP_INDEX", "0") == "1"
+BITMAP_REFRESH_SECONDS = int(os.getenv("SEARCH_BITMAP_REFRESH_SECONDS", "30"))
+# не чаще: во время ingest инвалидации приходят на каждый upsert
+BITMAP_MIN_REFRESH_SECONDS = float(os.getenv("SEARCH_BITMAP_MIN_REFRESH_SECONDS", "1"))
+# больше кандидатов — фильтр неселективен, передавать массив id в SQL уже невыгодно
+BITMAP_MAX_CANDIDATES = int(os.getenv("SEARCH_BITMAP_MAX_CANDIDATES", "20000"))
+# транзакции normalizer коммитятся не в порядке now(), поэтому окно обновления с перекрытием
+WATERMARK_OVERLAP = timedelta(seconds=300)
+
+# поля SearchFilters, которые индекс применяет сам
+BITMAP_FIELDS = ("sites", "rating", "status", "tags", "fandoms", "include_tags", "exclude_tags")
+DIMENSIONS = ("site", "rating", "status", "tag", "fandom")
+
+
+class BitmapIndex:
+    def __init__(self):
+        # только для писателей (build/refresh); читатели берут текущую версию dims без неё
+        self.lock = threading.Lock()
+        self.dims: Dict[str, Dict[str, "BitMap"]] = {d: {} for d in DIMENSIONS}
+        self.watermark = None
+        # поколение кэша поиска, все upsert до которого индекс уже видит
+        self.generation: Optional[int] = None
+        self.ready = False
+        # будит фоновый refresh раньше периода
+        self.wake = threading.Event()
+
+    @staticmethod
+    def _load(conn: Connection, ids: Optional[List[int]] = None) -> Dict[str, Dict[str, "BitMap"]]:
+        dims: Dict[str, Dict[str, "BitMap"]] = {d: {} for d in DIMENSIONS}
+        where = "WHERE {col} = ANY(:ids)" if ids is not None else ""
+        params = {"ids": ids} if ids is not None else {}
+        queries = [
+            (f"SELECT w.id, w.rating, w.status, s.code FROM works w JOIN sites s ON s.id = w.site_id {where.format(col='w.id')}", None),
+            (f"SELECT wt.work_id, t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id {where.format(col='wt.work_id')}", "tag"),
+            (f"SELECT wf.work_id, f.name FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id {where.format(col='wf.work_id')}", "fandom"),
+        ]
+        conn = conn.execution_options(yield_per=50000)
+        for sql, dim in queries:
+            for row in conn.execute(text(sql), params):
+                if dim is None:
+                    wid, rating, status, site = row
+                    for d, v in (("rating", rating), ("status", status), ("site", site)):
+                        if v is not None:
+                            dims[d].setdefault(v, BitMap()).add(wid)
+                else:
+                    wid, v = row
+                    dims[dim].setdefault(v, BitMap()).add(wid)
+        return dims
+
+    @staticmethod
+    def _read_generation() -> Optional[int]:
+        # до чтения БД: upsert бампает поколение после коммита, значит всё,
+        # что учтено в прочитанном поколении, следующий запрос к БД уже видит
+        try:
+            return current_generation()
+        except Exception:
+            log.exception("failed to read search cache generation")
+            return None
+
+    def build(self, engine: Engine) -> None:
+        started = time.perf_counter()
+        generation = self._read_generation()
+        with engine.connect() as conn:
+            watermark = conn.execute(text("SELECT now()")).scalar_one()
+            dims = self._load(conn)
+        for values in dims.values():
+            for bm in values.values():
+                bm.run_optimize()
+        with self.lock:
+            self.dims = dims
+            self.watermark = watermark
+            self.generation = generation
+            self.ready = True
+        log.info("bitmap index built in %.1fs: %s", time.perf_counter() - started, self.stats())
+
+    @staticmethod
+    def _apply(dims: Dict[str, Dict[str, "BitMap"]], changed: "BitMap", delta: Dict[str, Dict[str, "BitMap"]]) -> Dict[str, Dict[str, "BitMap"]]:
+        """Новая версия dims с изменёнными работами из delta. Старая не меняется:
+        её в это время читают запросы. Заново собираются только битмапы значений,
+        которые у изменённых работ были (пересекаются с changed) или стали (есть
+        в delta); остальные битмапы и нетронутые измерения общие со старой версией."""
+        result = {}
+        for dim, values in dims.items():
+            touched = {v for v, bm in values.items() if bm.intersect(changed)} | delta[dim].keys()
+            if not touched:
+                result[dim] = values
+                continue
+            values = dict(values)
+            for v in touched:
+                bm = values[v] - changed if v in values else BitMap()
+                bm |= delta[dim].get(v, BitMap())
+                if bm:
+                    bm.run_optimize()
+                    values[v] = bm
+                else:
+                    values.pop(v, None)
+            result[dim] = values
+        return result
+
+    def refresh(self, engine: Engine) -> int:
+        """Перечитывает работы, изменённые после водяной отметки. Возвращает их число.
+        Новая версия индекса собирается без блокировки и подменяет старую целиком."""
+        generation = self._read_generation()
+        with engine.connect() as conn:
+            now = conn.execute(text("SELECT now()")).scalar_one()
+            ids = list(conn.execute(
+                text("SELECT id FROM works WHERE changed_at > :since"),
+                {"since": self.watermark - WATERMARK_OVERLAP},
+            ).scalars())
+            delta = self._load(conn, ids) if ids else None
+        dims = self._apply(self.dims, BitMap(ids), delta) if delta is not None else self.dims
+
+        with self.lock:
+            self.dims = dims
+            self.watermark = now
+            self.generation = generation
+        return len(ids)
+
+    @staticmethod
+    def _union(values: Dict[str, "BitMap"], names: List[str]) -> "BitMap":
+        return BitMap.union(BitMap(), *[values[v] for v in names if v in values])
+
+    def candidate_ids(self, filters: SearchFilters, generation: Optional[int] = None) -> Optional[List[int]]:
+        """id работ, прошедших горячие фильтры, или None — если индекс не готов,
+        отстаёт от поколения generation, под которым результат попадёт в кэш,
+        фильтров для него нет или выборка слишком широкая (тогда всё решает SQL).
+        Вызывается из event loop, поэтому без блокировки: версия индекса
+        не меняется после публикации, refresh подменяет её целиком."""
+        if not self.ready:
+            return None
+        if generation is not None and (self.generation is None or self.generation < generation):
+            return None
+        dims = self.dims
+        result = None
+        for dim, values in (
+            ("site", filters.sites),
+            ("rating", filters.rating),
+            ("status", filters.status),
+            ("tag", filters.tags),
+            ("fandom", filters.fandoms),
+        ):
+            if values:
+                bm = self._union(dims[dim], values)
+                result = bm if result is None else result & bm
+        if filters.include_tags:
+            if filters.include_tags_mode == "all":
+                # от самого редкого тега: пересечение сразу становится маленьким
+                tag_bitmaps = sorted((self._union(dims["tag"], [v]) for v in set(filters.include_tags)), key=len)
+            else:
+                tag_bitmaps = [self._union(dims["tag"], filters.include_tags)]
+            for bm in tag_bitmaps:
+                result = bm if result is None else result & bm
+        # одни исключения без положительных фильтров — почти вся таблица, это дело SQL
+        if result is None:
+            return None
+        if filters.exclude_tags:
+            result = result - self._union(dims["tag"], filters.exclude_tags)
+        if len(result) > BITMAP_MAX_CANDIDATES:
+            return None
+        return list(result)
+
+    def stats(self) -> dict:
+        """Размер индекса: число битмапов по измерениям и занимаемая ими память."""
+        dims = self.dims
+        n_bytes = 0
+        for values in dims.values():
+            for bm in values.values():
+                st = bm.get_statistics()
+                n_bytes += st["n_bytes_array_containers"] + st["n_bytes_run_containers"] + st["n_bytes_bitset_containers"]
+        return {
+            "ready": self.ready,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "generation": self.generation,
+            "bitmaps": {d: len(v) for d, v in dims.items()},
+            "memory_bytes": n_bytes,
+        }
+
+
+bitmap_index: Optional[BitmapIndex] = BitmapIndex() if SEARCH_BITMAP_INDEX and BitMap is not None else None
+
+
+def start_bitmap_index(engine: Engine) -> None:
+    """Строит индекс в фоне и периодически догружает изменения; API отвечает через SQL, пока индекс не готов."""
+    if bitmap_index is None:
+        if SEARCH_BITMAP_INDEX:
+            log.warning("SEARCH_BITMAP_INDEX=1, but pyroaring is not installed; bitmap index disabled")
+        return
+
+    on_invalidation(bitmap_index.wake.set)
+
+    def run():
+        try:
+            bitmap_index.build(engine)
+        except Exception:
+            log.exception("bitmap index build failed")
+            return
+        while True:
+            bitmap_index.wake.wait(BITMAP_REFRESH_SECONDS)
+            bitmap_index.wake.clear()
+            try:
+                changed = bitmap_index.refresh(engine)
+                if changed:
+                    log.info("bitmap index refreshed: %d works", changed)
+            except Exception:
+                log.exception("bitmap index refresh failed")
+            time.sleep(BITMAP_MIN_REFRESH_SECONDS)
+
+    threading.Thread(target=run, name="bitmap-index", daemon=True).start()
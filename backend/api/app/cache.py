@@ -1,35 +1,567 @@
 import os
 import json
+import asyncio
+import time
+import uuid
 import hashlib
-from typing import Any, Optional
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional, Union
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from . import codec
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:63790/0")
-SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))  # seconds
+# ключи поиска инвалидируются поколениями (bump_search_versions), поэтому TTL может быть долгим
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))  # seconds
+SEARCH_COUNT_TTL = int(os.getenv("SEARCH_COUNT_TTL", "600"))  # seconds
+SEARCH_FACETS_TTL = int(os.getenv("SEARCH_FACETS_TTL", "600"))  # seconds
+# сколько после мягкого TTL ещё можно отдавать устаревшее значение, пока оно обновляется в фоне
+SEARCH_CACHE_STALE_TTL = int(os.getenv("SEARCH_CACHE_STALE_TTL", "600"))  # seconds
+# single-flight: замок на пересчёт ключа и сколько остальные запросы ждут результат
+SEARCH_CACHE_LOCK_TTL = int(os.getenv("SEARCH_CACHE_LOCK_TTL", "10"))  # seconds
+SEARCH_CACHE_LOCK_WAIT = float(os.getenv("SEARCH_CACHE_LOCK_WAIT", "5"))  # seconds
+# L1 — in-process LRU перед Redis; 0 отключает. Версии поколений в L1 держатся
+# недолго: их сброс приходит через pub/sub, TTL — страховка от потерянного сообщения
+SEARCH_L1_SIZE = int(os.getenv("SEARCH_L1_SIZE", "1024"))
+SEARCH_L1_TTL = float(os.getenv("SEARCH_L1_TTL", "60"))  # seconds
+SEARCH_L1_VERSION_TTL = float(os.getenv("SEARCH_L1_VERSION_TTL", "10"))  # seconds
+
+VERSION_PREFIX = "search:ver:"
+# бампается каждым upsert: по нему in-process индексы понимают, какие изменения уже видят
+GLOBAL_VERSION_KEY = f"{VERSION_PREFIX}global"
+INVALIDATE_CHANNEL = "search:invalidate"
+
+# поля, не влияющие на набор совпадений (для ключей count/facets)
+PAGING_FIELDS = ("page", "page_size", "cursor", "sort_by", "sort_order")
 
 redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
+# значения поиска хранятся в бинарном формате codec — для них клиент без декодирования
+redis_bytes = Redis.from_url(REDIS_URL)
+# те же два клиента для async-эндпоинтов
+aredis_client = AsyncRedis.from_url(REDIS_URL, decode_responses=True)
+aredis_bytes = AsyncRedis.from_url(REDIS_URL)
+
+log = logging.getLogger(__name__)
+
+# фоновые пересчёты устаревших ключей
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+class TTLCache:
+    """Небольшой in-process LRU с TTL (для горячих ключей, которые дёшево пересчитать)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# L1: ключ -> (мягкий дедлайн, значение); ключи уже содержат версии поколений
+_l1 = TTLCache(SEARCH_L1_SIZE, SEARCH_L1_TTL) if SEARCH_L1_SIZE > 0 else None
+_l1_versions = TTLCache(max(SEARCH_L1_SIZE, 256), SEARCH_L1_VERSION_TTL) if SEARCH_L1_SIZE > 0 else None
+
+cache_stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "l2_previous_hits": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        cache_stats[name] += 1
+
+
+def get_cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(cache_stats)
+    for tier in ("l1", "l2"):
+        total = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+        stats[f"{tier}_hit_ratio"] = round(stats[f"{tier}_hits"] / total, 4) if total else None
+    stats["l1_enabled"] = _l1 is not None
+    return stats
+
+
+# снять замок, только если он всё ещё наш
+_RELEASE_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
 
 def _stable_json(obj: Any) -> str:
     return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
 
 
-def make_search_cache_key(payload: Any) -> str:
+def _payload_digest(payload: Any, exclude: tuple = ()) -> str:
     try:
         if hasattr(payload, "model_dump"):
             data = payload.model_dump(exclude_none=True)
         else:
             data = payload
+        if exclude and isinstance(data, dict):
+            data = {k: v for k, v in data.items() if k not in exclude}
         raw = _stable_json(data)
     except Exception:
         raw = str(payload)
-    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
-    return f"search:{digest}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _version_keys(payload: Any) -> List[str]:
+    """Счётчики поколений, покрывающие выборку: работа, изменившая результат
+    запроса с фильтром по фандомам, обязательно бампает версию одного из них.
+    Без фандомов — версии сайтов, без фильтров вовсе — глобальная."""
+    data = payload.model_dump(exclude_none=True) if hasattr(payload, "model_dump") else payload
+    data = data if isinstance(data, dict) else {}
+    if data.get("fandoms"):
+        return [f"{VERSION_PREFIX}fandom:{f}" for f in sorted(set(data["fandoms"]))]
+    if data.get("sites"):
+        return [f"{VERSION_PREFIX}site:{s}" for s in sorted(set(data["sites"]))]
+    return [GLOBAL_VERSION_KEY]
+
+
+def _local_versions(keys: List[str]) -> tuple[dict, List[str]]:
+    # Если чего-то нет в L1, все версии перечитываются одним MGET: тег ключа и
+    # поколение должны описывать один момент (см. _read_versions)
+    local = {k: _l1_versions.get(k) for k in keys}
+    if any(v is None for v in local.values()):
+        return {}, keys
+    return local, []
+
+
+def _remember_versions(local: dict, missing: List[str], values: List[Optional[str]]) -> List[str]:
+    for k, v in zip(missing, values):
+        local[k] = v or "0"
+        _l1_versions.set(k, local[k])
+    return list(local.values())
+
+
+def _get_versions(keys: List[str]) -> List[Optional[str]]:
+    """Версии поколений: сначала из L1, недостающие — одним MGET."""
+    if _l1_versions is None:
+        return redis_client.mget(keys)
+    local, missing = _local_versions(keys)
+    return _remember_versions(local, missing, redis_client.mget(missing) if missing else [])
+
+
+async def _aget_versions(keys: List[str]) -> List[Optional[str]]:
+    if _l1_versions is None:
+        return await aredis_client.mget(keys)
+    local, missing = _local_versions(keys)
+    return _remember_versions(local, missing, await aredis_client.mget(missing) if missing else [])
+
+
+def _format_tag(versions: List[Optional[str]]) -> str:
+    tag = ".".join(v or "0" for v in versions)
+    return tag if len(tag) <= 40 else hashlib.sha1(tag.encode("utf-8")).hexdigest()[:16]
+
+
+def _with_global(keys: List[str]) -> List[str]:
+    return keys if GLOBAL_VERSION_KEY in keys else [*keys, GLOBAL_VERSION_KEY]
+
+
+def _split_versions(keys: List[str], values: List[Optional[str]]) -> tuple[str, int]:
+    """(тег ключа, поколение). Поколение — глобальный счётчик, прочитанный тем же
+    MGET: upsert бампает его первым, поэтому каждое изменение, учтённое в теге,
+    учтено и в поколении."""
+    return _format_tag(values[:len(keys)]), int(values[-1] or 0)
+
+
+def _read_versions(payload: Any) -> tuple[str, int]:
+    keys = _version_keys(payload)
+    return _split_versions(keys, _get_versions(_with_global(keys)))
+
+
+def current_generation() -> int:
+    """Глобальное поколение прямо из Redis, без L1: in-process индекс читает его
+    перед тем, как перечитать изменения из БД, и потом покрывает все upsert до него."""
+    return int(redis_client.get(GLOBAL_VERSION_KEY) or 0)
+
+
+def _search_key(payload: Any, tag: str) -> str:
+    return f"search:{_payload_digest(payload)}:v{tag}"
+
+
+def _count_key(payload: Any, tag: str) -> str:
+    # страница и сортировка на count не влияют
+    return f"search:count:{_payload_digest(payload, PAGING_FIELDS)}:v{tag}"
+
+
+def _facets_key(payload: Any, tag: str) -> str:
+    return f"search:facets:{_payload_digest(payload, PAGING_FIELDS)}:v{tag}"
+
+
+def make_search_cache_key(payload: Any) -> str:
+    return _search_key(payload, _read_versions(payload)[0])
+
+
+def make_count_cache_key(payload: Any) -> str:
+    """Ключ total для набора фильтров: страница и сортировка на count не влияют."""
+    return _count_key(payload, _read_versions(payload)[0])
+
+
+def make_facets_cache_key(payload: Any) -> tuple[str, int]:
+    """Ключ фасетов и поколение, под которым они будут посчитаны."""
+    tag, generation = _read_versions(payload)
+    return _facets_key(payload, tag), generation
+
+
+async def amake_search_cache_keys(payload: Any) -> tuple[str, str, int]:
+    """Ключи страницы и total и поколение — одним походом за версиями."""
+    keys = _version_keys(payload)
+    tag, generation = _split_versions(keys, await _aget_versions(_with_global(keys)))
+    return _search_key(payload, tag), _count_key(payload, tag), generation
+
+
+def bump_search_versions(site_code: Optional[str], fandoms: List[str]) -> None:
+    """Вызывается после коммита upsert: ключи поиска с затронутыми версиями больше
+    не совпадут, старые записи доживут свой TTL и исчезнут сами.
+    Счётчики живут без TTL — сброс в 0 оживил бы давно устаревшие записи.
+    Список бампнутых счётчиков публикуется в INVALIDATE_CHANNEL, чтобы реплики API
+    сбросили их локальные копии. Глобальный счётчик бампается первым (см. _split_versions)."""
+    keys = [GLOBAL_VERSION_KEY]
+    if site_code:
+        keys.append(f"{VERSION_PREFIX}site:{site_code}")
+    keys += [f"{VERSION_PREFIX}fandom:{f}" for f in sorted(set(fandoms)) if f]
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.incr(key)
+    pipe.publish(INVALIDATE_CHANNEL, json.dumps(keys, ensure_ascii=False))
+    pipe.execute()
+    _drop_local_versions(keys)
+
+
+def _drop_local_versions(keys: Optional[List[str]] = None) -> None:
+    if _l1_versions is None:
+        return
+    if keys is None:
+        _l1_versions.clear()
+        return
+    for key in keys:
+        _l1_versions.delete(key)
+
+
+# кого ещё будить при инвалидации (in-process индексы, которым пора перечитать изменения)
+_invalidation_callbacks: List[Callable[[], None]] = []
+
+
+def on_invalidation(callback: Callable[[], None]) -> None:
+    """Регистрирует callback, вызываемый на каждое сообщение INVALIDATE_CHANNEL
+    и после каждой (пере)подписки. Регистрировать до start_invalidation_listener."""
+    _invalidation_callbacks.append(callback)
+
+
+def _notify_invalidation() -> None:
+    for callback in _invalidation_callbacks:
+        try:
+            callback()
+        except Exception:
+            log.exception("cache invalidation callback failed")
+
+
+def start_invalidation_listener() -> None:
+    """Фоновый подписчик INVALIDATE_CHANNEL: сбрасывает локальные версии поколений,
+    тем самым делая недостижимыми записи L1 со старыми версиями, и будит
+    зарегистрированные on_invalidation. Сообщения, пропущенные во время обрыва,
+    не восстановить, поэтому после каждой (пере)подписки L1 очищается целиком."""
+    if _l1 is None and not _invalidation_callbacks:
+        return
+
+    def run():
+        while True:
+            try:
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                for msg in pubsub.listen():
+                    if msg["type"] == "subscribe":
+                        if _l1 is not None:
+                            _l1.clear()
+                        _drop_local_versions()
+                        _notify_invalidation()
+                    elif msg["type"] == "message":
+                        try:
+                            _drop_local_versions(json.loads(msg["data"]))
+                        except (TypeError, ValueError):
+                            _drop_local_versions()
+                        _notify_invalidation()
+            except Exception:
+                log.exception("cache invalidation listener failed, resubscribing")
+                time.sleep(1)
+
+    threading.Thread(target=run, name="cache-invalidation", daemon=True).start()
+
+
+# значения поиска — готовые байты JSON-ответа; str принимается и кодируется в UTF-8
+CacheValue = Union[bytes, str]
+
+
+def _unpack(raw: bytes) -> Optional[tuple[float, bytes]]:
+    return codec.decode(raw)
+
+
+def _as_bytes(value: CacheValue) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def _latest_key(key: str) -> Optional[str]:
+    """Ключ-указатель на последнюю запись того же запроса в любом поколении.
+    Версия — хвост ':v<тег>' ключа; ключи без версии указателя не имеют."""
+    family, sep, _ = key.rpartition(":v")
+    return f"{family}:latest" if sep else None
+
+
+def _store(key: str, value: CacheValue, ttl: int, stale_ttl: int) -> bytes:
+    body, soft_deadline = _as_bytes(value), time.time() + ttl
+    redis_bytes.set(key, codec.encode(body, soft_deadline), ex=ttl + stale_ttl)
+    latest = _latest_key(key)
+    if latest:
+        redis_client.set(latest, key, ex=ttl + stale_ttl)
+    _l1_store(key, soft_deadline, body)
+    return body
+
+
+def _previous_generation(key: str) -> Optional[bytes]:
+    """Запись того же запроса из прошлого поколения, если она ещё жива."""
+    latest = _latest_key(key)
+    previous = redis_client.get(latest) if latest else None
+    if not previous or previous == key:
+        return None
+    raw = redis_bytes.get(previous)
+    entry = _unpack(raw) if raw is not None else None
+    return entry[1] if entry is not None else None
+
+
+def _l1_store(key: str, soft_deadline: float, value: bytes) -> None:
+    # L1 живёт не дольше свежести записи в Redis: устаревшее решает SWR в L2
+    if _l1 is not None and soft_deadline > time.time():
+        _l1.set(key, (soft_deadline, value))
+
+
+def _acquire_lock(key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    if redis_client.set(f"lock:{key}", token, nx=True, ex=SEARCH_CACHE_LOCK_TTL):
+        return token
+    return None
+
+
+def _release_lock(key: str, token: str) -> None:
+    redis_client.eval(_RELEASE_LOCK_LUA, 1, f"lock:{key}", token)
+
+
+def _refresh(key: str, token: str, compute: Callable[[], CacheValue], ttl: int, stale_ttl: int) -> None:
+    try:
+        _store(key, compute(), ttl, stale_ttl)
+    except Exception:
+        log.exception("background cache refresh failed for %s", key)
+    finally:
+        _release_lock(key, token)
+
+
+def _l1_lookup(key: str) -> Optional[bytes]:
+    if _l1 is None:
+        return None
+    item = _l1.get(key)
+    if item is not None and time.time() < item[0]:
+        _count("l1_hits")
+        return item[1]
+    _count("l1_misses")
+    return None
+
+
+def cache_get_or_compute(
+    key: str, compute: Callable[[], CacheValue], ttl: Optional[int] = None, stale_ttl: Optional[int] = None
+) -> bytes:
+    """Значение из кэша с защитой от stampede.
+
+    - свежее (моложе ttl) — отдаём как есть;
+    - устаревшее (ttl..ttl+stale_ttl) — отдаём сразу, пересчёт в фоне делает
+      только тот, кто взял замок;
+    - нет в кэше, но жива запись того же запроса из прошлого поколения (версии
+      бампнул upsert) — она отдаётся как устаревшая, пересчёт в фоне; иначе во
+      время ingest запросы без фильтров по фандомам всегда промахивались бы;
+    - нет в кэше — считает один запрос под замком, остальные ждут его результат
+      до SEARCH_CACHE_LOCK_WAIT секунд и лишь потом считают сами.
+
+    Перед Redis (L2) стоит in-process L1: свежее значение из него отдаётся без
+    сетевого похода; устаревшее в L1 не задерживается.
+
+    compute должен сам открывать сессию БД: фоновый пересчёт живёт дольше запроса."""
+    ttl = ttl or SEARCH_CACHE_TTL
+    stale_ttl = SEARCH_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+
+    value = _l1_lookup(key)
+    if value is not None:
+        return value
+
+    raw = redis_bytes.get(key)
+    entry = _unpack(raw) if raw is not None else None
+    if entry is not None:
+        _count("l2_hits")
+        soft_deadline, value = entry
+        _l1_store(key, soft_deadline, value)
+        if time.time() >= soft_deadline:
+            token = _acquire_lock(key)
+            if token:
+                _refresh_pool.submit(_refresh, key, token, compute, ttl, stale_ttl)
+        return value
+
+    _count("l2_misses")
+    value = _previous_generation(key)
+    if value is not None:
+        _count("l2_previous_hits")
+        token = _acquire_lock(key)
+        if token:
+            _refresh_pool.submit(_refresh, key, token, compute, ttl, stale_ttl)
+        return value
+
+    token = _acquire_lock(key)
+    if token:
+        try:
+            return _store(key, compute(), ttl, stale_ttl)
+        finally:
+            _release_lock(key, token)
+
+    deadline = time.monotonic() + SEARCH_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        raw = redis_bytes.get(key)
+        entry = _unpack(raw) if raw is not None else None
+        if entry is not None:
+            soft_deadline, value = entry
+            _l1_store(key, soft_deadline, value)
+            return value
+    log.warning("cache lock wait timed out for %s, computing without lock", key)
+    return _as_bytes(compute())
+
+
+# фоновые пересчёты async-пути: держим ссылки, иначе задачу может собрать GC
+_refresh_tasks: set = set()
+
+
+async def _astore(key: str, value: CacheValue, ttl: int, stale_ttl: int) -> bytes:
+    body, soft_deadline = _as_bytes(value), time.time() + ttl
+    await aredis_bytes.set(key, codec.encode(body, soft_deadline), ex=ttl + stale_ttl)
+    latest = _latest_key(key)
+    if latest:
+        await aredis_client.set(latest, key, ex=ttl + stale_ttl)
+    _l1_store(key, soft_deadline, body)
+    return body
+
+
+async def _aprevious_generation(key: str) -> Optional[bytes]:
+    latest = _latest_key(key)
+    previous = await aredis_client.get(latest) if latest else None
+    if not previous or previous == key:
+        return None
+    raw = await aredis_bytes.get(previous)
+    entry = _unpack(raw) if raw is not None else None
+    return entry[1] if entry is not None else None
+
+
+def _schedule_refresh(key: str, token: str, compute: Callable[[], Awaitable[CacheValue]], ttl: int, stale_ttl: int) -> None:
+    task = asyncio.create_task(_arefresh(key, token, compute, ttl, stale_ttl))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _aacquire_lock(key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    if await aredis_client.set(f"lock:{key}", token, nx=True, ex=SEARCH_CACHE_LOCK_TTL):
+        return token
+    return None
+
+
+async def _arelease_lock(key: str, token: str) -> None:
+    await aredis_client.eval(_RELEASE_LOCK_LUA, 1, f"lock:{key}", token)
+
+
+async def _arefresh(key: str, token: str, compute: Callable[[], Awaitable[CacheValue]], ttl: int, stale_ttl: int) -> None:
+    try:
+        await _astore(key, await compute(), ttl, stale_ttl)
+    except Exception:
+        log.exception("background cache refresh failed for %s", key)
+    finally:
+        await _arelease_lock(key, token)
+
+
+async def acache_get_or_compute(
+    key: str, compute: Callable[[], Awaitable[CacheValue]], ttl: Optional[int] = None, stale_ttl: Optional[int] = None
+) -> bytes:
+    """Async-вариант cache_get_or_compute с теми же правилами; ожидание чужого
+    пересчёта не занимает поток, фоновый пересчёт — задача в текущем event loop."""
+    ttl = ttl or SEARCH_CACHE_TTL
+    stale_ttl = SEARCH_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+
+    value = _l1_lookup(key)
+    if value is not None:
+        return value
+
+    raw = await aredis_bytes.get(key)
+    entry = _unpack(raw) if raw is not None else None
+    if entry is not None:
+        _count("l2_hits")
+        soft_deadline, value = entry
+        _l1_store(key, soft_deadline, value)
+        if time.time() >= soft_deadline:
+            token = await _aacquire_lock(key)
+            if token:
+                _schedule_refresh(key, token, compute, ttl, stale_ttl)
+        return value
 
+    _count("l2_misses")
+    value = await _aprevious_generation(key)
+    if value is not None:
+        _count("l2_previous_hits")
+        token = await _aacquire_lock(key)
+        if token:
+            _schedule_refresh(key, token, compute, ttl, stale_ttl)
+        return value
 
-def cache_get(key: str) -> Optional[str]:
-    return redis_client.get(key)
+    token = await _aacquire_lock(key)
+    if token:
+        try:
+            return await _astore(key, await compute(), ttl, stale_ttl)
+        finally:
+            await _arelease_lock(key, token)
 
+    deadline = time.monotonic() + SEARCH_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        raw = await aredis_bytes.get(key)
+        entry = _unpack(raw) if raw is not None else None
+        if entry is not None:
+            soft_deadline, value = entry
+            _l1_store(key, soft_deadline, value)
+            return value
+    log.warning("cache lock wait timed out for %s, computing without lock", key)
+    return _as_bytes(await compute())
 
-def cache_set(key: str, value: str, ttl: Optional[int] = None) -> None:
-    redis_client.set(key, value, ex=ttl or SEARCH_CACHE_TTL)
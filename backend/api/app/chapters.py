@@ -0,0 +1,171 @@
+"""
+Главы: метаданные, которые считаются один раз при upsert, и хранилище текстов.
+
+- word_count — число слов текста без разметки.
+- content_hash — первые 16 байт SHA-256 от content_html: оглавление отдаёт его
+  клиенту, чтобы тот перезагружал только изменившиеся главы. Оба поля лежат
+  в покрывающем индексе ix_chapters_toc вместе с номером и названием:
+  оглавление читается index-only scan без тел глав.
+- Тексты — в chapter_bodies по content_hash, сжатые zstd со словарём, обученным
+  на наших главах (backend/cli/chapter_bodies.py train). Одинаковый текст
+  (перезалив без правок, кросспост) хранится и сжимается один раз. id словаря
+  записан в строке: после переобучения старые тексты читаются своим словарём.
+- chapters.content_html остаётся только у глав, ещё не перенесённых в
+  chapter_bodies (backend/cli/chapter_bodies.py migrate); читатели берут его,
+  если он есть.
+"""
+import hashlib
+import html
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import zstandard
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+HASH_BYTES = 16
+
+CHAPTER_ZSTD_LEVEL = int(os.getenv("CHAPTER_ZSTD_LEVEL", "9"))
+# как часто нормализатор проверяет, не обучен ли новый словарь (секунды)
+CHAPTER_DICT_REFRESH = float(os.getenv("CHAPTER_DICT_REFRESH", "300"))
+# сборщик мусора (chapter_bodies gc) берёт её монопольно, запись текстов — разделяемо:
+# иначе он мог бы удалить текст, который upsert только что нашёл и на который ссылается
+GC_LOCK_KEY = "chapter_bodies"
+
+# текст главы в запросах читателей: chapters c LEFT JOIN chapter_bodies b
+BODY_COLUMNS_SQL = "c.content_html, b.dict_id, b.body"
+BODY_JOIN_SQL = "LEFT JOIN chapter_bodies b ON b.content_hash = c.content_hash"
+_DICTIONARIES_SQL = text("SELECT id, dictionary FROM chapter_dictionaries WHERE id = ANY(:ids)")
+
+# словари по id неизменны — кэшируются навсегда
+_dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+# (момент проверки, id последнего словаря) для записи
+_current: List[Any] = [0.0, None]
+# компрессоры и декомпрессоры zstd не потокобезопасны: свои на поток
+# (синхронные эндпоинты работают в пуле потоков)
+_local = threading.local()
+
+
+def plain_words(content_html: str) -> List[str]:
+    """Слова текста без тегов и HTML-сущностей, в исходном регистре."""
+    return _WORD_RE.findall(html.unescape(_TAG_RE.sub(" ", content_html or "")))
+
+
+def word_count(content_html: str) -> int:
+    return len(plain_words(content_html))
+
+
+def content_hash(content_html: str) -> bytes:
+    return hashlib.sha256((content_html or "").encode("utf-8")).digest()[:HASH_BYTES]
+
+
+def _remember(rows: Iterable[Any]) -> None:
+    for dict_id, raw in rows:
+        _dictionaries.setdefault(dict_id, zstandard.ZstdCompressionDict(bytes(raw)))
+
+
+def _missing(dict_ids: Iterable[Optional[int]]) -> List[int]:
+    return sorted({i for i in dict_ids if i is not None and i not in _dictionaries})
+
+
+def load_dictionaries(conn: Connection, dict_ids: Iterable[Optional[int]]) -> None:
+    missing = _missing(dict_ids)
+    if missing:
+        _remember(conn.execute(_DICTIONARIES_SQL, {"ids": missing}).all())
+
+
+async def load_dictionaries_async(conn: AsyncConnection, dict_ids: Iterable[Optional[int]]) -> None:
+    missing = _missing(dict_ids)
+    if missing:
+        _remember((await conn.execute(_DICTIONARIES_SQL, {"ids": missing})).all())
+
+
+def _per_thread(kind: str, dict_id: Optional[int], make) -> Any:
+    cache = getattr(_local, kind, None)
+    if cache is None:
+        cache = {}
+        setattr(_local, kind, cache)
+    if dict_id not in cache:
+        cache[dict_id] = make(_dictionaries[dict_id] if dict_id is not None else None)
+    return cache[dict_id]
+
+
+def compress(content_html: str, dict_id: Optional[int] = None, level: int = CHAPTER_ZSTD_LEVEL) -> bytes:
+    """Сжатый текст; словарь dict_id должен быть загружен (load_dictionaries)."""
+    zc = _per_thread(f"zc{level}", dict_id, lambda d: zstandard.ZstdCompressor(level=level, dict_data=d))
+    return zc.compress(content_html.encode("utf-8"))
+
+
+def decompress(body: bytes, dict_id: Optional[int] = None) -> str:
+    zd = _per_thread("zd", dict_id, lambda d: zstandard.ZstdDecompressor(dict_data=d))
+    return zd.decompress(body).decode("utf-8")
+
+
+def body_html(row: Any) -> str:
+    """Текст главы из строки с BODY_COLUMNS_SQL: прежний content_html или chapter_bodies."""
+    if row.get("content_html") is not None:
+        return row["content_html"]
+    if row.get("body") is None:
+        return ""
+    return decompress(row["body"], row.get("dict_id"))
+
+
+def _with_html(rows: List[Any]) -> List[Dict[str, Any]]:
+    out = []
+    for r in rows:
+        d = dict(r)
+        d["content_html"] = body_html(d)
+        d.pop("body", None)
+        d.pop("dict_id", None)
+        out.append(d)
+    return out
+
+
+def decode_rows(conn: Connection, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Строки с BODY_COLUMNS_SQL → dict с распакованным content_html."""
+    rows = list(rows)
+    load_dictionaries(conn, (r.get("dict_id") for r in rows))
+    return _with_html(rows)
+
+
+async def decode_rows_async(conn: AsyncConnection, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    rows = list(rows)
+    await load_dictionaries_async(conn, (r.get("dict_id") for r in rows))
+    return _with_html(rows)
+
+
+def current_dictionary(conn: Connection) -> Optional[int]:
+    """id последнего обученного словаря (загруженного) или None, пока словаря нет."""
+    checked, dict_id = _current
+    if time.monotonic() - checked >= CHAPTER_DICT_REFRESH:
+        dict_id = conn.execute(text("SELECT max(id) FROM chapter_dictionaries")).scalar_one()
+        load_dictionaries(conn, [dict_id])
+        _current[:] = [time.monotonic(), dict_id]
+    return dict_id
+
+
+def store_bodies(conn: Connection, bodies: Dict[bytes, str]) -> int:
+    """Кладёт тексты {content_hash: html} в chapter_bodies; уже лежащие не сжимаются
+    заново (перезалив работы без правок). Возвращает число новых текстов.
+    Вызывается в транзакции, которая затем сошлётся на эти хеши из chapters."""
+    if not bodies:
+        return 0
+    conn.execute(text("SELECT pg_advisory_xact_lock_shared(hashtext(:key))"), {"key": GC_LOCK_KEY})
+    stored = set(conn.execute(
+        text("SELECT content_hash FROM chapter_bodies WHERE content_hash = ANY(:hashes)"), {"hashes": list(bodies)},
+    ).scalars())
+    new = [h for h in bodies if h not in stored]
+    if not new:
+        return 0
+    dict_id = current_dictionary(conn)
+    conn.execute(text("""
+        INSERT INTO chapter_bodies (content_hash, dict_id, body) VALUES (:hash, :dict_id, :body)
+        ON CONFLICT (content_hash) DO NOTHING
+    """), [{"hash": h, "dict_id": dict_id, "body": compress(bodies[h], dict_id)} for h in new])
+    return len(new)
@@ -0,0 +1,110 @@
+"""
+Бинарный формат значений кэша поиска в Redis.
+
+- Запись: MAGIC + версия формата + id компрессора + мягкий дедлайн (double) + тело.
+- Тело — UTF-8 JSON ответа (уже готовые байты ответа), сжатый, если он длиннее
+  SEARCH_CACHE_COMPRESS_MIN байт: кириллические summary жмутся в 4–6 раз.
+- Компрессор выбирается SEARCH_CACHE_COMPRESSION (zstd | lz4 | zlib | none);
+  если пакета нет, берётся zlib из стандартной библиотеки.
+- Записи без MAGIC — прежний текстовый формат "дедлайн\\npayload" или голый
+  JSON — читаются как раньше, поэтому выкатка не требует сброса кэша.
+"""
+import logging
+import os
+import struct
+import threading
+import zlib
+from typing import Callable, Dict, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - зависит от окружения
+    lz4_frame = None
+
+log = logging.getLogger(__name__)
+
+# \x00 не встречается в начале старых записей (цифра дедлайна или '{')
+MAGIC = b"\x00FQ"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("!BBd")  # версия, компрессор, мягкий дедлайн
+HEADER_SIZE = len(MAGIC) + _HEADER.size
+
+SEARCH_CACHE_COMPRESSION = os.getenv("SEARCH_CACHE_COMPRESSION", "zstd")
+SEARCH_CACHE_COMPRESS_MIN = int(os.getenv("SEARCH_CACHE_COMPRESS_MIN", "1024"))  # bytes
+ZSTD_LEVEL = int(os.getenv("SEARCH_CACHE_ZSTD_LEVEL", "3"))
+
+# id компрессора хранится в записи — номера не переиспользовать
+COMPRESSORS: Dict[int, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    0: ("none", lambda b: b, lambda b: b),
+    1: ("zlib", lambda b: zlib.compress(b, 6), zlib.decompress),
+}
+if zstandard is not None:
+    # ZstdCompressor/ZstdDecompressor нельзя использовать из двух потоков сразу, а
+    # кодек зовут и event loop, и пул потоков синхронных эндпоинтов, и _refresh_pool:
+    # свои экземпляры на поток
+    _local = threading.local()
+
+    def _zstd_compress(data: bytes) -> bytes:
+        zc = getattr(_local, "zc", None)
+        if zc is None:
+            zc = _local.zc = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return zc.compress(data)
+
+    def _zstd_decompress(data: bytes) -> bytes:
+        zd = getattr(_local, "zd", None)
+        if zd is None:
+            zd = _local.zd = zstandard.ZstdDecompressor()
+        return zd.decompress(data)
+
+    COMPRESSORS[2] = ("zstd", _zstd_compress, _zstd_decompress)
+if lz4_frame is not None:
+    COMPRESSORS[3] = ("lz4", lz4_frame.compress, lz4_frame.decompress)
+
+_BY_NAME = {name: cid for cid, (name, _, _) in COMPRESSORS.items()}
+
+
+def _resolve(name: str) -> int:
+    if name in _BY_NAME:
+        return _BY_NAME[name]
+    log.warning("cache compression %r is not available, falling back to zlib", name)
+    return _BY_NAME["zlib"]
+
+
+_default_compressor = _resolve(SEARCH_CACHE_COMPRESSION)
+
+
+def encode(value: Union[bytes, str], soft_deadline: float, compressor: Optional[str] = None,
+           min_size: Optional[int] = None) -> bytes:
+    body = value.encode("utf-8") if isinstance(value, str) else value
+    cid = _resolve(compressor) if compressor else _default_compressor
+    if len(body) < (SEARCH_CACHE_COMPRESS_MIN if min_size is None else min_size):
+        cid = 0
+    if cid:
+        body = COMPRESSORS[cid][1](body)
+    return MAGIC + _HEADER.pack(FORMAT_VERSION, cid, soft_deadline) + body
+
+
+def decode(raw: bytes) -> Optional[Tuple[float, bytes]]:
+    """(мягкий дедлайн, байты значения) или None, если запись прочитать нельзя
+    (компрессор не установлен на этой реплике, запись из будущей версии формата)."""
+    if not raw.startswith(MAGIC):
+        return _decode_legacy(raw)
+    version, cid, soft_deadline = _HEADER.unpack_from(raw, len(MAGIC))
+    if version != FORMAT_VERSION or cid not in COMPRESSORS:
+        log.warning("unreadable cache entry: format v%d, compressor %d", version, cid)
+        return None
+    return soft_deadline, COMPRESSORS[cid][2](raw[HEADER_SIZE:])
+
+
+def _decode_legacy(raw: bytes) -> Tuple[float, bytes]:
+    head, sep, value = raw.partition(b"\n")
+    try:
+        return float(head), value
+    except ValueError:
+        # запись без заголовка — считаем устаревшей
+        return 0.0, raw
@@ -0,0 +1,166 @@
+"""
+Словари тегов, фандомов и предупреждений (tags/fandoms/warnings).
+
+- Строка значения хранится один раз; связи work_tags/work_fandoms/work_warnings
+  и проекция work_search ссылаются на неё целым id.
+- normalizer переводит имена в id через intern(): недостающие значения
+  дописываются в словарь, известные id держатся в in-process кэше — id значения
+  после вставки не меняется.
+- Поиск переводит значения фильтров в id через load(); вместе с id приходит
+  usage_count — по нему планируется И-фильтр include_tags. Частоты терпят
+  отставание на минуты, поэтому кэш с TTL.
+- Значения нет в словаре — его нет ни у одной работы. Промах не кэшируется:
+  новое значение может прийти с ближайшим upsert, а страница, посчитанная без
+  него, легла бы в кэш поиска уже под новой версией.
+"""
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from .cache import TTLCache
+from .models import SearchFilters
+
+# вид значения -> таблица словаря
+KINDS = {"tag": "tags", "fandom": "fandoms", "warning": "warnings"}
+# поля SearchFilters со значениями словарей
+FILTER_KINDS = {"tags": "tag", "include_tags": "tag", "exclude_tags": "tag", "fandoms": "fandom", "warnings": "warning"}
+
+TERMS_TTL = float(os.getenv("SEARCH_TERMS_TTL", "300"))
+_terms = TTLCache(maxsize=int(os.getenv("SEARCH_TERMS_CACHE_SIZE", "20000")), ttl=TERMS_TTL)
+_ids = TTLCache(maxsize=int(os.getenv("TERM_IDS_CACHE_SIZE", "100000")), ttl=float(os.getenv("TERM_IDS_CACHE_TTL", "86400")))
+# ключ из одного элемента не пересекается с ключами (вид, значение)
+_WORKS_KEY = ("works",)
+
+_WORKS_SQL = text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'works'::regclass")
+
+
+class Term(NamedTuple):
+    id: int
+    usage_count: int
+
+
+class Terms(NamedTuple):
+    """Значения из фильтров, найденные в словарях, и оценка общего числа работ."""
+    works: int
+    found: Dict[Tuple[str, str], Term]
+
+    def id(self, kind: str, name: str) -> Optional[int]:
+        term = self.found.get((kind, name))
+        return term.id if term else None
+
+    def ids(self, kind: str, names: List[str]) -> List[int]:
+        """id известных значений без повторов, в порядке запроса."""
+        return list(dict.fromkeys(i for i in (self.id(kind, n) for n in names) if i is not None))
+
+    def count(self, tag: str) -> int:
+        term = self.found.get(("tag", tag))
+        return term.usage_count if term else 0
+
+    def estimate_all(self, tags: List[str]) -> int:
+        """Оценка числа работ со всеми тегами сразу — в предположении, что теги независимы."""
+        estimate = float(self.works)
+        for tag in set(tags):
+            estimate *= min(self.count(tag), self.works) / self.works
+        return int(estimate)
+
+
+def needs_terms(filters: SearchFilters) -> bool:
+    return any(getattr(filters, field) for field in FILTER_KINDS)
+
+
+def _wanted(filters: SearchFilters) -> List[Tuple[str, str]]:
+    return list(dict.fromkeys((kind, v) for field, kind in FILTER_KINDS.items() for v in getattr(filters, field) or ()))
+
+
+def _lookup_sql(missing: List[Tuple[str, str]]) -> Tuple[str, dict]:
+    kinds = list(dict.fromkeys(kind for kind, _ in missing))
+    sql = " UNION ALL ".join(
+        f"SELECT '{kind}', name, id, usage_count FROM {KINDS[kind]} WHERE name = ANY(:{kind})" for kind in kinds
+    )
+    return sql, {kind: [v for k, v in missing if k == kind] for kind in kinds}
+
+
+def _split(filters: SearchFilters) -> Tuple[Dict[Tuple[str, str], Term], List[Tuple[str, str]], Optional[int]]:
+    found: Dict[Tuple[str, str], Term] = {}
+    missing: List[Tuple[str, str]] = []
+    for key in _wanted(filters):
+        term = _terms.get(key)
+        if term is None:
+            missing.append(key)
+        else:
+            found[key] = term
+    return found, missing, _terms.get(_WORKS_KEY)
+
+
+def _remember(found: Dict[Tuple[str, str], Term], missing: List[Tuple[str, str]], rows, works: Optional[int]) -> Terms:
+    loaded = {(kind, name): Term(term_id, usage_count) for kind, name, term_id, usage_count in rows}
+    for key in missing:
+        term = loaded.get(key)
+        if term is not None:
+            _terms.set(key, term)
+            found[key] = term
+    # reltuples = -1, пока таблицу не анализировали
+    works = max(works or 0, max((t.usage_count for t in found.values()), default=0), 1)
+    _terms.set(_WORKS_KEY, works)
+    return Terms(works, found)
+
+
+def load(conn: Connection, filters: SearchFilters) -> Terms:
+    """id и частоты значений из фильтров, общее число работ."""
+    found, missing, works = _split(filters)
+    if not missing and works is not None:
+        return Terms(works, found)
+    rows = []
+    if missing:
+        sql, params = _lookup_sql(missing)
+        rows = conn.execute(text(sql), params).all()
+    if works is None:
+        works = conn.execute(_WORKS_SQL).scalar()
+    return _remember(found, missing, rows, works)
+
+
+async def load_async(conn: AsyncConnection, filters: SearchFilters) -> Terms:
+    found, missing, works = _split(filters)
+    if not missing and works is not None:
+        return Terms(works, found)
+    rows = []
+    if missing:
+        sql, params = _lookup_sql(missing)
+        rows = (await conn.execute(text(sql), params)).all()
+    if works is None:
+        works = (await conn.execute(_WORKS_SQL)).scalar()
+    return _remember(found, missing, rows, works)
+
+
+def intern(conn: Connection, kind: str, names: List[str]) -> Dict[str, int]:
+    """id значений словаря kind в порядке names (без пустых и повторов); недостающие
+    значения дописываются в словарь в текущей транзакции."""
+    table = KINDS[kind]
+    names = list(dict.fromkeys(n for n in names if n))
+    ids: Dict[str, int] = {}
+    missing: List[str] = []
+    for name in names:
+        term_id = _ids.get((kind, name))
+        if term_id is None:
+            missing.append(name)
+        else:
+            ids[name] = term_id
+
+    if missing:
+        for name, term_id in conn.execute(text(f"SELECT name, id FROM {table} WHERE name = ANY(:names)"), {"names": missing}):
+            ids[name] = term_id
+            _ids.set((kind, name), term_id)
+        new = sorted(n for n in missing if n not in ids)
+        if new:
+            # Вставленные сейчас id в кэш не попадают: транзакция ещё может откатиться.
+            # Имена отсортированы — параллельные upsert'ы берут блокировки в одном порядке;
+            # DO UPDATE, чтобы RETURNING вернул и строки, вставленные ими.
+            rows = conn.execute(text(f"""
+                INSERT INTO {table} (name, normalized)
+                SELECT v, public.f_unaccent(lower(v)) FROM unnest(CAST(:names AS text[])) AS v
+                ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING name, id
+            """), {"names": new})
+            ids.update(dict(rows.all()))
+    return {name: ids[name] for name in names}
@@ -0,0 +1,82 @@
+"""
+Условные GET для чтения работ и глав: ETag / Last-Modified и ответ 304.
+
+- Версия работы (works.version_hash) и время её последнего изменения
+  (works.modified_at) считаются при upsert: хеш полей карточки, фандомов, тегов,
+  предупреждений и оглавления. Перезалив без правок версию не меняет.
+- ETag главы и списка глав — хеш номера, названия и content_hash глав: всё это
+  есть в покрывающем индексе ix_chapters_toc, поэтому проверка If-None-Match
+  не читает тела. ETag слабый: id глав меняются при каждом upsert (главы
+  пересоздаются), хотя текст тот же.
+- Last-Modified главы — время изменения работы: глава не новее своей работы.
+- If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2).
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Response
+
+from .chapters import HASH_BYTES
+
+
+def work_version(fields: Dict[str, Any], fandoms: Iterable[str], tags: Iterable[str], warnings: Iterable[str],
+                 toc: Iterable[Any]) -> bytes:
+    """Хеш всего, что отдают карточка работы и оглавление; toc — (номер, название, content_hash)."""
+    doc = [
+        sorted(fields.items()), list(fandoms), list(tags), list(warnings),
+        [(number, title, bytes(h).hex()) for number, title, h in toc],
+    ]
+    raw = json.dumps(doc, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(raw).digest()[:HASH_BYTES]
+
+
+def work_etag(version_hash: Optional[bytes]) -> Optional[str]:
+    return f'"{bytes(version_hash).hex()}"' if version_hash is not None else None
+
+
+def chapters_etag(rows: Iterable[Any]) -> str:
+    """Слабый ETag главы или списка глав по строкам с chapter_number, title, content_hash."""
+    h = hashlib.sha256()
+    for r in rows:
+        h.update(f"{r['chapter_number']}\x1f{r['title'] or ''}\x1f".encode("utf-8"))
+        h.update(bytes(r["content_hash"] or b""))
+        h.update(b"\x1e")
+    return f'W/"{h.hexdigest()[:2 * HASH_BYTES]}"'
+
+
+def validators(etag: Optional[str], modified_at: Optional[datetime]) -> Dict[str, str]:
+    """Заголовки ответа: клиент хранит ответ, но каждый раз перепроверяет его."""
+    headers = {"Cache-Control": "no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if modified_at is not None:
+        headers["Last-Modified"] = format_datetime(modified_at.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(headers: Dict[str, str], if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Совпадает ли сохранённая у клиента копия с текущей (слабое сравнение ETag)."""
+    etag = headers.get("ETag")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        return if_none_match.strip() == "*" or _opaque(etag) in {_opaque(t) for t in if_none_match.split(",")}
+    last_modified = headers.get("Last-Modified")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
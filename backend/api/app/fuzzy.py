@@ -0,0 +1,59 @@
+"""
+Варианты запроса для нечёткого поиска (fuzzy=true).
+
+Пользователи набирают названия в чужой раскладке ("ufhhb gjnnth") и
+транслитом ("Garri Potter"), а триграммы сравнивают только буквы одного
+алфавита. К запросу добавляются:
+
+- тот же текст, набранный в другой раскладке (ЙЦУКЕН <-> QWERTY);
+- транслитерация латиница -> кириллица или кириллица -> латиница.
+
+Каждый вариант сравнивается с названием оператором % (pg_trgm) по индексу
+idx_works_title_trgm_expr; результат ранжируется по лучшему similarity().
+"""
+import os
+import re
+from typing import Dict, List
+
+FUZZY_MAX_VARIANTS = int(os.getenv("SEARCH_FUZZY_MAX_VARIANTS", "3"))
+
+_EN_KEYS = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+_RU_KEYS = "йцукенгшщзхъфывапролджэячсмитьбюё"
+_EN_TO_RU_LAYOUT = str.maketrans(_EN_KEYS, _RU_KEYS)
+_RU_TO_EN_LAYOUT = str.maketrans(_RU_KEYS, _EN_KEYS)
+
+# длинные сочетания раньше коротких: "shch" не должно разобраться как "s" + "h" + ...
+_LAT_TO_CYR: Dict[str, str] = {
+    "shch": "щ", "sch": "щ", "yo": "ё", "zh": "ж", "kh": "х", "ts": "ц", "ch": "ч", "sh": "ш",
+    "yu": "ю", "ya": "я", "a": "а", "b": "б", "c": "к", "d": "д", "e": "е", "f": "ф", "g": "г",
+    "h": "х", "i": "и", "j": "дж", "k": "к", "l": "л", "m": "м", "n": "н", "o": "о", "p": "п",
+    "q": "к", "r": "р", "s": "с", "t": "т", "u": "у", "v": "в", "w": "в", "x": "кс", "y": "и", "z": "з",
+}
+_LAT_RE = re.compile("|".join(sorted(_LAT_TO_CYR, key=len, reverse=True)))
+
+_CYR_TO_LAT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+
+
+def _is_latin(text: str) -> bool:
+    """Букв латиницы больше, чем кириллицы."""
+    latin = sum(1 for ch in text if "a" <= ch <= "z")
+    cyrillic = sum(1 for ch in text if "а" <= ch <= "я" or ch == "ё")
+    return latin > cyrillic
+
+
+def expand_query(query: str, expand: bool = True) -> List[str]:
+    """Запрос в нижнем регистре и, если expand, его варианты в другой раскладке
+    и транслитерации — без повторов, не больше FUZZY_MAX_VARIANTS."""
+    q = " ".join(query.lower().split())
+    variants = [q]
+    if expand and q:
+        if _is_latin(q):
+            variants += [q.translate(_EN_TO_RU_LAYOUT), _LAT_RE.sub(lambda m: _LAT_TO_CYR[m.group(0)], q)]
+        else:
+            variants += [q.translate(_RU_TO_EN_LAYOUT), q.translate(_CYR_TO_LAT)]
+    return [v for v in dict.fromkeys(variants) if v.strip()][:max(FUZZY_MAX_VARIANTS, 1)]
@@ -6,7 +6,7 @@ log.info("Starting main.py")
 try:
     import sentry_sdk
     log.info("Imported sentry_sdk")
-    from fastapi import FastAPI, Depends, HTTPException
+    from fastapi import FastAPI, Depends, HTTPException, Query, Header, Response
     log.info("Imported FastAPI, Depends, HTTPException")
     from fastapi.middleware.cors import CORSMiddleware
     log.info("Imported CORSMiddleware")
@@ -14,23 +14,34 @@ try:
     log.info("Imported Session")
     from sqlalchemy import text
     log.info("Imported text")
-    from .models import SearchFilters, SearchResponse, Work, Chapter, SupportedSites, Author
+    from .models import SearchFilters, SearchResponse, FacetsResponse, Work, SimilarWork, Chapter, ChapterTocEntry, SupportedSites, Author
     log.info("Imported models")
-    from ..db.session import SessionLocal
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from ..db.session import SessionLocal, engine
+    from ..db.get_async_session import async_session, get_async_session
     log.info("Imported SessionLocal")
-    from .search import execute_search
-    log.info("Imported execute_search")
-    from .cache import make_search_cache_key, cache_get, cache_set
+    from .search import execute_search_async, encode_cursor, decode_cursor, count_search_async, execute_facets, known_total
+    log.info("Imported search")
+    from .autocomplete import suggest
+    log.info("Imported autocomplete")
+    from .bitmap_index import bitmap_index, start_bitmap_index
+    log.info("Imported bitmap_index")
+    from .cache import (
+        make_facets_cache_key, amake_search_cache_keys,
+        cache_get_or_compute, acache_get_or_compute, SEARCH_COUNT_TTL, SEARCH_FACETS_TTL,
+        get_cache_stats, start_invalidation_listener,
+    )
     log.info("Imported cache")
+    from .serialize import search_page_json, work_dict, chapter_dict, toc_dict, dumps, raw_json
     import os
     log.info("Imported os")
     import json
     log.info("Imported json")
-    from typing import List
+    from typing import Any, Dict, List, Optional, Tuple
     log.info("Imported List")
-    from . import bookmarks, users, authors, history, works
+    from . import bookmarks, users, authors, history, works, chapters, etags
     log.info("Imported routers")
-    from .users import fastapi_users, auth_backend
+    from .users import fastapi_users, auth_backend, current_active_user
     from ..schemas import UserRead, UserCreate, UserUpdate
     log.info("Imported fastapi_users, auth_backend, UserRead, UserCreate, UserUpdate")
     from sqlalchemy import select
@@ -44,6 +55,17 @@ except Exception as e:
     raise
 
 SENTRY_DSN = os.getenv("SENTRY_DSN", "")
+# списки соседей меняет только пакетная сборка (backend/cli/similar_works.py, also_read.py)
+SIMILAR_CACHE_TTL = int(os.getenv("SIMILAR_CACHE_TTL", "3600"))  # seconds
+SIMILAR_MAX_LIMIT = 50
+# сколько последних работ пользователя дают кандидатов в рекомендации
+RECOMMENDATIONS_RECENT = int(os.getenv("RECOMMENDATIONS_RECENT", "50"))
+# время изменения работы :id — Last-Modified глав
+MODIFIED_AT_SQL = "(SELECT w.modified_at FROM works w WHERE w.id = :id) AS modified_at"
+# поля Chapter и валидаторов; текст — из chapter_bodies (chapters.decode_rows_async)
+CHAPTER_COLUMNS_SQL = (
+    f"c.id, c.work_id, c.chapter_number, c.title, c.word_count, c.content_hash, {chapters.BODY_COLUMNS_SQL}, {MODIFIED_AT_SQL}"
+)
 
 if SENTRY_DSN:
     sentry_sdk.init(
@@ -114,54 +136,120 @@ def get_db():
         db.close()
 
 
+@app.on_event("startup")
+def startup_bitmap_index():
+    start_bitmap_index(engine)
+
+
+@app.on_event("startup")
+def startup_cache_invalidation():
+    start_invalidation_listener()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/api/v1/works/search/index")
+def search_index_stats():
+    """Состояние in-process bitmap-индекса (включён ли, размер в памяти, водяная отметка)."""
+    if bitmap_index is None:
+        return {"enabled": False}
+    return {"enabled": True, **bitmap_index.stats()}
+
+
+@app.get("/api/v1/cache/stats")
+def search_cache_stats():
+    """Счётчики попаданий/промахов по уровням кэша поиска (L1 — процесс, L2 — Redis)."""
+    return get_cache_stats()
+
+
+async def get_search_total(filters: SearchFilters, count_key: str, generation: int) -> tuple[int, bool]:
+    """total кэшируется отдельно от страниц: все страницы одного запроса делят один count.
+    Тот же single-flight и stale-while-revalidate, что у страниц, поэтому сессия своя."""
+    async def compute() -> str:
+        async with async_session() as db:
+            total, exact = await count_search_async(await db.connection(), filters, generation)
+        return json.dumps({"total": total, "exact": exact})
+
+    data = json.loads(await acache_get_or_compute(count_key, compute, ttl=SEARCH_COUNT_TTL))
+    return data["total"], data["exact"]
+
+
+def work_from_row(r) -> Work:
+    return Work(
+        id=str(r["id"]),
+        title=r["title"],
+        authors=[Author(id=str(r["author_id"]) if r.get("author_id") else None, name=r.get("author_name") or "", url=r.get("author_url"))],
+        summary=r.get("summary") or "",
+        language=r.get("language"),
+        fandoms=list(r.get("fandoms") or []),
+        tags=list(r.get("tags") or []),
+        warnings=list(r.get("warnings") or []),
+        rating=r.get("rating"),
+        status=r.get("status"),
+        word_count=r.get("word_count"),
+        kudos_count=r.get("likes_count"),
+        comments_count=r.get("comments_count"),
+        updated_at=r.get("updated_at"),
+        url=r.get("original_url"),
+    )
+
+
+async def run_search(filters: SearchFilters, count_key: str, generation: int) -> bytes:
+    """Выполняет поиск и возвращает байты JSON ответа — в таком виде они кэшируются
+    и отдаются клиенту. Сессия своя: при stale-while-revalidate функция вызывается
+    в фоне, после ответа."""
+    async with async_session() as db:
+        rows = (await execute_search_async(await db.connection(), filters, generation)).mappings().all()
+
+    page = filters.page or 1
+    page_size = min(max(filters.page_size or 20, 1), 100)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = encode_cursor(filters, rows[-1]) if has_more else None
+
+    known = known_total(filters, page, page_size, len(rows), has_more)
+    total, total_exact = known or await get_search_total(filters, count_key, generation)
+
+    return search_page_json(
+        rows,
+        total=total,
+        page=page,
+        page_size=page_size,
+        total_pages=max(1, -(-total // page_size)),
+        total_exact=total_exact,
+        next_cursor=next_cursor,
+    )
+
+
 @app.post("/api/v1/works/search", response_model=SearchResponse)
-def search_works(payload: SearchFilters | None = None, db: Session = Depends(get_db)):
+async def search_works(payload: SearchFilters | None = None):
     filters = payload or SearchFilters()
 
-    cache_key = make_search_cache_key(filters)
-    cached = cache_get(cache_key)
-    if cached:
-        data = json.loads(cached)
-        return SearchResponse(**data)
-
-    conn = db.connection()
-    rows = execute_search(conn, filters)
-
-    works: list[Work] = []
-    for r in rows.mappings():
-        works.append(
-            Work(
-                id=str(r["id"]),
-                title=r["title"],
-                authors=[Author(name=r.get("author_name") or "")],
-                summary=r.get("summary") or "",
-                language=r.get("language"),
-                fandoms=[],
-                tags=[],
-                rating=r.get("rating"),
-                status=r.get("status"),
-                word_count=r.get("word_count"),
-                kudos_count=r.get("likes_count"),
-                comments_count=r.get("comments_count"),
-                updated_at=r.get("updated_at"),
-                url=r.get("original_url"),
-            )
-        )
+    # битый курсор — 400 сразу, до кэша и single-flight замка
+    if filters.cursor:
+        try:
+            decode_cursor(filters, filters.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    search_key, count_key, generation = await amake_search_cache_keys(filters)
+    # response_model — только схема: закэшированные байты уходят клиенту как есть
+    return raw_json(await acache_get_or_compute(search_key, lambda: run_search(filters, count_key, generation)))
+
+
+def run_facets(filters: SearchFilters, generation: int) -> str:
+    with SessionLocal() as db:
+        return FacetsResponse(**execute_facets(db.connection(), filters, generation)).model_dump_json()
 
-    page = filters.page or 1
-    page_size = filters.page_size or 20
-    # Простейшее вычисление total: если работ меньше page_size — это последняя страница
-    total = len(works) if len(works) < page_size else page * page_size + 1
-    total_pages = page if len(works) < page_size else page + 1
 
-    resp = SearchResponse(works=works, total=total, page=page, page_size=page_size, total_pages=total_pages)
-    cache_set(cache_key, resp.model_dump_json(exclude_none=True))
-    return resp
+@app.post("/api/v1/works/facets", response_model=FacetsResponse)
+def search_facets(payload: SearchFilters | None = None):
+    filters = payload or SearchFilters()
+    facets_key, generation = make_facets_cache_key(filters)
+    return raw_json(cache_get_or_compute(facets_key, lambda: run_facets(filters, generation), ttl=SEARCH_FACETS_TTL))
 
 
 @app.post("/api/v1/crawl")
@@ -207,65 +295,209 @@ async def sentry_debug():
 
 
 @app.get("/api/v1/works/{work_id}", response_model=Work)
-def get_work(work_id: int, db: Session = Depends(get_db)):
-    conn = db.connection()
-    w = conn.execute(text("SELECT * FROM works WHERE id=:id"), {"id": work_id}).mappings().first()
+async def get_work(
+    work_id: int,
+    response: Response,
+    db: AsyncSession = Depends(get_async_session),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    conn = await db.connection()
+    if if_none_match is not None or if_modified_since is not None:
+        # сначала версия по PK: на совпадение — 304 без словарей и автора
+        v = (await conn.execute(text("SELECT version_hash, modified_at FROM works WHERE id = :id"), {"id": work_id})).first()
+        if v is not None:
+            headers = etags.validators(etags.work_etag(v.version_hash), v.modified_at)
+            if etags.is_not_modified(headers, if_none_match, if_modified_since):
+                return etags.not_modified(headers)
+    w = (await conn.execute(text("""
+        SELECT w.*, a.name AS author_name, a.url AS author_url,
+               ARRAY(SELECT f.name FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id WHERE wf.work_id = w.id ORDER BY wf.position) AS fandoms,
+               ARRAY(SELECT t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id = w.id ORDER BY wt.position) AS tags,
+               ARRAY(SELECT x.name FROM work_warnings ww JOIN warnings x ON x.id = ww.warning_id WHERE ww.work_id = w.id ORDER BY ww.position) AS warnings
+        FROM works w LEFT JOIN authors a ON a.id = w.author_id
+        WHERE w.id = :id
+    """), {"id": work_id})).mappings().first()
     if not w:
         raise HTTPException(status_code=404, detail="work not found")
-
-    fandoms = [r["fandom"] for r in conn.execute(text("SELECT fandom FROM work_fandoms WHERE work_id=:id"), {"id": work_id}).mappings()]
-    tags = [r["tag"] for r in conn.execute(text("SELECT tag FROM work_tags WHERE work_id=:id"), {"id": work_id}).mappings()]
-    warnings = [r["warning"] for r in conn.execute(text("SELECT warning FROM work_warnings WHERE work_id=:id"), {"id": work_id}).mappings()]
-
-    return Work(
-        id=str(w["id"]),
-        title=w["title"],
-        authors=[Author(name=w.get("author_name") or "")],
-        summary=w.get("summary") or "",
-        language=w.get("language"),
-        fandoms=fandoms,
-        tags=tags,
-        rating=w.get("rating"),
-        status=w.get("status"),
-        word_count=w.get("word_count"),
-        kudos_count=w.get("likes_count"),
-        comments_count=w.get("comments_count"),
-        updated_at=w.get("updated_at"),
-        url=w.get("original_url"),
-        warnings=warnings,
-    )
+    response.headers.update(etags.validators(etags.work_etag(w["version_hash"]), w["modified_at"]))
+    return work_from_row(w)
+
+
+# работы из списка соседей (n: id, score, ord) с полями карточки поиска
+SCORED_WORKS_SQL = """
+    SELECT w.id, w.title, w.summary, w.rating, w.status, w.language, w.word_count, w.likes_count,
+           w.comments_count, w.updated_at, w.original_url, w.author_id,
+           a.name AS author_name, a.url AS author_url, n.score,
+           ARRAY(SELECT f.name FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id WHERE wf.work_id = w.id ORDER BY wf.position) AS fandoms,
+           ARRAY(SELECT t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id = w.id ORDER BY wt.position) AS tags,
+           ARRAY(SELECT x.name FROM work_warnings ww JOIN warnings x ON x.id = ww.warning_id WHERE ww.work_id = w.id ORDER BY ww.position) AS warnings
+    FROM {source}
+    JOIN works w ON w.id = n.id
+    LEFT JOIN authors a ON a.id = w.author_id
+    {where}
+    ORDER BY n.ord
+"""
+
+
+async def neighbour_works(table: str, work_id: int, limit: int) -> bytes:
+    """Первые limit работ предрассчитанного списка соседей (work_similar, work_also_read);
+    пустой список, пока пакетная сборка работу не видела. Кэшируется на SIMILAR_CACHE_TTL."""
+    limit = min(max(limit, 1), SIMILAR_MAX_LIMIT)
+
+    async def compute() -> bytes:
+        source = f"""
+            {table} s CROSS JOIN LATERAL unnest(s.neighbour_ids[1:CAST(:limit AS integer)], s.scores[1:CAST(:limit AS integer)])
+                WITH ORDINALITY AS n(id, score, ord)
+        """
+        async with async_session() as db:
+            rows = (await (await db.connection()).execute(
+                text(SCORED_WORKS_SQL.format(source=source, where="WHERE s.work_id = :id")),
+                {"id": work_id, "limit": limit},
+            )).mappings().all()
+        return dumps([{**work_dict(r), "score": round(r["score"], 6)} for r in rows])
+
+    return await acache_get_or_compute(f"{table}:{work_id}:{limit}", compute, ttl=SIMILAR_CACHE_TTL)
+
+
+@app.get("/api/v1/works/{work_id}/similar", response_model=List[SimilarWork])
+async def get_similar_works(work_id: int, limit: int = 10):
+    """Похожие по тексту, тегам и фандомам (backend/cli/similar_works.py)."""
+    return raw_json(await neighbour_works("work_similar", work_id, limit))
+
+
+@app.get("/api/v1/works/{work_id}/also-read", response_model=List[SimilarWork])
+async def get_also_read(work_id: int, limit: int = 10):
+    """Читатели этой работы читали также (backend/cli/also_read.py)."""
+    return raw_json(await neighbour_works("work_also_read", work_id, limit))
+
+
+@app.get("/api/v1/recommendations", response_model=List[SimilarWork])
+async def get_recommendations(limit: int = 20, user=Depends(current_active_user), db: AsyncSession = Depends(get_async_session)):
+    """Персональные рекомендации: списки "читали также" последних RECOMMENDATIONS_RECENT
+    работ из истории и закладок, score соседа суммируется; прочитанное отбрасывается.
+    Без кэша: история меняется с каждой открытой главой, а запрос — по индексам."""
+    source = """
+        (
+            WITH seen AS (
+                SELECT work_id, updated_at AS at FROM reading_history WHERE user_id = :uid
+                UNION ALL
+                SELECT work_id, created_at FROM bookmarks WHERE user_id = :uid
+            ), recent AS (
+                SELECT work_id FROM seen GROUP BY work_id ORDER BY max(at) DESC NULLS LAST LIMIT :recent
+            )
+            SELECT c.id, c.score, row_number() OVER (ORDER BY c.score DESC, c.id) AS ord
+            FROM (
+                SELECT x.id, CAST(sum(x.score) AS real) AS score
+                FROM recent r
+                JOIN work_also_read l ON l.work_id = r.work_id
+                CROSS JOIN LATERAL unnest(l.neighbour_ids, l.scores) AS x(id, score)
+                WHERE NOT EXISTS (SELECT 1 FROM seen s WHERE s.work_id = x.id)
+                GROUP BY x.id
+                ORDER BY score DESC, x.id
+                LIMIT :limit
+            ) c
+        ) n
+    """
+    conn = await db.connection()
+    rows = (await conn.execute(
+        text(SCORED_WORKS_SQL.format(source=source, where="")),
+        {"uid": user.id, "recent": RECOMMENDATIONS_RECENT, "limit": min(max(limit, 1), SIMILAR_MAX_LIMIT)},
+    )).mappings().all()
+    return raw_json(dumps([{**work_dict(r), "score": round(r["score"], 6)} for r in rows]))
+
+
+def chapter_headers(rows: List[Any]) -> Dict[str, str]:
+    """ETag/Last-Modified по строкам с chapter_number, title, content_hash и modified_at работы.
+    Пустой выборке валидаторов нет: If-None-Match: * совпадает только с существующим ответом."""
+    if not rows:
+        return etags.validators(None, None)
+    return etags.validators(etags.chapters_etag(rows), rows[0]["modified_at"])
+
+
+async def toc_rows(conn, where: List[str], params: dict) -> List[Any]:
+    """Строки оглавления — index-only scan по ix_chapters_toc, без тел глав."""
+    return (await conn.execute(text(
+        f"SELECT c.chapter_number, c.title, c.word_count, c.content_hash, {MODIFIED_AT_SQL}"
+        f" FROM chapters c WHERE {' AND '.join(where)} ORDER BY c.chapter_number ASC"
+    ), params)).mappings().all()
+
+
+async def chapter_rows(
+    conn, where: List[str], params: dict, if_none_match: Optional[str], if_modified_since: Optional[str],
+) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, str]]:
+    """Главы с текстом и их валидаторы; (None, заголовки), если у клиента актуальная копия.
+    Условный запрос сначала сверяется по оглавлению — тела читаются только при промахе."""
+    if if_none_match is not None or if_modified_since is not None:
+        toc = await toc_rows(conn, where, params)
+        headers = chapter_headers(toc)
+        if not toc:
+            return [], headers
+        if etags.is_not_modified(headers, if_none_match, if_modified_since):
+            return None, headers
+    rows = (await conn.execute(text(
+        f"SELECT {CHAPTER_COLUMNS_SQL} FROM chapters c {chapters.BODY_JOIN_SQL}"
+        f" WHERE {' AND '.join(where)} ORDER BY c.chapter_number ASC"
+    ), params)).mappings().all()
+    return await chapters.decode_rows_async(conn, rows), chapter_headers(rows)
+
+
+@app.get("/api/v1/works/{work_id}/toc", response_model=List[ChapterTocEntry])
+async def get_work_toc(
+    work_id: int,
+    db: AsyncSession = Depends(get_async_session),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    """Оглавление для навигации читалки: все поля — в ix_chapters_toc, тела глав не читаются."""
+    rows = await toc_rows(await db.connection(), ["c.work_id=:id"], {"id": work_id})
+    headers = chapter_headers(rows)
+    if etags.is_not_modified(headers, if_none_match, if_modified_since):
+        return etags.not_modified(headers)
+    return raw_json(dumps([toc_dict(r) for r in rows]), headers=headers)
 
 
 @app.get("/api/v1/works/{work_id}/chapters", response_model=List[Chapter])
-def get_work_chapters(work_id: int, db: Session = Depends(get_db)):
-    conn = db.connection()
-    chapters_rows = conn.execute(text("SELECT id, work_id, chapter_number, title, content_html FROM chapters WHERE work_id=:id ORDER BY chapter_number ASC"), {"id": work_id}).mappings()
-    chapters = []
-    for r in chapters_rows:
-        chapters.append(Chapter(
-            id=str(r["id"]),
-            work_id=str(r["work_id"]),
-            number=r["chapter_number"],
-            title=r["title"],
-            content=r["content_html"] or "",
-        ))
-    return chapters
+async def get_work_chapters(
+    work_id: int,
+    from_: Optional[int] = Query(None, alias="from"),
+    to: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_session),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    """Главы с текстом; from/to — номера первой и последней главы окна (включительно),
+    чтобы читалка подгружала текст по мере чтения, а не всю работу сразу."""
+    where, params = ["c.work_id=:id"], {"id": work_id}
+    if from_ is not None:
+        where.append("c.chapter_number >= :from_number")
+        params["from_number"] = from_
+    if to is not None:
+        where.append("c.chapter_number <= :to_number")
+        params["to_number"] = to
+    rows, headers = await chapter_rows(await db.connection(), where, params, if_none_match, if_modified_since)
+    if rows is None:
+        return etags.not_modified(headers)
+    return raw_json(dumps([chapter_dict(r) for r in rows]), headers=headers)
 
 
 @app.get("/api/v1/works/{work_id}/chapters/{number}", response_model=Chapter)
-def get_chapter(work_id: int, number: int, db: Session = Depends(get_db)):
-    conn = db.connection()
-    c = conn.execute(text("SELECT * FROM chapters WHERE work_id=:wid AND chapter_number=:num"), {"wid": work_id, "num": number}).mappings().first()
-    if not c:
-        raise HTTPException(status_code=404, detail="chapter not found")
-
-    return Chapter(
-        id=str(c["id"]),
-        work_id=str(c["work_id"]),
-        number=c["chapter_number"],
-        title=c["title"],
-        content=c["content_html"] or "",
+async def get_chapter(
+    work_id: int,
+    number: int,
+    db: AsyncSession = Depends(get_async_session),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+):
+    rows, headers = await chapter_rows(
+        await db.connection(), ["c.work_id=:id", "c.chapter_number=:num"], {"id": work_id, "num": number},
+        if_none_match, if_modified_since,
     )
+    if rows is None:
+        return etags.not_modified(headers)
+    if not rows:
+        raise HTTPException(status_code=404, detail="chapter not found")
+    return raw_json(dumps(chapter_dict(rows[0])), headers=headers)
 
 
 @app.get("/api/v1/sites", response_model=SupportedSites)
@@ -273,17 +505,9 @@ def get_supported_sites():
     return SupportedSites(sites=["ficbook", "authortoday"])
 
 @app.get("/api/v1/tags", response_model=List[str])
-def get_tags(q: str = "", db: Session = Depends(get_db)):
-    query = select(models.WorkTag.tag).distinct()
-    if q:
-        query = query.filter(models.WorkTag.tag.ilike(f"%{q}%"))
-    results = db.execute(query).scalars().all()
-    return results
+def get_tags(q: str = "", limit: int = 20, db: Session = Depends(get_db)):
+    return suggest(db.connection(), "tag", q, limit)
 
 @app.get("/api/v1/fandoms", response_model=List[str])
-def get_fandoms(q: str = "", db: Session = Depends(get_db)):
-    query = select(models.WorkFandom.fandom).distinct()
-    if q:
-        query = query.filter(models.WorkFandom.fandom.ilike(f"%{q}%"))
-    results = db.execute(query).scalars().all()
-    return results
+def get_fandoms(q: str = "", limit: int = 20, db: Session = Depends(get_db)):
+    return suggest(db.connection(), "fandom", q, limit)
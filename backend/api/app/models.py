@@ -1,3 +1,4 @@
+from datetime import date, datetime
 from typing import List, Optional, Literal
 from pydantic import BaseModel, HttpUrl
 
@@ -23,16 +24,28 @@ class Work(BaseModel):
     chapter_count: Optional[int] = None
     kudos_count: Optional[int] = None
     comments_count: Optional[int] = None
-    created_at: Optional[str] = None
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
     tags: List[str] = []
     fandoms: List[str] = []
     warnings: List[str] = []
     url: Optional[HttpUrl] = None
 
 
+class SimilarWork(Work):
+    # по убыванию: косинус эмбеддингов (similar), совместных чтений (also-read)
+    # или их сумма по истории пользователя (recommendations)
+    score: float
+
+
 class SearchFilters(BaseModel):
     query: Optional[str] = None
+    # нечёткий поиск: опечатки, чужая раскладка и транслит в названии (триграммы pg_trgm)
+    fuzzy: bool = False
+    # порог similarity для fuzzy; None — SEARCH_FUZZY_THRESHOLD
+    similarity_threshold: Optional[float] = None
+    # искать и варианты запроса в другой раскладке и транслитерации
+    fuzzy_expand: bool = True
     sites: Optional[List[str]] = None
     rating: Optional[List[str]] = None
     category: Optional[List[str]] = None
@@ -40,12 +53,26 @@ class SearchFilters(BaseModel):
     status: Optional[List[str]] = None
     word_count_min: Optional[int] = None
     word_count_max: Optional[int] = None
+    likes_min: Optional[int] = None
+    comments_min: Optional[int] = None
+    date_updated_after: Optional[date] = None
+    date_updated_before: Optional[date] = None
+    date_published_after: Optional[date] = None
+    date_published_before: Optional[date] = None
     tags: Optional[List[str]] = None
     fandoms: Optional[List[str]] = None
-    sort_by: Optional[Literal["relevance", "updated", "created", "title", "kudos", "comments", "word_count"]] = None
+    include_tags: Optional[List[str]] = None
+    # all — у работы есть каждый из include_tags, any — хотя бы один
+    include_tags_mode: Literal["all", "any"] = "all"
+    exclude_tags: Optional[List[str]] = None
+    # одна работа на кластер дублей и кросспостов — каноническая (work_duplicates)
+    collapse_duplicates: bool = False
+    sort_by: Optional[Literal["relevance", "updated", "created", "title", "kudos", "comments", "popularity", "word_count"]] = None
     sort_order: Optional[Literal["asc", "desc"]] = None
     page: int = 1
     page_size: int = 20
+    # keyset-пагинация: next_cursor из предыдущего ответа; page при этом игнорируется
+    cursor: Optional[str] = None
 
 
 class SearchResponse(BaseModel):
@@ -54,6 +81,23 @@ class SearchResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    # False — total взят из оценки планировщика (слишком много совпадений для точного count)
+    total_exact: bool = True
+    next_cursor: Optional[str] = None
+
+
+class FacetValue(BaseModel):
+    value: str
+    count: int
+
+
+class FacetsResponse(BaseModel):
+    rating: List[FacetValue] = []
+    status: List[FacetValue] = []
+    category: List[FacetValue] = []
+    sites: List[FacetValue] = []
+    fandoms: List[FacetValue] = []
+    tags: List[FacetValue] = []
 
 
 class Chapter(BaseModel):
@@ -67,5 +111,14 @@ class Chapter(BaseModel):
     updated_at: Optional[str] = None
 
 
+class ChapterTocEntry(BaseModel):
+    """Строка оглавления: без текста главы."""
+    number: int
+    title: Optional[str] = None
+    word_count: int
+    # hex первых 16 байт SHA-256 текста: глава с прежним хешем не изменилась
+    content_hash: str
+
+
 class SupportedSites(BaseModel):
     sites: List[str]
@@ -1,32 +1,227 @@
-from typing import Tuple, List
+import base64
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Tuple, List, Any, Optional
 from sqlalchemy import text
 from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
 from .models import SearchFilters
+from .bitmap_index import bitmap_index, BITMAP_FIELDS
+from . import dictionaries
+from .dictionaries import Terms
+from .fuzzy import expand_query
+from ...parsers.dates import MSK
 
+# выше этого числа совпадений total берётся из оценки планировщика
+COUNT_EXACT_LIMIT = int(os.getenv("SEARCH_COUNT_EXACT_LIMIT", "10000"))
+# сколько самых частых фандомов/тегов отдавать в фасетах
+FACETS_TOP_N = int(os.getenv("SEARCH_FACETS_TOP_N", "20"))
+# до скольких ожидаемых совпадений И по include_tags собирается заранее (как кандидаты bitmap-индекса)
+TAG_CANDIDATES_MAX = int(os.getenv("SEARCH_TAG_CANDIDATES_MAX", "20000"))
+# порог similarity для оператора % в режиме fuzzy (pg_trgm.similarity_threshold)
+FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.3"))
+# ниже порога % совпадает почти с каждой работой, и GIN-индекс триграмм отдаёт всю таблицу
+FUZZY_MIN_THRESHOLD = 0.1
 
-def build_search_query(filters: SearchFilters) -> Tuple[str, dict]:
+
+# Ключи сортировки: выражения без NULL (COALESCE), чтобы сравнение кортежей
+# в keyset-пагинации не теряло строки. id добавляется последним как tie-breaker.
+# Работы без даты уходят в конец по дате-заглушке (не '-infinity': psycopg не
+# превращает бесконечность в datetime). Выражения совпадают с ix_works_*_sort.
+NO_DATE_SQL = "'1900-01-01 00:00+00'::timestamptz"
+LIKES_SQL = "COALESCE(likes_count, 0)"
+COMMENTS_SQL = "COALESCE(comments_count, 0)"
+POPULARITY_SQL = f"({LIKES_SQL} + {COMMENTS_SQL})"
+
+SORT_MAP = {
+    "relevance": [f"COALESCE(updated_at, {NO_DATE_SQL})", LIKES_SQL],
+    "updated": [f"COALESCE(updated_at, {NO_DATE_SQL})"],
+    "created": [f"COALESCE(published_at, {NO_DATE_SQL})"],
+    "title": ["title"],
+    "kudos": [LIKES_SQL],
+    "comments": [COMMENTS_SQL],
+    "popularity": [POPULARITY_SQL],
+    "word_count": ["word_count"],
+}
+
+
+# Запрос пользователя разбирается обоими конфигами: русский стеммер для кириллицы,
+# английский — для латиницы; f_unaccent — как при построении search_vector.
+TSQUERY_SQL = "(websearch_to_tsquery('russian', public.f_unaccent(:ts_q)) || websearch_to_tsquery('english', public.f_unaccent(:ts_q)))"
+# работа без search_vector (найдена по ILIKE заголовка) получает ранг 0, а не NULL — иначе её потеряет keyset
+RANK_SQL = f"COALESCE(ts_rank_cd(search_vector, {TSQUERY_SQL}), 0)"
+
+# Выражение idx_works_title_trgm_expr (миграция 0002): иначе % не пойдёт по индексу
+TITLE_TRGM_SQL = "public.f_unaccent(lower(title))"
+_FUZZY_THRESHOLD_SQL = text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)")
+
+_work_search_available: Optional[bool] = None
+
+# Колонки works, отдаваемые поиском (без search_vector — он нужен только для индекса)
+WORK_COLUMNS = [
+    "id", "site_work_id", "site_id", "title", "summary", "language", "rating", "category", "status",
+    "word_count", "likes_count", "comments_count", "published_at", "updated_at", "original_url", "author_id",
+]
+
+
+def _fuzzy_variants(filters: SearchFilters) -> List[str]:
+    return expand_query(filters.query, filters.fuzzy_expand) if filters.fuzzy and filters.query else []
+
+
+def _best_similarity(expr: str, n_variants: int) -> str:
+    return "GREATEST(" + ", ".join(f"similarity({expr}, public.f_unaccent(:fuzzy_q{i}))" for i in range(n_variants)) + ")"
+
+
+def _fuzzy_rank_sql(n_variants: int) -> str:
+    """Лучшее сходство любого варианта запроса с названием или именем автора."""
+    author = _best_similarity("public.f_unaccent(lower(a.name))", n_variants)
+    return (
+        f"GREATEST({_best_similarity(TITLE_TRGM_SQL, n_variants)}, "
+        f"COALESCE((SELECT {author} FROM authors a WHERE a.id = works.author_id), 0))"
+    )
+
+
+def fuzzy_threshold(filters: SearchFilters) -> Optional[str]:
+    """Значение pg_trgm.similarity_threshold для запроса или None, если он не fuzzy.
+    Оператор % (в отличие от similarity() >= x) идёт по GIN-индексу, но порог
+    берёт только из настройки — её выставляют в транзакции перед запросом."""
+    if not _fuzzy_variants(filters):
+        return None
+    threshold = FUZZY_THRESHOLD if filters.similarity_threshold is None else filters.similarity_threshold
+    return str(min(max(threshold, FUZZY_MIN_THRESHOLD), 1.0))
+
+
+def _sort_spec(filters: SearchFilters) -> Tuple[str, List[str], str]:
+    sort_by = filters.sort_by if filters.sort_by in SORT_MAP else "relevance"
+    sort_dir = "ASC" if (filters.sort_order or "desc") == "asc" else "DESC"
+    if sort_by == "relevance" and filters.query:
+        # в режиме fuzzy — по similarity() триграмм, иначе настоящий ранг ts_rank_cd
+        variants = _fuzzy_variants(filters)
+        if variants:
+            return "similarity", [_fuzzy_rank_sql(len(variants)), LIKES_SQL], sort_dir
+        return "rank", [RANK_SQL, LIKES_SQL], sort_dir
+    return sort_by, SORT_MAP[sort_by], sort_dir
+
+
+def _cursor_value(v: Any) -> Any:
+    # даты в JSON курсора — {"t": ISO}; драйверам нужен обратно datetime, не строка
+    if isinstance(v, datetime):
+        return {"t": v.isoformat()}
+    return v
+
+
+def _decode_cursor_value(v: Any) -> Any:
+    if isinstance(v, dict):
+        parsed = datetime.fromisoformat(v["t"])
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=MSK)
+    return v
+
+
+def encode_cursor(filters: SearchFilters, row: Any) -> str:
+    """Кодирует ключ сортировки последней строки страницы в непрозрачный курсор."""
+    sort_by, keys, sort_dir = _sort_spec(filters)
+    data = {
+        "s": sort_by,
+        "d": sort_dir,
+        "k": [_cursor_value(row[f"sort_key_{i}"]) for i in range(len(keys))],
+        "id": row["id"],
+    }
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(filters: SearchFilters, cursor: str) -> Tuple[List[Any], int]:
+    """Возвращает (значения ключей сортировки, id). ValueError — если курсор битый
+    или выдан для другой сортировки."""
+    sort_by, keys, sort_dir = _sort_spec(filters)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw.decode("utf-8"))
+        values, last_id = [_decode_cursor_value(v) for v in data["k"]], int(data["id"])
+    except Exception:
+        raise ValueError("invalid cursor")
+    if data.get("s") != sort_by or data.get("d") != sort_dir or len(values) != len(keys):
+        raise ValueError("cursor does not match sort order")
+    return values, last_id
+
+
+def _in_clause(column: str, param: str, values: List[str], params: dict) -> str:
+    # одно значение — равенство: "= ANY" с одним элементом планировщик не считает
+    # равенством, и индекс (column, ключ сортировки, id) не даёт порядок
+    if len(values) == 1:
+        params[param] = values[0]
+        return f"{column} = :{param}"
+    params[param] = values
+    return f"{column} = ANY(:{param})"
+
+
+def rarest_first(values: List[str], terms: Terms) -> List[str]:
+    """Теги без повторов, самые редкие первыми (при равных частотах — в порядке запроса)."""
+    return sorted(dict.fromkeys(values), key=terms.count)
+
+
+def _bounded_tag_match(filters: SearchFilters, terms: Terms) -> bool:
+    # Совпадений по всем тегам заведомо немного — собираем их заранее и отдаём SQL
+    # как кандидатов (как bitmap-индекс). Иначе планировщик, ожидая много совпадений,
+    # идёт по индексу сортировки с LIMIT и проверяет теги у сотен тысяч работ подряд.
+    return len(set(filters.include_tags)) > 1 and terms.estimate_all(filters.include_tags) <= TAG_CANDIDATES_MAX
+
+
+def _day_start(d: date) -> datetime:
+    return datetime.combine(d, time(0, 0), tzinfo=MSK)
+
+
+def build_filter_clauses(
+    filters: SearchFilters, use_projection: bool = False, candidate_ids: Optional[List[int]] = None,
+    terms: Optional[Terms] = None,
+) -> Tuple[List[str], dict]:
+    """Условия WHERE по фильтрам — без пагинации и сортировки.
+
+    use_projection — фильтровать теги/фандомы/предупреждения по work_search вместо
+    подзапросов к work_tags/work_fandoms/work_warnings.
+    candidate_ids — работы, уже отобранные bitmap-индексом.
+    terms — id и частоты значений фильтров (dictionaries.load); обязательны, если
+    в фильтрах есть теги, фандомы или предупреждения."""
     clauses: List[str] = []
     params: dict = {}
 
-    if filters.query:
-        clauses.append("(public.f_unaccent(lower(title)) ILIKE public.f_unaccent(lower(:q)) OR public.f_unaccent(lower(summary)) ILIKE public.f_unaccent(lower(:q)))")
+    if candidate_ids is not None:
+        clauses.append("works.id = ANY(:candidate_ids)")
+        params["candidate_ids"] = candidate_ids
+
+    variants = _fuzzy_variants(filters)
+    if variants:
+        # полнотекстовый поиск + похожие названия: % по триграммам для каждого варианта
+        # запроса; все условия — по GIN-индексам, планировщик объединяет их BitmapOr
+        similar = " OR ".join(f"{TITLE_TRGM_SQL} % public.f_unaccent(:fuzzy_q{i})" for i in range(len(variants)))
+        clauses.append(f"(search_vector @@ {TSQUERY_SQL} OR {similar})")
+        params["ts_q"] = filters.query
+        params.update({f"fuzzy_q{i}": v for i, v in enumerate(variants)})
+    elif filters.query:
+        # полнотекстовый поиск по search_vector (GIN) + подстрока в названии (триграммы)
+        clauses.append(f"(search_vector @@ {TSQUERY_SQL} OR {TITLE_TRGM_SQL} ILIKE public.f_unaccent(lower(:q)))")
+        params["ts_q"] = filters.query
         params["q"] = f"%{filters.query}%"
 
     if filters.sites:
-        clauses.append("EXISTS (SELECT 1 FROM sites s WHERE s.id = works.site_id AND s.code = ANY(:sites))")
-        params["sites"] = filters.sites
+        # site_id — равенством, а не соединением с sites: тогда составные индексы
+        # (site_id, ключ сортировки, id) отдают страницу уже упорядоченной
+        if len(filters.sites) == 1:
+            clauses.append("works.site_id = (SELECT s.id FROM sites s WHERE s.code = :site)")
+            params["site"] = filters.sites[0]
+        else:
+            clauses.append("works.site_id = ANY(ARRAY(SELECT s.id FROM sites s WHERE s.code = ANY(:sites)))")
+            params["sites"] = filters.sites
 
     if filters.rating:
-        clauses.append("rating = ANY(:ratings)")
-        params["ratings"] = filters.rating
+        clauses.append(_in_clause("rating", "ratings", filters.rating, params))
 
     if filters.status:
-        clauses.append("status = ANY(:statuses)")
-        params["statuses"] = filters.status
+        clauses.append(_in_clause("status", "statuses", filters.status, params))
 
     if filters.category:
-        clauses.append("category = ANY(:categories)")
-        params["categories"] = filters.category
+        clauses.append(_in_clause("category", "categories", filters.category, params))
 
     if filters.word_count_min is not None:
         clauses.append("word_count >= :wc_min")
@@ -35,55 +230,305 @@ def build_search_query(filters: SearchFilters) -> Tuple[str, dict]:
         clauses.append("word_count <= :wc_max")
         params["wc_max"] = filters.word_count_max
 
+    # то же выражение, что в ключе сортировки: порог и ORDER BY обслуживает один индекс
+    if filters.likes_min is not None:
+        clauses.append(f"{LIKES_SQL} >= :likes_min")
+        params["likes_min"] = filters.likes_min
+    if filters.comments_min is not None:
+        clauses.append(f"{COMMENTS_SQL} >= :comments_min")
+        params["comments_min"] = filters.comments_min
+
+    # даты — дни по Москве, обе границы включительно; B-tree ix_works_updated_at/published_at
+    for column, after, before in (
+        ("updated_at", filters.date_updated_after, filters.date_updated_before),
+        ("published_at", filters.date_published_after, filters.date_published_before),
+    ):
+        if after is not None:
+            clauses.append(f"{column} >= :{column}_from")
+            params[f"{column}_from"] = _day_start(after)
+        if before is not None:
+            clauses.append(f"{column} < :{column}_to")
+            params[f"{column}_to"] = _day_start(before + timedelta(days=1))
+
+    if filters.collapse_duplicates:
+        # строки в work_duplicates только у неканонических работ — анти-join по PK
+        clauses.append("NOT EXISTS (SELECT 1 FROM work_duplicates d WHERE d.work_id = works.id)")
+
+    if not dictionaries.needs_terms(filters):
+        return clauses, params
+    if terms is None:
+        raise ValueError("filters by tags/fandoms/warnings need dictionary terms")
+
+    # фильтры "любое из" — списки id; неизвестное значение просто не попадает в список,
+    # пустой список не совпадёт ни с одной работой
+    for field, kind in (("tags", "tag"), ("fandoms", "fandom"), ("warnings", "warning")):
+        if getattr(filters, field):
+            params[field] = terms.ids(kind, getattr(filters, field))
+    include_all = filters.include_tags_mode == "all"
+    if include_all and any(terms.id("tag", t) is None for t in filters.include_tags or ()):
+        # тега нет в словаре — нет и работ со всеми тегами сразу
+        clauses.append("FALSE")
+        return clauses, params
+    exclude_ids = terms.ids("tag", filters.exclude_tags or [])
+    if exclude_ids:
+        params["exclude_tags"] = exclude_ids
+
+    if use_projection:
+        # work_search: массивы id тегов/фандомов/предупреждений с GIN-индексами —
+        # все условия по связям сворачиваются в один полусоединённый подзапрос
+        array_clauses: List[str] = []
+        if filters.tags:
+            array_clauses.append("ws.tag_ids && CAST(:tags AS integer[])")
+        if filters.fandoms:
+            array_clauses.append("ws.fandom_ids && CAST(:fandoms AS integer[])")
+        if filters.warnings:
+            array_clauses.append("ws.warning_ids && CAST(:warnings AS integer[])")
+        if filters.include_tags:
+            params["include_tags"] = terms.ids("tag", filters.include_tags)
+            if not include_all:
+                array_clauses.append("ws.tag_ids && CAST(:include_tags AS integer[])")
+            elif _bounded_tag_match(filters, terms):
+                clauses.append("works.id = ANY(ARRAY(SELECT ws.work_id FROM work_search ws WHERE ws.tag_ids @> CAST(:include_tags AS integer[])))")
+            else:
+                array_clauses.append("ws.tag_ids @> CAST(:include_tags AS integer[])")
+        if exclude_ids:
+            array_clauses.append("NOT (ws.tag_ids && CAST(:exclude_tags AS integer[]))")
+        if array_clauses:
+            clauses.append("works.id IN (SELECT ws.work_id FROM work_search ws WHERE " + " AND ".join(array_clauses) + ")")
+        return clauses, params
+
     if filters.tags:
-        clauses.append("EXISTS (SELECT 1 FROM work_tags wt WHERE wt.work_id = works.id AND wt.tag = ANY(:tags))")
-        params["tags"] = filters.tags
+        clauses.append("EXISTS (SELECT 1 FROM work_tags wt WHERE wt.work_id = works.id AND wt.tag_id = ANY(:tags))")
     if filters.fandoms:
-        clauses.append("EXISTS (SELECT 1 FROM work_fandoms wf WHERE wf.work_id = works.id AND wf.fandom = ANY(:fandoms))")
-        params["fandoms"] = filters.fandoms
+        clauses.append("EXISTS (SELECT 1 FROM work_fandoms wf WHERE wf.work_id = works.id AND wf.fandom_id = ANY(:fandoms))")
     if filters.warnings:
-        clauses.append("EXISTS (SELECT 1 FROM work_warnings ww WHERE ww.work_id = works.id AND ww.warning = ANY(:warnings))")
-        params["warnings"] = filters.warnings
+        clauses.append("EXISTS (SELECT 1 FROM work_warnings ww WHERE ww.work_id = works.id AND ww.warning_id = ANY(:warnings))")
 
     if filters.include_tags:
-        clauses.append("id IN (SELECT work_id FROM work_tags WHERE tag = ANY(:include_tags))")
-        params['include_tags'] = filters.include_tags
+        if include_all:
+            # ведёт самый редкий тег, остальные проверяются от редких к частым
+            tag_ids = [terms.id("tag", t) for t in rarest_first(filters.include_tags, terms)]
+            params.update({f"include_tag_{i}": tag_id for i, tag_id in enumerate(tag_ids)})
+            if _bounded_tag_match(filters, terms):
+                driving = "SELECT wt0.work_id FROM work_tags wt0 WHERE wt0.tag_id = :include_tag_0"
+                for i in range(1, len(tag_ids)):
+                    driving += f" AND EXISTS (SELECT 1 FROM work_tags wt{i} WHERE wt{i}.work_id = wt0.work_id AND wt{i}.tag_id = :include_tag_{i})"
+                clauses.append(f"works.id = ANY(ARRAY({driving}))")
+            else:
+                clauses.append("works.id IN (SELECT wt0.work_id FROM work_tags wt0 WHERE wt0.tag_id = :include_tag_0)")
+                for i in range(1, len(tag_ids)):
+                    clauses.append(f"EXISTS (SELECT 1 FROM work_tags wt{i} WHERE wt{i}.work_id = works.id AND wt{i}.tag_id = :include_tag_{i})")
+        else:
+            clauses.append("EXISTS (SELECT 1 FROM work_tags wt WHERE wt.work_id = works.id AND wt.tag_id = ANY(:include_tags))")
+            params["include_tags"] = terms.ids("tag", filters.include_tags)
+
+    if exclude_ids:
+        # NOT EXISTS, а не NOT IN: планировщик делает из него hashed anti-join
+        clauses.append("NOT EXISTS (SELECT 1 FROM work_tags wt WHERE wt.work_id = works.id AND wt.tag_id = ANY(:exclude_tags))")
+
+    return clauses, params
+
 
-    if filters.exclude_tags:
-        clauses.append("id NOT IN (SELECT work_id FROM work_tags WHERE tag = ANY(:exclude_tags))")
-        params['exclude_tags'] = filters.exclude_tags
+def build_search_query(
+    filters: SearchFilters, use_projection: bool = False, candidate_ids: Optional[List[int]] = None,
+    terms: Optional[Terms] = None,
+) -> Tuple[str, dict]:
+    clauses, params = build_filter_clauses(filters, use_projection, candidate_ids, terms)
+
+    _, sort_keys, sort_dir = _sort_spec(filters)
+
+    # keyset: продолжаем строго после (ключи, id) последней строки предыдущей страницы
+    if filters.cursor:
+        values, last_id = decode_cursor(filters, filters.cursor)
+        op = ">" if sort_dir == "ASC" else "<"
+        lhs = ", ".join(sort_keys + ["id"])
+        rhs = ", ".join([f":cursor_{i}" for i in range(len(values))] + [":cursor_id"])
+        clauses.append(f"({lhs}) {op} ({rhs})")
+        for i, v in enumerate(values):
+            params[f"cursor_{i}"] = v
+        params["cursor_id"] = last_id
 
     where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
 
-    sort_map = {
-        "relevance": "updated_at DESC, likes_count DESC NULLS LAST",
-        "updated": "updated_at",
-        "created": "created_at",
-        "title": "title",
-        "kudos": "likes_count",
-        "comments": "comments_count",
-        "word_count": "word_count",
-    }
-    sort_field = sort_map.get(filters.sort_by or "relevance", sort_map["relevance"])
-    sort_dir = "ASC" if (filters.sort_order or "desc") == "asc" else "DESC"
-    order_sql = f"{sort_field} {sort_dir}"
+    order_sql = ", ".join(f"{k} {sort_dir}" for k in sort_keys + ["id"])
+    select_keys = ", ".join(f"{k} AS sort_key_{i}" for i, k in enumerate(sort_keys))
+    work_columns = ", ".join(f"works.{c}" for c in WORK_COLUMNS)
+    page_order_sql = ", ".join(f"p.sort_key_{i} {sort_dir}" for i in range(len(sort_keys))) + f", p.id {sort_dir}"
 
     page = filters.page or 1
     page_size = min(max(filters.page_size or 20, 1), 100)
-    offset = (page - 1) * page_size
+    offset = 0 if filters.cursor else (page - 1) * page_size
 
+    # +1 строка: по ней понимаем, есть ли следующая страница.
+    # Автор и массивы тегов/фандомов/предупреждений добираются только для строк
+    # страницы, в том же запросе — без N+1 запросов на каждую работу.
     sql = f"""
-    SELECT * FROM works
-    {where_sql}
-    ORDER BY {order_sql}
-    LIMIT :limit OFFSET :offset
+    WITH p AS (
+        SELECT {work_columns}, {select_keys} FROM works
+        {where_sql}
+        ORDER BY {order_sql}
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT p.*,
+        a.name AS author_name,
+        a.url AS author_url,
+        ARRAY(SELECT f.name FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id WHERE wf.work_id = p.id ORDER BY wf.position) AS fandoms,
+        ARRAY(SELECT t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id = p.id ORDER BY wt.position) AS tags,
+        ARRAY(SELECT x.name FROM work_warnings ww JOIN warnings x ON x.id = ww.warning_id WHERE ww.work_id = p.id ORDER BY ww.position) AS warnings
+    FROM p
+    LEFT JOIN authors a ON a.id = p.author_id
+    ORDER BY {page_order_sql}
     """
-    params["limit"] = page_size
+    params["limit"] = page_size + 1
     params["offset"] = offset
 
     return sql, params
 
 
-def execute_search(conn: Connection, filters: SearchFilters):
-    sql, params = build_search_query(filters)
-    return conn.execute(text(sql), params)
+_WORK_SEARCH_EXISTS_SQL = "SELECT to_regclass('public.work_search') IS NOT NULL"
+
+
+def has_work_search(conn: Connection) -> bool:
+    """Есть ли в БД проекция work_search (миграция 0006). Проверяется один раз на процесс."""
+    global _work_search_available
+    if _work_search_available is None:
+        _work_search_available = conn.execute(text(_WORK_SEARCH_EXISTS_SQL)).scalar_one()
+    return _work_search_available
+
+
+async def has_work_search_async(conn: AsyncConnection) -> bool:
+    global _work_search_available
+    if _work_search_available is None:
+        _work_search_available = (await conn.execute(text(_WORK_SEARCH_EXISTS_SQL))).scalar_one()
+    return _work_search_available
+
+
+def narrow_with_bitmap_index(
+    filters: SearchFilters, generation: Optional[int] = None
+) -> Tuple[SearchFilters, Optional[List[int]]]:
+    """Применяет горячие фильтры через bitmap-индекс, если он включён и ответил.
+    generation — поколение кэша, под которым сохранится результат: индекс,
+    ещё не видящий его изменений, не используется.
+    Возвращает фильтры, оставшиеся для SQL, и id кандидатов."""
+    candidate_ids = bitmap_index.candidate_ids(filters, generation) if bitmap_index is not None else None
+    if candidate_ids is None:
+        return filters, None
+    return filters.model_copy(update={f: None for f in BITMAP_FIELDS}), candidate_ids
+
+
+async def execute_search_async(conn: AsyncConnection, filters: SearchFilters, generation: Optional[int] = None):
+    """Страница поиска на asyncpg: результат уже буферизован."""
+    filters, candidate_ids = narrow_with_bitmap_index(filters, generation)
+    terms = await dictionaries.load_async(conn, filters) if dictionaries.needs_terms(filters) else None
+    sql, params = build_search_query(filters, await has_work_search_async(conn), candidate_ids, terms)
+    threshold = fuzzy_threshold(filters)
+    if threshold is not None:
+        await conn.execute(_FUZZY_THRESHOLD_SQL, {"threshold": threshold})
+    return await conn.execute(text(sql), params)
+
+
+def known_total(filters: SearchFilters, page: int, page_size: int, shown: int, has_more: bool) -> Optional[Tuple[int, bool]]:
+    """total без отдельного count: на последней странице offset-режима он равен
+    числу строк до неё и на ней. Пустая страница дальше конца выборки о total
+    ничего не говорит (кроме первой: тогда совпадений нет)."""
+    if filters.cursor or has_more or (shown == 0 and page > 1):
+        return None
+    return (page - 1) * page_size + shown, True
+
+
+def _count_query(
+    filters: SearchFilters, use_projection: bool, candidate_ids: Optional[List[int]], terms: Optional[Terms]
+) -> Tuple[Optional[int], str, dict]:
+    """(total, если он уже известен из bitmap-индекса; WHERE; параметры)."""
+    clauses, params = build_filter_clauses(filters, use_projection, candidate_ids, terms)
+    if candidate_ids is not None and len(clauses) == 1:
+        # кроме горячих фильтров ничего нет — count уже известен из индекса
+        return len(candidate_ids), "", params
+    where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+    return None, where_sql, {**params, "count_limit": COUNT_EXACT_LIMIT + 1}
+
+
+def _capped_count_sql(where_sql: str) -> str:
+    return f"SELECT count(*) FROM (SELECT 1 FROM works {where_sql} LIMIT :count_limit) t"
+
+
+def _estimate_sql(where_sql: str) -> str:
+    return f"EXPLAIN (FORMAT JSON) SELECT 1 FROM works {where_sql}"
+
+
+def _plan_rows(plan: Any) -> int:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return max(int(plan[0]["Plan"]["Plan Rows"]), COUNT_EXACT_LIMIT + 1)
+
+
+async def count_search_async(conn: AsyncConnection, filters: SearchFilters, generation: Optional[int] = None) -> Tuple[int, bool]:
+    """Возвращает (total, exact).
+
+    Точный count ограничен COUNT_EXACT_LIMIT строками; если совпадений больше,
+    берём оценку планировщика из EXPLAIN — полный count(*) по большой выборке
+    стоит дороже самого поиска."""
+    filters, candidate_ids = narrow_with_bitmap_index(filters, generation)
+    terms = await dictionaries.load_async(conn, filters) if dictionaries.needs_terms(filters) else None
+    known, where_sql, params = _count_query(filters, await has_work_search_async(conn), candidate_ids, terms)
+    if known is not None:
+        return known, True
+    threshold = fuzzy_threshold(filters)
+    if threshold is not None:
+        await conn.execute(_FUZZY_THRESHOLD_SQL, {"threshold": threshold})
+    capped = (await conn.execute(text(_capped_count_sql(where_sql)), params)).scalar_one()
+    if capped <= COUNT_EXACT_LIMIT:
+        return int(capped), True
+    params.pop("count_limit")
+    return _plan_rows((await conn.execute(text(_estimate_sql(where_sql)), params)).scalar_one()), False
+
+
+def build_facets_query(
+    filters: SearchFilters, use_projection: bool = False, candidate_ids: Optional[List[int]] = None,
+    terms: Optional[Terms] = None,
+) -> Tuple[str, dict]:
+    """Все фасеты за один запрос: выборка по фильтрам материализуется один раз в CTE,
+    затем по ней группируются рейтинги/статусы/категории/сайты и top-N фандомов и тегов."""
+    clauses, params = build_filter_clauses(filters, use_projection, candidate_ids, terms)
+    where_sql = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    sql = f"""
+    WITH matched AS MATERIALIZED (
+        SELECT id, site_id, rating, status, category FROM works
+        {where_sql}
+    )
+    SELECT 'rating' AS facet, rating AS value, count(*) AS cnt FROM matched GROUP BY rating
+    UNION ALL
+    SELECT 'status', status, count(*) FROM matched GROUP BY status
+    UNION ALL
+    SELECT 'category', category, count(*) FROM matched WHERE category IS NOT NULL GROUP BY category
+    UNION ALL
+    SELECT 'sites', s.code, count(*) FROM matched m JOIN sites s ON s.id = m.site_id GROUP BY s.code
+    UNION ALL
+    SELECT 'fandoms', f.name, c.cnt FROM (
+        SELECT wf.fandom_id, count(*) AS cnt FROM work_fandoms wf JOIN matched m ON m.id = wf.work_id
+        GROUP BY wf.fandom_id ORDER BY count(*) DESC, wf.fandom_id LIMIT :facets_top
+    ) c JOIN fandoms f ON f.id = c.fandom_id
+    UNION ALL
+    SELECT 'tags', t.name, c.cnt FROM (
+        SELECT wt.tag_id, count(*) AS cnt FROM work_tags wt JOIN matched m ON m.id = wt.work_id
+        GROUP BY wt.tag_id ORDER BY count(*) DESC, wt.tag_id LIMIT :facets_top
+    ) c JOIN tags t ON t.id = c.tag_id
+    """
+    params["facets_top"] = FACETS_TOP_N
+    return sql, params
+
+
+def execute_facets(conn: Connection, filters: SearchFilters, generation: Optional[int] = None) -> dict:
+    filters, candidate_ids = narrow_with_bitmap_index(filters, generation)
+    terms = dictionaries.load(conn, filters) if dictionaries.needs_terms(filters) else None
+    sql, params = build_facets_query(filters, has_work_search(conn), candidate_ids, terms)
+    threshold = fuzzy_threshold(filters)
+    if threshold is not None:
+        conn.execute(_FUZZY_THRESHOLD_SQL, {"threshold": threshold})
+    facets: dict = {"rating": [], "status": [], "category": [], "sites": [], "fandoms": [], "tags": []}
+    for r in conn.execute(text(sql), params).mappings():
+        facets[r["facet"]].append({"value": r["value"], "count": r["cnt"]})
+    for values in facets.values():
+        values.sort(key=lambda v: (-v["count"], v["value"] or ""))
+    return facets
@@ -0,0 +1,120 @@
+"""
+Быстрая сериализация ответов чтения без промежуточных pydantic-моделей.
+
+- Строки из SQL сразу превращаются в dict по заранее собранной схеме полей
+  (WORK_FIELDS / CHAPTER_FIELDS / TOC_FIELDS) и кодируются orjson в bytes.
+- Результат совпадает с тем, что отдавали модели Work/Chapter: поиск —
+  как model_dump_json(exclude_none=True), главы — со всеми полями, включая null.
+- Модели остаются в response_model эндпоинтов как схема OpenAPI; повторной
+  валидации нет, потому что эндпоинт возвращает готовый Response.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+from fastapi import Response
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+def _col(name: str, conv: Optional[Callable[[Any], Any]] = None) -> Callable[[Any], Any]:
+    if conv is None:
+        return lambda r: r.get(name)
+    return lambda r: conv(r.get(name))
+
+
+def _list(v: Any) -> list:
+    return list(v) if v else []
+
+
+def _or_empty(v: Any) -> str:
+    return v or ""
+
+
+def _id(v: Any) -> Optional[str]:
+    return str(v) if v is not None else None
+
+
+def _authors(r: Any) -> List[Dict[str, Any]]:
+    author: Dict[str, Any] = {}
+    if r.get("author_id"):
+        author["id"] = str(r["author_id"])
+    author["name"] = r.get("author_name") or ""
+    if r.get("author_url") is not None:
+        author["url"] = r["author_url"]
+    return [author]
+
+
+# (поле ответа, значение из строки) — в порядке полей модели
+Schema = Sequence[Tuple[str, Callable[[Any], Any]]]
+
+WORK_FIELDS: Schema = (
+    ("id", _col("id", _id)),
+    ("title", _col("title")),
+    ("authors", _authors),
+    ("summary", _col("summary", _or_empty)),
+    ("rating", _col("rating")),
+    ("status", _col("status")),
+    ("language", _col("language")),
+    ("word_count", _col("word_count")),
+    ("kudos_count", _col("likes_count")),
+    ("comments_count", _col("comments_count")),
+    ("updated_at", _col("updated_at")),
+    ("tags", _col("tags", _list)),
+    ("fandoms", _col("fandoms", _list)),
+    ("warnings", _col("warnings", _list)),
+    ("url", _col("original_url")),
+)
+
+CHAPTER_FIELDS: Schema = (
+    ("id", _col("id", _id)),
+    ("work_id", _col("work_id", _id)),
+    ("number", _col("chapter_number")),
+    ("title", _col("title")),
+    ("content", _col("content_html", _or_empty)),
+    ("word_count", _col("word_count")),
+    ("created_at", _col("created_at")),
+    ("updated_at", _col("updated_at")),
+)
+
+TOC_FIELDS: Schema = (
+    ("number", _col("chapter_number")),
+    ("title", _col("title")),
+    ("word_count", _col("word_count")),
+    ("content_hash", _col("content_hash", bytes.hex)),
+)
+
+
+def work_dict(r: Any) -> Dict[str, Any]:
+    """Строка works (+author_name/author_url и массивы) → Work без None-полей."""
+    out: Dict[str, Any] = {}
+    for name, get in WORK_FIELDS:
+        v = get(r)
+        if v is not None:
+            out[name] = v
+    return out
+
+
+def chapter_dict(r: Any) -> Dict[str, Any]:
+    """Строка chapters → Chapter со всеми полями, как отдавал response_model."""
+    return {name: get(r) for name, get in CHAPTER_FIELDS}
+
+
+def toc_dict(r: Any) -> Dict[str, Any]:
+    """Строка индекса ix_chapters_toc → ChapterTocEntry."""
+    return {name: get(r) for name, get in TOC_FIELDS}
+
+
+def search_page_json(rows: List[Any], **meta: Any) -> bytes:
+    """JSON страницы поиска: works + total/page/... (None в meta не выводится)."""
+    doc: Dict[str, Any] = {"works": [work_dict(r) for r in rows]}
+    doc.update((k, v) for k, v in meta.items() if v is not None)
+    return orjson.dumps(doc)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj)
+
+
+def raw_json(content: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Готовые байты JSON без повторной сериализации."""
+    return Response(content=content, status_code=status_code, media_type=JSON_MEDIA_TYPE, headers=headers)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 import html2text
 
+from . import chapters
 from ..db import models
 from ..db.session import get_db
 
@@ -21,8 +23,13 @@ def download_work_as_txt(work_id: int, db: Session = Depends(get_db)):
     content += f"**Автор:** {db_work.author.name}\n\n"
     content += f"**Описание:**\n\n{h.handle(db_work.summary)}\n\n"
     
-    for chapter in db_work.chapters:
-        content += f"## Глава {chapter.chapter_number}: {chapter.title}\n\n"
-        content += f"{h.handle(chapter.content_html)}\n\n"
+    conn = db.connection()
+    rows = conn.execute(text(
+        f"SELECT c.chapter_number, c.title, {chapters.BODY_COLUMNS_SQL} FROM chapters c {chapters.BODY_JOIN_SQL}"
+        " WHERE c.work_id = :id ORDER BY c.chapter_number"
+    ), {"id": work_id}).mappings().all()
+    for chapter in chapters.decode_rows(conn, rows):
+        content += f"## Глава {chapter['chapter_number']}: {chapter['title']}\n\n"
+        content += f"{h.handle(chapter['content_html'])}\n\n"
         
     return PlainTextResponse(content, headers={"Content-Disposition": f"attachment; filename=\"{db_work.title}.md\""})
@@ -51,8 +51,8 @@ CREATE TABLE bookmarks (
 CREATE TABLE reading_history (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES users(id),
-    work_id INTEGER NOT NULL REFERENCES works(id),
-    chapter_id INTEGER NOT NULL REFERENCES chapters(id),
+    work_id INTEGER NOT NULL REFERENCES works(id) ON DELETE CASCADE,
+    chapter_id INTEGER REFERENCES chapters(id) ON DELETE SET NULL,
     progress FLOAT DEFAULT 0.0,
     updated_at TIMESTAMP DEFAULT now()
 );
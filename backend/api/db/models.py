@@ -1,9 +1,12 @@
 from sqlalchemy import (
-    Column, Integer, String, Text, Float, DateTime, ForeignKey, Enum, Boolean, UniqueConstraint, Index
+    Column, Integer, SmallInteger, String, Text, Float, DateTime, ForeignKey, Enum, Boolean, UniqueConstraint, Index,
+    LargeBinary,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR, ARRAY
 from sqlalchemy.orm import relationship, Mapped, mapped_column, declarative_base
 from sqlalchemy.sql import func
 import enum
+from datetime import datetime
 from fastapi_users.db import SQLAlchemyBaseUserTable
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
@@ -39,20 +42,28 @@ class Work(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     site_work_id: Mapped[str | None] = mapped_column(String(100), index=True)
-    site_id: Mapped[int] = mapped_column(Integer, ForeignKey("sites.id"), index=True)
+    site_id: Mapped[int] = mapped_column(Integer, ForeignKey("sites.id"))
     title: Mapped[str] = mapped_column(String(500), index=True)
     summary: Mapped[str] = mapped_column(Text)
     language: Mapped[str] = mapped_column(String(10), index=True)
     rating: Mapped[str] = mapped_column(String(50), index=True)
     category: Mapped[str | None] = mapped_column(String(50))
-    status: Mapped[str] = mapped_column(String(50), index=True)
+    status: Mapped[str] = mapped_column(String(50))
     word_count: Mapped[int] = mapped_column(Integer, index=True)
     likes_count: Mapped[int | None] = mapped_column(Integer)
     comments_count: Mapped[int | None] = mapped_column(Integer)
-    published_at: Mapped[str | None] = mapped_column(String(20))
-    updated_at: Mapped[str | None] = mapped_column(String(20), index=True)
+    published_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), index=True)
     original_url: Mapped[str | None] = mapped_column(String(500))
     author_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("authors.id"))
+    # Взвешенный вектор: title (A), автор (B), теги/фандомы (C), summary (D).
+    # Собирается функцией works_search_vector (миграция 0005) в perform_upsert.
+    search_vector: Mapped[str | None] = mapped_column(TSVECTOR, nullable=True, deferred=True)
+    # момент последнего upsert — водяная отметка для инкрементальных индексов
+    changed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # версия для ETag и время её смены (app/etags.py); upsert без правок их не трогает
+    version_hash: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    modified_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     chapters: Mapped[list["Chapter"]] = relationship("Chapter", back_populates="work", cascade="all, delete-orphan")
     fandoms: Mapped[list["WorkFandom"]] = relationship("WorkFandom", back_populates="work", cascade="all, delete-orphan")
@@ -67,21 +78,54 @@ class Chapter(Base):
     __tablename__ = "chapters"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True)
+    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"))
     chapter_number: Mapped[int] = mapped_column(Integer)
     title: Mapped[str | None] = mapped_column(String(500))
-    content_html: Mapped[str] = mapped_column(Text)
+    # NULL — текст в chapter_bodies по content_hash (app/chapters.py)
+    content_html: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # считаются при upsert (app/chapters.py)
+    word_count: Mapped[int] = mapped_column(Integer)
+    content_hash: Mapped[bytes] = mapped_column(LargeBinary)
 
     work: Mapped[Work] = relationship("Work", back_populates="chapters")
     reading_history: Mapped[list["ReadingHistory"]] = relationship("ReadingHistory", back_populates="chapter")
 
 
+class Tag(Base):
+    """Словарь тегов: строка хранится один раз, связи ссылаются на id. usage_count — для автодополнения и плана поиска."""
+    __tablename__ = "tags"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    normalized: Mapped[str] = mapped_column(String(200), nullable=False)
+    usage_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+
+class Fandom(Base):
+    __tablename__ = "fandoms"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    normalized: Mapped[str] = mapped_column(String(200), nullable=False)
+    usage_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+
+class ContentWarning(Base):
+    __tablename__ = "warnings"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    normalized: Mapped[str] = mapped_column(String(200), nullable=False)
+    usage_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+
 class WorkFandom(Base):
     __tablename__ = "work_fandoms"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True)
-    fandom: Mapped[str] = mapped_column(String(200), index=True)
+    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), primary_key=True)
+    fandom_id: Mapped[int] = mapped_column(Integer, ForeignKey("fandoms.id"), primary_key=True)
+    # порядок значений на странице источника
+    position: Mapped[int] = mapped_column(SmallInteger, nullable=False)
 
     work: Mapped[Work] = relationship("Work", back_populates="fandoms")
 
@@ -89,9 +133,9 @@ class WorkFandom(Base):
 class WorkTag(Base):
     __tablename__ = "work_tags"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True)
-    tag: Mapped[str] = mapped_column(String(200), index=True)
+    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), primary_key=True)
+    tag_id: Mapped[int] = mapped_column(Integer, ForeignKey("tags.id"), primary_key=True)
+    position: Mapped[int] = mapped_column(SmallInteger, nullable=False)
 
     work: Mapped[Work] = relationship("Work", back_populates="tags")
 
@@ -99,13 +143,23 @@ class WorkTag(Base):
 class WorkWarning(Base):
     __tablename__ = "work_warnings"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), index=True)
-    warning: Mapped[str] = mapped_column(String(200), index=True)
+    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), primary_key=True)
+    warning_id: Mapped[int] = mapped_column(Integer, ForeignKey("warnings.id"), primary_key=True)
+    position: Mapped[int] = mapped_column(SmallInteger, nullable=False)
 
     work: Mapped[Work] = relationship("Work", back_populates="warnings")
 
 
+class WorkSearch(Base):
+    """Проекция для фильтров поиска: id значений словарей массивами (GIN), синхронизируется в perform_upsert."""
+    __tablename__ = "work_search"
+
+    work_id: Mapped[int] = mapped_column(Integer, ForeignKey("works.id", ondelete="CASCADE"), primary_key=True)
+    tag_ids: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False, server_default="{}")
+    fandom_ids: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False, server_default="{}")
+    warning_ids: Mapped[list[int]] = mapped_column(ARRAY(Integer), nullable=False, server_default="{}")
+
+
 class Pairing(Base):
     __tablename__ = "pairings"
     id = Column(Integer, primary_key=True)
@@ -123,8 +177,9 @@ class ReadingHistory(Base):
     __tablename__ = "reading_history"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
-    chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
+    work_id = Column(Integer, ForeignKey("works.id", ondelete="CASCADE"), nullable=False)
+    # главы пересоздаются при upsert работы: ссылка на прочитанную главу обнуляется
+    chapter_id = Column(Integer, ForeignKey("chapters.id", ondelete="SET NULL"), nullable=True)
     progress = Column(Float, default=0.0)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -138,3 +193,15 @@ class User(Base, SQLAlchemyBaseUserTable[int]):
 # Индексы для ускорения поиска/сортировок
 Index("idx_works_title_trgm", Work.title)
 Index("idx_works_summary_trgm", Work.summary)
+Index("idx_work_search_tag_ids", WorkSearch.tag_ids, postgresql_using="gin")
+Index("idx_work_search_fandom_ids", WorkSearch.fandom_ids, postgresql_using="gin")
+Index("idx_work_search_warning_ids", WorkSearch.warning_ids, postgresql_using="gin")
+# фильтры по значению словаря: от id значения к работам
+Index("ix_work_tags_tag_id_work_id", WorkTag.tag_id, WorkTag.work_id)
+Index("ix_work_fandoms_fandom_id_work_id", WorkFandom.fandom_id, WorkFandom.work_id)
+Index("ix_work_warnings_warning_id_work_id", WorkWarning.warning_id, WorkWarning.work_id)
+# оглавление работы index-only scan'ом: без тел глав
+Index(
+    "ix_chapters_toc", Chapter.work_id, Chapter.chapter_number,
+    postgresql_include=["title", "word_count", "content_hash"],
+)
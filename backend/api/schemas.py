@@ -81,6 +81,8 @@ class ReadingHistoryCreate(ReadingHistoryBase):
 class ReadingHistory(ReadingHistoryBase):
     id: int
     user_id: int
+    # None — глава пересоздана перезаливом работы
+    chapter_id: Optional[int] = None
 
     class Config:
         from_attributes = True
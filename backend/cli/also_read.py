@@ -0,0 +1,166 @@
+"""
+Пакетная сборка "читали также" для /api/v1/works/{id}/also-read и /api/v1/recommendations.
+
+- Матрица пользователь × работа из reading_history и закладок: 1, если
+  пользователь открывал работу или добавил её в закладки.
+- Сходство работ i и j — косинус столбцов: совместных читателей / sqrt(n_i * n_j).
+  Пары меньше чем с ALSO_READ_MIN_COREADERS общими читателями отбрасываются —
+  один и тот же человек, прочитавший две работы, ещё не сигнал.
+- Совместные чтения считаются блоками столбцов (A^T A[:, блок]): полная матрица
+  работа × работа на миллионе работ в память не помещается.
+- --full пересчитывает все работы. Без флага — только работы пользователей,
+  активных после водяной отметки (их история или закладки менялись): у этих
+  работ изменились совместные чтения. Их списки считаются заново, в чужие они
+  входят, если теперь проходят по score (как в similar_works). Удалённые
+  закладки следа во времени не оставляют — их учтёт следующий --full.
+
+    python -m backend.cli.also_read --full
+    python -m backend.cli.also_read
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.cli.similar_works import load_thresholds, merge_changed, write_neighbours
+
+log = logging.getLogger(__name__)
+
+ALSO_READ_TOP_K = int(os.getenv("ALSO_READ_TOP_K", "20"))
+ALSO_READ_MIN_COREADERS = int(os.getenv("ALSO_READ_MIN_COREADERS", "2"))
+# столбцов в блоке A^T A
+BLOCK = 2000
+WATERMARK_OVERLAP = timedelta(seconds=300)
+LOCK_KEY = "also_read"
+TABLE = "work_also_read"
+
+_INTERACTIONS_SQL = """
+    SELECT user_id, work_id FROM reading_history
+    UNION
+    SELECT user_id, work_id FROM bookmarks
+"""
+
+
+class Interactions:
+    """Бинарная матрица пользователь × работа и счётчики читателей работ."""
+
+    def __init__(self, pairs: np.ndarray):
+        self.users, rows = np.unique(pairs[:, 0], return_inverse=True)
+        self.works, cols = np.unique(pairs[:, 1], return_inverse=True)
+        self.matrix = sparse.csc_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (rows, cols)), shape=(len(self.users), len(self.works)),
+        )
+        self.matrix.sum_duplicates()
+        self.matrix.data[:] = 1
+        self.readers = np.diff(self.matrix.indptr).astype(np.float32)
+        self._transposed = self.matrix.T.tocsr()
+
+    def columns(self, work_ids: np.ndarray) -> np.ndarray:
+        """Номера столбцов работ; работы без читателей отбрасываются."""
+        return np.searchsorted(self.works, work_ids[np.isin(work_ids, self.works)])
+
+    def scores(self, cols: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """Для каждого столбца из cols — (id работы, id работ с общими читателями, косинус)."""
+        for start in range(0, len(cols), BLOCK):
+            block = cols[start:start + BLOCK]
+            co = (self._transposed @ self.matrix[:, block]).tocsc()
+            for i, col in enumerate(block):
+                lo, hi = co.indptr[i], co.indptr[i + 1]
+                other, counts = co.indices[lo:hi], co.data[lo:hi]
+                keep = (other != col) & (counts >= ALSO_READ_MIN_COREADERS)
+                other, counts = other[keep], counts[keep]
+                yield int(self.works[col]), self.works[other], counts / np.sqrt(self.readers[other] * self.readers[col])
+
+
+def top(other: np.ndarray, scores: np.ndarray, k: int = ALSO_READ_TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        other, scores = other[part], scores[part]
+    order = np.lexsort((other, -scores))
+    return other[order], scores[order]
+
+
+def _load(conn: Connection) -> Optional[Interactions]:
+    pairs = np.array(conn.execute(text(_INTERACTIONS_SQL)).all(), dtype=np.int64)
+    return Interactions(pairs) if len(pairs) else None
+
+
+def build_full(engine: Engine) -> int:
+    with engine.begin() as conn:
+        now = conn.execute(text("SELECT now()")).scalar_one()
+        data = _load(conn)
+        if data is not None:
+            lists = ((wid, *top(other, scores)) for wid, other, scores in data.scores(np.arange(len(data.works))))
+            write_neighbours(conn, TABLE, ((wid, n, s) for wid, n, s in lists if len(n)))
+        # у работы не осталось совместных читателей — её прежний список больше не верен
+        conn.execute(text(f"DELETE FROM {TABLE} WHERE computed_at < :now"), {"now": now})
+        conn.execute(text("""
+            INSERT INTO also_read_state (id, watermark) VALUES (1, :now)
+            ON CONFLICT (id) DO UPDATE SET watermark = EXCLUDED.watermark
+        """), {"now": now})
+    return 0 if data is None else len(data.works)
+
+
+def refresh(engine: Engine) -> int:
+    """Пересчитывает работы пользователей, активных после водяной отметки. Возвращает
+    число пересчитанных работ; без состояния делает полную сборку."""
+    with engine.begin() as conn:
+        watermark = conn.execute(text("SELECT watermark FROM also_read_state WHERE id = 1")).scalar_one_or_none()
+        if watermark is None:
+            return build_full(engine)
+        now = conn.execute(text("SELECT now()")).scalar_one()
+        since = watermark - WATERMARK_OVERLAP
+        changed_ids = np.array(conn.execute(text("""
+            SELECT work_id FROM reading_history WHERE user_id IN (SELECT user_id FROM reading_history WHERE updated_at > :since
+                                                                  UNION SELECT user_id FROM bookmarks WHERE created_at > :since)
+            UNION
+            SELECT work_id FROM bookmarks WHERE user_id IN (SELECT user_id FROM reading_history WHERE updated_at > :since
+                                                            UNION SELECT user_id FROM bookmarks WHERE created_at > :since)
+        """), {"since": since}).scalars().all(), dtype=np.int64)
+        data = _load(conn) if len(changed_ids) else None
+        if data is not None:
+            _refresh_lists(conn, data, np.sort(changed_ids))
+        conn.execute(text("UPDATE also_read_state SET watermark = :now WHERE id = 1"), {"now": now})
+    return len(changed_ids)
+
+
+def _refresh_lists(conn: Connection, data: Interactions, changed_ids: np.ndarray) -> None:
+    changed = set(changed_ids.tolist())
+    lists, incoming = [], {}
+    scored = list(data.scores(data.columns(changed_ids)))
+    # пороги — только для работ, которые делят читателей с изменёнными
+    others = sorted({int(o) for _, other, _ in scored for o in other} - changed)
+    thresholds = load_thresholds(conn, TABLE, others, ALSO_READ_TOP_K)
+    for wid, other, scores in scored:
+        lists.append((wid, *top(other, scores)))
+        for oid, score in zip(other.tolist(), scores.tolist()):
+            if oid not in changed and score > thresholds.get(oid, -np.inf):
+                incoming.setdefault(oid, {})[wid] = score
+    write_neighbours(conn, TABLE, lists + merge_changed(conn, TABLE, changed, incoming, ALSO_READ_TOP_K))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build 'readers also read' lists from reading history and bookmarks")
+    p.add_argument("--full", action="store_true", help="recompute every work")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from backend.api.db.session import engine
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": LOCK_KEY}).scalar_one():
+            log.info("another also-read build is running, skipping")
+            return
+        started = time.perf_counter()
+        n = build_full(engine) if args.full else refresh(engine)
+        log.info("also-read: %d works in %.1fs", n, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
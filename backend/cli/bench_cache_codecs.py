@@ -0,0 +1,125 @@
+"""Микро-бенчмарк форматов значений кэша поиска на правдоподобных страницах SearchResponse.
+
+Сравнивает сериализацию (pydantic JSON / orjson / msgpack) и сжатие (none / zlib / zstd / lz4):
+размер записи в Redis и время кодирования/декодирования одной страницы.
+
+    python -m backend.cli.bench_cache_codecs --page-size 20 --pages 50
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+
+from backend.api.app import codec
+from backend.api.app.models import Author, SearchResponse, Work
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+WORDS = (
+    "Гарри Гермиона Рон Драко Хогвартс магия война после дружба любовь тайна школа "
+    "ночь зима письмо прошлое выбор судьба дом дорога сердце тень свет обещание "
+    "неожиданно медленно вместе навсегда снова никогда однажды почему-то вдруг"
+).split()
+TAGS = ["Романтика", "Ангст", "Флафф", "Драма", "Повседневность", "Hurt/Comfort", "AU",
+        "Юмор", "Приключения", "Повествование от первого лица", "Элементы слэша", "Учебные заведения"]
+FANDOMS = ["Гарри Поттер", "Наруто", "Шерлок (BBC)", "Marvel", "Genshin Impact", "Ведьмак", "Ориджиналы"]
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_page(rng: random.Random, page_size: int) -> SearchResponse:
+    works = []
+    for _ in range(page_size):
+        wid = rng.randint(1, 10**6)
+        works.append(Work(
+            id=str(wid),
+            site_id="ficbook",
+            site_work_id=str(wid * 7),
+            title=_sentence(rng, rng.randint(2, 6)).rstrip("."),
+            authors=[Author(name=_sentence(rng, 1).rstrip("."), url=f"https://ficbook.net/authors/{wid}")],
+            summary=" ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6))),
+            rating=rng.choice(["G", "PG-13", "R", "NC-17"]),
+            category=rng.choice(["gen", "het", "slash"]),
+            status=rng.choice(["completed", "in_progress", "frozen"]),
+            language="ru",
+            word_count=rng.randint(1000, 300000),
+            chapter_count=rng.randint(1, 80),
+            kudos_count=rng.randint(0, 5000),
+            comments_count=rng.randint(0, 900),
+            created_at="2023-05-14T10:22:00+03:00",
+            updated_at="2024-01-03T18:40:00+03:00",
+            tags=rng.sample(TAGS, rng.randint(2, 8)),
+            fandoms=rng.sample(FANDOMS, rng.randint(1, 2)),
+            url=f"https://ficbook.net/readfic/{wid}",
+        ))
+    return SearchResponse(works=works, total=12345, page=1, page_size=page_size, total_pages=618)
+
+
+def _serializers() -> Dict[str, Tuple[Callable[[SearchResponse], bytes], Callable[[bytes], object]]]:
+    out = {
+        "json": (lambda r: r.model_dump_json(exclude_none=True).encode("utf-8"), json.loads),
+        "json-ascii": (lambda r: json.dumps(r.model_dump(mode="json", exclude_none=True)).encode("ascii"), json.loads),
+    }
+    if orjson is not None:
+        out["orjson"] = (lambda r: orjson.dumps(r.model_dump(mode="json", exclude_none=True)), orjson.loads)
+    if msgpack is not None:
+        out["msgpack"] = (lambda r: msgpack.packb(r.model_dump(mode="json", exclude_none=True)), msgpack.unpackb)
+    return out
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run(page_size: int, pages: int, repeat: int) -> List[dict]:
+    rng = random.Random(42)
+    responses = [make_page(rng, page_size) for _ in range(pages)]
+    rows = []
+    for ser_name, (dump, load) in _serializers().items():
+        bodies = [dump(r) for r in responses]
+        ser_us = sum(_timeit(lambda r=r: dump(r), repeat) for r in responses) / pages
+        de_us = sum(_timeit(lambda b=b: load(b), repeat) for b in bodies) / pages
+        for cid, (comp_name, compress, decompress) in sorted(codec.COMPRESSORS.items()):
+            packed = [compress(b) for b in bodies]
+            rows.append({
+                "serializer": ser_name,
+                "compressor": comp_name,
+                "bytes": sum(len(p) for p in packed) // pages,
+                "encode_us": ser_us + sum(_timeit(lambda b=b: compress(b), repeat) for b in bodies) / pages,
+                "decode_us": de_us + sum(_timeit(lambda p=p: decompress(p), repeat) for p in packed) / pages,
+            })
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare cache value codecs on SearchResponse pages")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = run(args.page_size, args.pages, args.repeat)
+    baseline = next(r["bytes"] for r in rows if r["serializer"] == "json" and r["compressor"] == "none")
+    print(f"{'serializer':<11} {'compressor':<10} {'bytes':>8} {'ratio':>6} {'encode µs':>10} {'decode µs':>10}")
+    for r in rows:
+        print(f"{r['serializer']:<11} {r['compressor']:<10} {r['bytes']:>8} {baseline / r['bytes']:>6.2f} "
+              f"{r['encode_us']:>10.1f} {r['decode_us']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+"""Сжатие текстов глав (chapter_bodies): степень сжатия и скорость распаковки.
+
+Словарь обучается на половине выборки, меряется на другой половине — как в
+проде, где словарь обучен на старых главах, а сжимаются новые. Сравнивается
+с zstd без словаря и с тем, что PostgreSQL делает с Text сам (pglz в TOAST,
+оценка через zlib -1 — pglz жмёт не лучше).
+
+    python -m backend.cli.bench_chapter_bodies --db --chapters 2000
+    python -m backend.cli.bench_chapter_bodies --chapters 2000
+
+Без --db главы синтетические: русскоподобные слова по Ципфу в абзацах <p> с
+типичной для парсеров разметкой. Степень сжатия на них ниже настоящей прозы —
+у синтетики нет повторяющихся оборотов; для решений берите --db.
+"""
+import argparse
+import time
+import zlib
+from typing import List
+
+import numpy as np
+import zstandard
+
+from backend.api.app import chapters
+from backend.cli.chapter_bodies import CHAPTER_DICT_SIZE, sample_texts
+
+SYLLABLES = "ка ло ре ни то ва ми па сто ра ше ль жи ну ди го бы да ве ли ся ко ру зе хо ты".split()
+ENDINGS = ["", "а", "ы", "ой", "ом", "ами", "ет", "ит", "ал", "ала", "ого", "ему"]
+
+
+def synthetic(n: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    stems = ["".join(rng.choice(SYLLABLES, rng.integers(1, 4))) for _ in range(20000)]
+    p = 1 / np.arange(1, len(stems) + 1)
+    p /= p.sum()
+    cdf = np.cumsum(p)
+    texts = []
+    for _ in range(n):
+        paragraphs = []
+        for _ in range(rng.integers(20, 120)):
+            size = rng.integers(15, 80)
+            stem_ids = np.minimum(np.searchsorted(cdf, rng.random(size)), len(stems) - 1)
+            words = [stems[i] + ENDINGS[e] for i, e in zip(stem_ids, rng.integers(0, len(ENDINGS), size))]
+            sentence = " ".join(words).capitalize()
+            if rng.random() < 0.2:
+                sentence = f"&mdash; {sentence}, &laquo;{words[0]}&raquo;"
+            paragraphs.append(f'<p style="text-align: justify;">{sentence}.</p>')
+        texts.append("\n".join(paragraphs))
+    return texts
+
+
+def _measure(name: str, raw: List[bytes], compress, decompress) -> None:
+    started = time.perf_counter()
+    packed = [compress(b) for b in raw]
+    packing = time.perf_counter() - started
+    started = time.perf_counter()
+    for b in packed:
+        decompress(b)
+    unpacking = time.perf_counter() - started
+    total, small = sum(map(len, raw)), sum(map(len, packed))
+    print(f"{name:<22} ratio {total / small:5.2f}   {small / len(raw) / 1024:6.1f} KB/chapter   "
+          f"compress {total / packing / 2**20:7.1f} MB/s   decode {total / unpacking / 2**20:7.1f} MB/s")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Chapter body compression benchmark")
+    p.add_argument("--chapters", type=int, default=2000)
+    p.add_argument("--db", action="store_true", help="sample chapters from the database instead of synthetic ones")
+    p.add_argument("--levels", default=f"3,{chapters.CHAPTER_ZSTD_LEVEL},19")
+    args = p.parse_args()
+
+    if args.db:
+        from backend.api.db.session import engine
+        with engine.connect() as conn:
+            texts = sample_texts(conn, args.chapters)
+    else:
+        texts = synthetic(args.chapters)
+    raw = [t.encode("utf-8") for t in texts]
+    train, test = raw[::2], raw[1::2]
+    print(f"{len(test)} chapters, {sum(map(len, test)) / len(test) / 1024:.1f} KB average, "
+          f"dictionary {CHAPTER_DICT_SIZE // 1024} KB trained on {len(train)}")
+
+    _measure("zlib -1 (~pglz)", test, lambda b: zlib.compress(b, 1), zlib.decompress)
+    for level in (int(x) for x in args.levels.split(",")):
+        zd = zstandard.ZstdDecompressor()
+        _measure(f"zstd {level}", test, zstandard.ZstdCompressor(level=level).compress, zd.decompress)
+        d = zstandard.train_dictionary(CHAPTER_DICT_SIZE, train, level=level)
+        zdd = zstandard.ZstdDecompressor(dict_data=d)
+        _measure(f"zstd {level} + dictionary", test, zstandard.ZstdCompressor(level=level, dict_data=d).compress, zdd.decompress)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Пропускная способность поиска: sync-путь (psycopg в пуле потоков, как sync-эндпоинты
+FastAPI) против async-пути (asyncpg в одном event loop). Кэш не участвует —
+меряется путь промаха: страница + count.
+
+    python -m backend.cli.bench_search_async --requests 2000 --concurrency 200
+
+Sync-путь ограничен числом потоков (--threads, по умолчанию 40 — лимит
+threadpool Starlette) и пулом соединений sync-движка; async — только пулом
+ASYNC_DB_POOL_SIZE + ASYNC_DB_MAX_OVERFLOW. Если БД на той же машине, оба пути
+упираются в CPU и выходят вровень; --db-wait-ms добавляет в каждый запрос
+pg_sleep — ожидание сети/диска удалённой БД, во время которого sync-путь держит поток.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from backend.api.app.models import SearchFilters
+from backend.api.app import dictionaries, search
+from backend.api.app.search import COUNT_EXACT_LIMIT, build_search_query, count_search_async, execute_search_async, has_work_search
+from backend.api.db.get_async_session import async_session, engine as async_engine
+from backend.api.db.session import SessionLocal, engine
+from sqlalchemy import text
+
+QUERIES = ["любовь", "магия", "война", "Гарри", "школа", "тайна", None]
+SORTS = ["updated", "kudos", "title", "relevance"]
+DB_WAIT_SQL = text("SELECT pg_sleep(:s)")
+db_wait = 0.0
+
+
+def make_filters(rng: random.Random) -> SearchFilters:
+    return SearchFilters(query=rng.choice(QUERIES), sort_by=rng.choice(SORTS), page=rng.randint(1, 3), page_size=20)
+
+
+def sync_search(filters: SearchFilters) -> float:
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        conn = db.connection()
+        if db_wait:
+            conn.execute(DB_WAIT_SQL, {"s": db_wait})
+        # те же запросы, что у async-пути (страница, затем count), через psycopg
+        terms = dictionaries.load(conn, filters) if dictionaries.needs_terms(filters) else None
+        use_projection = has_work_search(conn)
+        sql, params = build_search_query(filters, use_projection, None, terms)
+        conn.execute(text(sql), params).mappings().all()
+        _, where_sql, params = search._count_query(filters, use_projection, None, terms)
+        if conn.execute(text(search._capped_count_sql(where_sql)), params).scalar_one() > COUNT_EXACT_LIMIT:
+            params.pop("count_limit")
+            conn.execute(text(search._estimate_sql(where_sql)), params).scalar_one()
+    return time.perf_counter() - started
+
+
+async def async_search(filters: SearchFilters) -> float:
+    started = time.perf_counter()
+    async with async_session() as db:
+        conn = await db.connection()
+        if db_wait:
+            await conn.execute(DB_WAIT_SQL, {"s": db_wait})
+        (await execute_search_async(conn, filters)).mappings().all()
+        await count_search_async(conn, filters)
+    return time.perf_counter() - started
+
+
+async def run_sync(filters: List[SearchFilters], concurrency: int, threads: int) -> List[float]:
+    # так запрос обслуживает sync-эндпоинт: корутина ждёт свободный поток
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        async def one(f: SearchFilters) -> float:
+            async with sem:
+                started = time.perf_counter()
+                await loop.run_in_executor(pool, sync_search, f)
+                return time.perf_counter() - started
+        return await asyncio.gather(*(one(f) for f in filters))
+
+
+async def run_async(filters: List[SearchFilters], concurrency: int) -> List[float]:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(f: SearchFilters) -> float:
+        async with sem:
+            return await async_search(f)
+    return await asyncio.gather(*(one(f) for f in filters))
+
+
+def report(name: str, latencies: List[float], elapsed: float) -> None:
+    lat = sorted(latencies)
+    p95 = lat[int(len(lat) * 0.95) - 1]
+    print(f"{name:<6} {len(lat) / elapsed:>9.1f} req/s   p50 {statistics.median(lat) * 1000:>7.1f} ms   p95 {p95 * 1000:>7.1f} ms")
+
+
+async def main_async(args) -> None:
+    rng = random.Random(42)
+    filters = [make_filters(rng) for _ in range(args.requests)]
+    # прогрев: соединения в пулах и планы запросов
+    await run_sync(filters[:50], 10, args.threads)
+    await run_async(filters[:50], 10)
+
+    started = time.perf_counter()
+    lat = await run_sync(filters, args.concurrency, args.threads)
+    report("sync", lat, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    lat = await run_async(filters, args.concurrency)
+    report("async", lat, time.perf_counter() - started)
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare sync vs async search throughput on the current DATABASE_URL")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=40)
+    parser.add_argument("--db-wait-ms", type=float, default=0, help="simulated remote DB wait per request")
+    args = parser.parse_args()
+    global db_wait
+    db_wait = args.db_wait_ms / 1000
+    asyncio.run(main_async(args))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+"""CPU на сериализацию ответа поиска: прежний путь через pydantic против быстрого.
+
+- hit: прежде json.loads + SearchResponse(**) + валидация response_model +
+  jsonable_encoder + JSONResponse; теперь — готовые байты из кэша в Response.
+- miss: прежде Work на строку + model_dump_json; теперь — dict по схеме + orjson.
+
+    python -m backend.cli.bench_search_serialize --page-size 20 --repeat 2000
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from backend.api.app.models import Author, SearchResponse, Work
+from backend.api.app.serialize import raw_json, search_page_json
+from backend.cli.bench_cache_codecs import FANDOMS, TAGS, _sentence
+
+META = dict(total=12345, page=1, page_size=20, total_pages=618, total_exact=True, next_cursor="eyJzIjoidXBkYXRlZCJ9")
+
+
+def make_rows(rng: random.Random, page_size: int) -> List[dict]:
+    rows = []
+    for _ in range(page_size):
+        wid = rng.randint(1, 10**6)
+        rows.append({
+            "id": wid,
+            "title": _sentence(rng, rng.randint(2, 6)).rstrip("."),
+            "summary": " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 6))),
+            "language": "ru",
+            "rating": rng.choice(["G", "PG-13", "R", "NC-17"]),
+            "status": rng.choice(["completed", "in_progress", "frozen"]),
+            "word_count": rng.randint(1000, 300000),
+            "likes_count": rng.randint(0, 5000),
+            "comments_count": rng.randint(0, 900),
+            "updated_at": "2024-01-03",
+            "original_url": f"https://ficbook.net/readfic/{wid}",
+            "author_id": wid % 1000 + 1,
+            "author_name": _sentence(rng, 1).rstrip("."),
+            "author_url": f"https://ficbook.net/authors/{wid % 1000 + 1}",
+            "tags": rng.sample(TAGS, rng.randint(2, 8)),
+            "fandoms": rng.sample(FANDOMS, rng.randint(1, 2)),
+            "warnings": [],
+        })
+    return rows
+
+
+def old_miss(rows: List[dict]) -> bytes:
+    works = [
+        Work(
+            id=str(r["id"]),
+            title=r["title"],
+            authors=[Author(id=str(r["author_id"]), name=r["author_name"], url=r["author_url"])],
+            summary=r["summary"] or "",
+            language=r["language"],
+            fandoms=list(r["fandoms"]),
+            tags=list(r["tags"]),
+            warnings=list(r["warnings"]),
+            rating=r["rating"],
+            status=r["status"],
+            word_count=r["word_count"],
+            kudos_count=r["likes_count"],
+            comments_count=r["comments_count"],
+            updated_at=r["updated_at"],
+            url=r["original_url"],
+        )
+        for r in rows
+    ]
+    return SearchResponse(works=works, **META).model_dump_json(exclude_none=True).encode("utf-8")
+
+
+def old_hit(cached: bytes) -> bytes:
+    resp = SearchResponse.model_validate_json(cached)
+    # что делает FastAPI с возвращённой моделью при response_model
+    validated = SearchResponse.model_validate(resp.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def new_miss(rows: List[dict]) -> bytes:
+    return search_page_json(rows, **META)
+
+
+def new_hit(cached: bytes) -> bytes:
+    return raw_json(cached).body
+
+
+def cpu_us(fn: Callable[[], object], repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CPU per search response: pydantic path vs raw JSON fast path")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(random.Random(42), args.page_size)
+    cached = new_miss(rows)
+    results = {
+        "miss": (cpu_us(lambda: old_hit(old_miss(rows)), args.repeat), cpu_us(lambda: new_hit(new_miss(rows)), args.repeat)),
+        "hit": (cpu_us(lambda: old_hit(cached), args.repeat), cpu_us(lambda: new_hit(cached), args.repeat)),
+    }
+    print(f"{'path':<6} {'pydantic µs':>12} {'fast µs':>10} {'speedup':>8}")
+    for name, (old, new) in results.items():
+        print(f"{name:<6} {old:>12.1f} {new:>10.1f} {old / new:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""Сборка "похожих работ" (similar_works.py) на синтетическом корпусе без БД.
+
+Меряет время и пиковую память по этапам полной сборки — признаки, SVD, эмбеддинги,
+кластеры, соседи — и полноту поиска по кластерам относительно точного перебора
+на выборке работ (recall@K). Запись в БД не входит.
+
+    python -m backend.cli.bench_similar_works --works 1000000
+
+Корпус: фандомы со скошенными (Ципф) размерами, у каждого свой словарь; summary
+работы — смесь слов фандома и общих слов, плюс 3-6 тегов из общего пула.
+"""
+import argparse
+import time
+from typing import Iterator, List
+
+import numpy as np
+
+from backend.cli import similar_works as sw
+
+N_FANDOMS = 2000
+N_TAGS = 5000
+COMMON_WORDS = 30000
+FANDOM_WORDS = 40
+SUMMARY_WORDS = 40
+
+
+def _word(i: int) -> str:
+    letters = []
+    i += 26 * 26
+    while i:
+        i, r = divmod(i, 26)
+        letters.append(chr(ord("a") + r))
+    return "".join(letters)
+
+
+def corpus(n: int, seed: int = 0) -> Iterator[List[sw.Row]]:
+    rng = np.random.default_rng(seed)
+    fandom_p = 1 / np.arange(1, N_FANDOMS + 1)
+    fandom_p /= fandom_p.sum()
+    common_p = 1 / np.arange(1, COMMON_WORDS + 1)
+    common_p /= common_p.sum()
+    words = [_word(i) for i in range(COMMON_WORDS + N_FANDOMS * FANDOM_WORDS)]
+    for start in range(1, n + 1, sw.BATCH):
+        size = min(sw.BATCH, n + 1 - start)
+        fandoms = rng.choice(N_FANDOMS, size, p=fandom_p)
+        common = rng.choice(COMMON_WORDS, (size, SUMMARY_WORDS // 2), p=common_p)
+        own = COMMON_WORDS + fandoms[:, None] * FANDOM_WORDS + rng.integers(0, FANDOM_WORDS, (size, SUMMARY_WORDS // 2))
+        tags = rng.zipf(1.3, (size, 6)) % N_TAGS
+        n_tags = rng.integers(3, 7, size)
+        yield [
+            (start + i, None, " ".join(words[w] for w in (*common[i], *own[i])), tags[i, :n_tags[i]].tolist(), [int(fandoms[i])])
+            for i in range(size)
+        ]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Similar works build benchmark on a synthetic corpus")
+    p.add_argument("--works", type=int, default=100000)
+    p.add_argument("--recall-sample", type=int, default=1000, help="works checked against exact top-K")
+    args = p.parse_args()
+
+    timings = {}
+    mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage], mark = now - mark, now
+        print(f"{stage:<12} {timings[stage]:8.1f}s   peak RSS {sw._peak_rss_mb():7.0f} MB", flush=True)
+
+    # как в build_full: два прохода по корпусу, второй — эмбеддинги
+    rng = np.random.default_rng(0)
+    df = np.zeros(sw.N_FEATURES, dtype=np.float64)
+    sample = []
+    for rows in corpus(args.works):
+        _, X = sw.featurize(rows)
+        df += np.bincount(X.indices, minlength=sw.N_FEATURES)
+        sample.append(X[rng.random(X.shape[0]) < sw.SVD_SAMPLE / args.works])
+    lap("features")
+    model = sw.Model.fit(df, args.works, sw.sparse.vstack(sample).tocsr())
+    del sample
+    lap("svd")
+    ids, E = [], []
+    for rows in corpus(args.works):
+        batch_ids, X = sw.featurize(rows)
+        ids.append(batch_ids)
+        E.append(model.embed(X))
+    ids, E = np.concatenate(ids), np.concatenate(E)
+    lap("embed")
+    model.fit_clusters(E, sw.SIMILAR_CLUSTERS or int(np.sqrt(len(ids))))
+    clusters = model.assign(E)
+    lap("clusters")
+    k = sw.SIMILAR_TOP_K
+    nb_ids = np.full((len(ids), k), -1, dtype=np.int64)
+    for wid, n_ids, _, _, _ in sw.neighbours(ids, E, clusters, model.probes(), k=k):
+        nb_ids[wid - 1, :len(n_ids)] = n_ids
+    lap("neighbours")
+
+    check = np.random.default_rng(1).choice(len(ids), min(args.recall_sample, len(ids)), replace=False)
+    hits = 0
+    for wid, exact, _, _ in sw.top_k(ids[check], E[check], ids, E, k):
+        hits += len(np.intersect1d(exact, nb_ids[wid - 1]))
+    print(f"total        {sum(timings.values()):8.1f}s")
+    print(f"recall@{k}    {hits / (len(check) * k):.3f}  ({len(check)} works vs exact top-K)")
+    print(f"embeddings   {E.nbytes / 2**20:8.0f} MB, model {sum(len(v) for v in model.to_db().values()) / 2**20:.0f} MB, "
+          f"{len(model.centroids)} clusters")
+
+
+if __name__ == "__main__":
+    main()
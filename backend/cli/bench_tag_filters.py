@@ -0,0 +1,165 @@
+"""Фильтры по тегам на большом наборе со скошенным распределением тегов.
+
+Сравнивает прежние формы SQL (include_tags — ИЛИ, исключения через `NOT IN`)
+с тем, что строит build_filter_clauses сейчас: И по include_tags, форма которого
+выбрана по частотам тегов, и NOT EXISTS для исключений. Оба пути — по проекции
+work_search (основной) и по work_tags (без миграции 0006); "no stats" — И без
+частот, чтобы было видно, что даёт статистика.
+
+    python -m backend.cli.bench_tag_filters --seed 1000000   # один раз, в пустую БД
+    python -m backend.cli.bench_tag_filters --repeat 5
+
+--seed создаёт работы 'bench-*' с частотами тегов по закону Ципфа: tag_1 есть
+почти у каждой пятой работы, хвост из тысяч тегов — у единиц. Берётся БД из
+DATABASE_URL; словарь tags и проекция work_search заполняются тоже.
+"""
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import Connection
+
+from backend.api.app import dictionaries, search
+from backend.api.app.models import SearchFilters
+from backend.api.db.session import engine
+
+N_TAGS = 5000
+TAGS_PER_WORK = 5
+
+SEED_SQL = [
+    "INSERT INTO sites (code, name) VALUES ('ficbook', 'Ficbook') ON CONFLICT (code) DO NOTHING",
+    """
+    INSERT INTO works (site_id, site_work_id, title, summary, language, rating, status, word_count,
+                       likes_count, comments_count, updated_at)
+    SELECT (SELECT id FROM sites WHERE code = 'ficbook'), 'bench-' || g, 'Работа ' || g, '', 'ru',
+           (ARRAY['G', 'PG-13', 'R', 'NC-17'])[1 + g % 4], 'completed', 1000 + g % 50000,
+           (g * 131) % 5000, (g * 17) % 300, timestamptz '2020-01-01' + (g % 1500) * interval '1 day'
+    FROM generate_series(1, :n) g
+    """,
+    """
+    INSERT INTO tags (name, normalized)
+    SELECT 'tag_' || g, 'tag_' || g FROM generate_series(1, :n_tags) g
+    ON CONFLICT (name) DO NOTHING
+    """,
+    # ранг тега ~ N_TAGS^u — частота обратно пропорциональна рангу (Ципф с s≈1)
+    """
+    INSERT INTO work_tags (work_id, tag_id, position)
+    SELECT r.work_id, t.id, row_number() OVER (PARTITION BY r.work_id ORDER BY t.id)
+    FROM (
+        SELECT DISTINCT w.id AS work_id, floor(power(:n_tags, random()))::int AS tag_rank
+        FROM works w CROSS JOIN generate_series(1, :per_work)
+        WHERE w.site_work_id LIKE 'bench-%'
+    ) r JOIN tags t ON t.name = 'tag_' || r.tag_rank
+    """,
+    """
+    INSERT INTO work_search (work_id, tag_ids)
+    SELECT work_id, array_agg(tag_id ORDER BY position) FROM work_tags
+    WHERE work_id IN (SELECT id FROM works WHERE site_work_id LIKE 'bench-%')
+    GROUP BY work_id
+    ON CONFLICT (work_id) DO UPDATE SET tag_ids = EXCLUDED.tag_ids
+    """,
+    """
+    UPDATE tags t SET usage_count = c.n
+    FROM (SELECT tag_id, count(*) AS n FROM work_tags GROUP BY tag_id) c
+    WHERE c.tag_id = t.id
+    """,
+    "ANALYZE works", "ANALYZE work_tags", "ANALYZE work_search", "ANALYZE tags",
+]
+
+# (название, include_tags, exclude_tags)
+CASES: List[Tuple[str, List[str], List[str]]] = [
+    ("frequent AND rare", ["tag_1", "tag_2", "tag_3000"], []),
+    ("two frequent", ["tag_1", "tag_2"], []),
+    ("three frequent", ["tag_1", "tag_5", "tag_9"], []),
+    ("mid AND tail", ["tag_40", "tag_150", "tag_4000"], []),
+    ("two mid", ["tag_20", "tag_30"], []),
+    ("exclude frequent", ["tag_30"], ["tag_1", "tag_2"]),
+]
+
+
+def _filters(include: List[str], exclude: List[str]) -> SearchFilters:
+    return SearchFilters(include_tags=include or None, exclude_tags=exclude or None)
+
+
+def legacy_clauses(conn: Connection, include: List[str], exclude: List[str], use_projection: bool) -> Tuple[List[str], dict]:
+    """Как фильтры по тегам строились до планировщика (include_tags — ИЛИ, NOT IN), на id словаря."""
+    terms = dictionaries.load(conn, _filters(include, exclude))
+    clauses, params = [], {"include_tags": terms.ids("tag", include), "exclude_tags": terms.ids("tag", exclude)}
+    if use_projection:
+        array_clauses = ["ws.tag_ids && CAST(:include_tags AS integer[])"] if include else []
+        if exclude:
+            array_clauses.append("NOT (ws.tag_ids && CAST(:exclude_tags AS integer[]))")
+        clauses.append("works.id IN (SELECT ws.work_id FROM work_search ws WHERE " + " AND ".join(array_clauses) + ")")
+        return clauses, params
+    if include:
+        clauses.append("id IN (SELECT work_id FROM work_tags WHERE tag_id = ANY(:include_tags))")
+    if exclude:
+        clauses.append("id NOT IN (SELECT work_id FROM work_tags WHERE tag_id = ANY(:exclude_tags))")
+    return clauses, params
+
+
+def planned_clauses(conn: Connection, include: List[str], exclude: List[str], use_projection: bool,
+                    with_stats: bool = True) -> Tuple[List[str], dict]:
+    filters = _filters(include, exclude)
+    terms = dictionaries.load(conn, filters)
+    if not with_stats:
+        # все теги одинаково частые: порядок запроса, без сбора кандидатов
+        terms = terms._replace(found={k: t._replace(usage_count=terms.works) for k, t in terms.found.items()})
+    return search.build_filter_clauses(filters, use_projection, terms=terms)
+
+
+def page_ms(conn: Connection, clauses: List[str], params: dict, repeat: int) -> Tuple[Optional[float], int]:
+    """Медиана времени первой страницы (sort=kudos) и число строк; None — упёрлись в statement_timeout."""
+    where_sql = " WHERE " + " AND ".join(clauses)
+    sql = text(f"SELECT id FROM works {where_sql} ORDER BY COALESCE(likes_count, 0) DESC, id DESC LIMIT 21")
+    timings, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            rows = len(conn.execute(sql, params).all())
+        except OperationalError:
+            conn.rollback()
+            return None, 0
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tag filter SQL on a skewed dataset: legacy vs planned")
+    parser.add_argument("--seed", type=int, default=0, help="insert N synthetic works first")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout-s", type=int, default=60, help="statement_timeout per query")
+    args = parser.parse_args()
+
+    if args.seed:
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for sql in SEED_SQL:
+                conn.execute(text(sql), {"n": args.seed, "n_tags": N_TAGS, "per_work": TAGS_PER_WORK})
+        print(f"seeded {args.seed} works in {time.perf_counter() - started:.0f}s")
+
+    strategies: Dict[str, Callable] = {
+        "legacy, work_search": lambda conn, inc, exc: legacy_clauses(conn, inc, exc, True),
+        "AND, no stats, work_search": lambda conn, inc, exc: planned_clauses(conn, inc, exc, True, with_stats=False),
+        "planned, work_search": lambda conn, inc, exc: planned_clauses(conn, inc, exc, True),
+        "legacy, work_tags": lambda conn, inc, exc: legacy_clauses(conn, inc, exc, False),
+        "AND, no stats, work_tags": lambda conn, inc, exc: planned_clauses(conn, inc, exc, False, with_stats=False),
+        "planned, work_tags": lambda conn, inc, exc: planned_clauses(conn, inc, exc, False),
+    }
+    with engine.connect() as conn:
+        for name, include, exclude in CASES:
+            print(f"\n{name}: include={include} exclude={exclude}")
+            for label, build in strategies.items():
+                conn.execute(text(f"SET statement_timeout = {args.timeout_s * 1000}"))
+                clauses, params = build(conn, include, exclude)
+                ms, rows = page_ms(conn, clauses, params, args.repeat)
+                took = f"{ms:>9.1f} ms" if ms is not None else f"  >{args.timeout_s}s   "
+                print(f"  {label:<28} {took}  rows={rows}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
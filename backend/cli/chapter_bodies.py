@@ -0,0 +1,132 @@
+"""
+Обслуживание хранилища текстов глав (chapter_bodies, backend/api/app/chapters.py).
+
+- train   — обучает zstd-словарь на случайной выборке глав и сохраняет его
+  новой строкой chapter_dictionaries; нормализатор подхватит его через
+  CHAPTER_DICT_REFRESH секунд. Уже сжатые тексты остаются со своим словарём,
+  --recompress пережимает их новым.
+- migrate — переносит content_html, оставшийся в chapters, в chapter_bodies
+  пачками; прерванный перенос продолжается с места остановки. Место в chapters
+  освободит VACUUM FULL (или pg_repack) после переноса.
+- gc      — удаляет тексты, на которые не ссылается ни одна глава (правки и
+  удалённые работы). Держит монопольную блокировку, при которой upsert ждёт.
+
+    python -m backend.cli.chapter_bodies train
+    python -m backend.cli.chapter_bodies migrate
+    python -m backend.cli.chapter_bodies gc
+"""
+import argparse
+import logging
+import os
+import time
+from typing import List
+
+import zstandard
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.api.app import chapters
+
+log = logging.getLogger(__name__)
+
+CHAPTER_DICT_SIZE = int(os.getenv("CHAPTER_DICT_SIZE", str(112 * 1024)))
+CHAPTER_DICT_SAMPLES = int(os.getenv("CHAPTER_DICT_SAMPLES", "5000"))
+BATCH = 1000
+
+
+def sample_texts(conn: Connection, n: int = CHAPTER_DICT_SAMPLES) -> List[str]:
+    rows = conn.execute(text(f"""
+        SELECT {chapters.BODY_COLUMNS_SQL}
+        FROM (SELECT content_hash, content_html FROM chapters ORDER BY random() LIMIT :n) c
+        {chapters.BODY_JOIN_SQL}
+    """), {"n": n}).mappings().all()
+    return [r["content_html"] for r in chapters.decode_rows(conn, rows) if r["content_html"]]
+
+
+def train(engine: Engine, size: int = CHAPTER_DICT_SIZE) -> int:
+    with engine.begin() as conn:
+        samples = [t.encode("utf-8") for t in sample_texts(conn)]
+        if not samples:
+            raise SystemExit("no chapters to train on")
+        dictionary = zstandard.train_dictionary(size, samples, level=chapters.CHAPTER_ZSTD_LEVEL)
+        dict_id = conn.execute(text("""
+            INSERT INTO chapter_dictionaries (id, dictionary)
+            SELECT coalesce(max(id), 0) + 1, :dictionary FROM chapter_dictionaries
+            RETURNING id
+        """), {"dictionary": dictionary.as_bytes()}).scalar_one()
+    log.info("dictionary %d: %d bytes from %d chapters (%.1f MB)",
+             dict_id, len(dictionary.as_bytes()), len(samples), sum(map(len, samples)) / 2**20)
+    return dict_id
+
+
+def recompress(engine: Engine, dict_id: int) -> int:
+    """Пережимает тексты со старыми словарями словарём dict_id."""
+    done, last = 0, b""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT content_hash, dict_id, body, NULL AS content_html FROM chapter_bodies
+                WHERE content_hash > :last AND dict_id IS DISTINCT FROM :dict_id
+                ORDER BY content_hash LIMIT :batch
+            """), {"last": last, "dict_id": dict_id, "batch": BATCH}).mappings().all()
+            if not rows:
+                return done
+            decoded = chapters.decode_rows(conn, rows)
+            chapters.load_dictionaries(conn, [dict_id])
+            conn.execute(text("UPDATE chapter_bodies SET dict_id = :dict_id, body = :body WHERE content_hash = :hash"), [
+                {"hash": r["content_hash"], "dict_id": dict_id, "body": chapters.compress(r["content_html"], dict_id)}
+                for r in decoded
+            ])
+        done += len(rows)
+        last = rows[-1]["content_hash"]
+        log.info("recompressed %d", done)
+
+
+def migrate(engine: Engine) -> int:
+    done, last = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT id, content_hash, content_html FROM chapters
+                WHERE content_html IS NOT NULL AND id > :last ORDER BY id LIMIT :batch
+            """), {"last": last, "batch": BATCH}).all()
+            if not rows:
+                return done
+            chapters.store_bodies(conn, {r.content_hash: r.content_html for r in rows})
+            conn.execute(text("UPDATE chapters SET content_html = NULL WHERE id = ANY(:ids)"), {"ids": [r.id for r in rows]})
+        done += len(rows)
+        last = rows[-1].id
+        log.info("moved %d chapters", done)
+
+
+def gc(engine: Engine) -> int:
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": chapters.GC_LOCK_KEY})
+        return conn.execute(text("""
+            DELETE FROM chapter_bodies b
+            WHERE NOT EXISTS (SELECT 1 FROM chapters c WHERE c.content_hash = b.content_hash)
+        """)).rowcount
+
+
+def main():
+    p = argparse.ArgumentParser(description="Chapter body store maintenance")
+    p.add_argument("command", choices=["train", "migrate", "gc"])
+    p.add_argument("--recompress", action="store_true", help="train: recompress stored bodies with the new dictionary")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from backend.api.db.session import engine
+    started = time.perf_counter()
+    if args.command == "train":
+        dict_id = train(engine)
+        if args.recompress:
+            log.info("recompressed %d bodies", recompress(engine, dict_id))
+    elif args.command == "migrate":
+        log.info("moved %d chapters", migrate(engine))
+    else:
+        log.info("deleted %d unreferenced bodies", gc(engine))
+    log.info("done in %.1fs", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import argparse
 import json
 from sqlalchemy import text
+from backend.api.app import chapters as bodies
 from backend.api.db.session import SessionLocal
 
 
@@ -11,11 +12,14 @@ def export_work_json(work_id: int, ndjson: bool = False) -> int:
         if not w:
             print(json.dumps({"error": "work not found", "id": work_id}, ensure_ascii=False))
             return 2
-        fandoms = [r["fandom"] for r in conn.execute(text("SELECT fandom FROM work_fandoms WHERE work_id=:id"), {"id": work_id}).mappings()]
-        tags = [r["tag"] for r in conn.execute(text("SELECT tag FROM work_tags WHERE work_id=:id"), {"id": work_id}).mappings()]
-        warnings = [r["warning"] for r in conn.execute(text("SELECT warning FROM work_warnings WHERE work_id=:id"), {"id": work_id}).mappings()]
-        chapters_rows = conn.execute(text("SELECT chapter_number, title, content_html FROM chapters WHERE work_id=:id ORDER BY chapter_number ASC"), {"id": work_id}).mappings()
-        chapters = [{"chapter_number": r["chapter_number"], "title": r["title"], "content_html": r["content_html"]} for r in chapters_rows]
+        fandoms = [r["name"] for r in conn.execute(text("SELECT f.name FROM work_fandoms wf JOIN fandoms f ON f.id = wf.fandom_id WHERE wf.work_id=:id ORDER BY wf.position"), {"id": work_id}).mappings()]
+        tags = [r["name"] for r in conn.execute(text("SELECT t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id=:id ORDER BY wt.position"), {"id": work_id}).mappings()]
+        warnings = [r["name"] for r in conn.execute(text("SELECT x.name FROM work_warnings ww JOIN warnings x ON x.id = ww.warning_id WHERE ww.work_id=:id ORDER BY ww.position"), {"id": work_id}).mappings()]
+        chapters_rows = conn.execute(text(
+            f"SELECT c.chapter_number, c.title, {bodies.BODY_COLUMNS_SQL} FROM chapters c {bodies.BODY_JOIN_SQL}"
+            " WHERE c.work_id=:id ORDER BY c.chapter_number ASC"
+        ), {"id": work_id}).mappings().all()
+        chapters = [{"chapter_number": r["chapter_number"], "title": r["title"], "content_html": r["content_html"]} for r in bodies.decode_rows(conn, chapters_rows)]
 
         doc = {
             "id": str(w["id"]),
@@ -33,8 +37,8 @@ def export_work_json(work_id: int, ndjson: bool = False) -> int:
             "word_count": w["word_count"],
             "likes_count": w.get("likes_count"),
             "comments_count": w.get("comments_count"),
-            "published_at": w.get("published_at"),
-            "updated_at": w.get("updated_at"),
+            "published_at": w["published_at"].isoformat() if w.get("published_at") else None,
+            "updated_at": w["updated_at"].isoformat() if w.get("updated_at") else None,
             "chapters": chapters,
         }
         if ndjson:
@@ -0,0 +1,441 @@
+"""
+Пакетная сборка "похожих работ" для /api/v1/works/{id}/similar.
+
+- Признаки работы: TF-IDF слов названия и summary (hashing trick — словарь не
+  хранится) и one-hot тегов и фандомов. Каждый блок нормируется отдельно и входит
+  с весом: иначе длинное summary перевешивало бы пять тегов.
+- Эмбеддинг: проекция на SIMILAR_DIM компонент усечённого SVD (LSA), обученного
+  на выборке работ; строки нормированы, score соседа — косинус.
+- Соседи: spherical k-means делит работы на кластеры, top-K ищется только среди
+  работ SIMILAR_PROBE ближайших кластеров (как IVF) — без этого полный перебор
+  на миллионе работ — это 10^12 скалярных произведений.
+- --full заново обучает модель (idf, SVD, центроиды) и пересчитывает всех.
+  Без флага — только работы с works.changed_at новее водяной отметки (их трогал
+  perform_upsert): они эмбеддятся сохранённой моделью и получают новый top-K,
+  а в чужие списки входят, если теперь проходят по score. Список, из которого
+  изменённая работа выпала, остаётся короче K до следующего --full.
+
+    python -m backend.cli.similar_works --full   # ночью
+    python -m backend.cli.similar_works          # каждые несколько минут
+
+Берётся БД из DATABASE_URL. Два прогона одновременно не идут (advisory lock).
+"""
+import argparse
+import logging
+import os
+import re
+import resource
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+log = logging.getLogger(__name__)
+
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "20"))
+SIMILAR_DIM = int(os.getenv("SIMILAR_DIM", "128"))
+# корзины hashing trick для слов; теги и фандомы — по id словаря по модулю
+WORD_BUCKETS = int(os.getenv("SIMILAR_WORD_BUCKETS", str(2 ** 17)))
+TERM_BUCKETS = int(os.getenv("SIMILAR_TERM_BUCKETS", str(2 ** 14)))
+# на скольких работах обучается SVD; idf считается по всем
+SVD_SAMPLE = int(os.getenv("SIMILAR_SVD_SAMPLE", "100000"))
+# 0 — sqrt(числа работ)
+SIMILAR_CLUSTERS = int(os.getenv("SIMILAR_CLUSTERS", "0"))
+SIMILAR_PROBE = int(os.getenv("SIMILAR_PROBE", "4"))
+TAG_WEIGHT = float(os.getenv("SIMILAR_TAG_WEIGHT", "0.7"))
+FANDOM_WEIGHT = float(os.getenv("SIMILAR_FANDOM_WEIGHT", "0.7"))
+BATCH = 20000
+KMEANS_ITERATIONS = 10
+# матрица score одного шага поиска соседей — не больше стольких элементов (float32)
+SCORE_BLOCK = 2 ** 24
+# транзакции normalizer коммитятся не в порядке now(), поэтому окно с перекрытием
+WATERMARK_OVERLAP = timedelta(seconds=300)
+LOCK_KEY = "similar_works"
+
+N_FEATURES = WORD_BUCKETS + 2 * TERM_BUCKETS
+_BLOCK_WEIGHTS = np.array([1.0, TAG_WEIGHT, FANDOM_WEIGHT], dtype=np.float32)
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+_buckets: Dict[str, int] = {}
+
+# (id, title, summary, tag_ids, fandom_ids)
+Row = Tuple[int, Optional[str], Optional[str], Optional[Sequence[int]], Optional[Sequence[int]]]
+
+
+def _bucket(token: str) -> int:
+    # crc32, а не hash(): тот солится на процесс, а модель переживает прогоны
+    b = _buckets.get(token)
+    if b is None:
+        b = _buckets[token] = zlib.crc32(token.encode("utf-8")) % WORD_BUCKETS
+    return b
+
+
+def featurize(rows: Iterable[Row]) -> Tuple[np.ndarray, sparse.csr_matrix]:
+    """id работ и матрица счётчиков признаков: частоты слов, 1 за тег и фандом."""
+    ids: List[int] = []
+    indptr, indices, data = [0], [], []
+    for wid, title, summary, tag_ids, fandom_ids in rows:
+        words = Counter(_bucket(w) for w in _WORD_RE.findall(f"{title or ''} {summary or ''}".lower().replace("ё", "е")))
+        terms = {WORD_BUCKETS + t % TERM_BUCKETS for t in tag_ids or ()}
+        terms |= {WORD_BUCKETS + TERM_BUCKETS + f % TERM_BUCKETS for f in fandom_ids or ()}
+        indices += [*words, *terms]
+        data += [*words.values(), *[1] * len(terms)]
+        indptr.append(len(indices))
+        ids.append(wid)
+    X = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(ids), N_FEATURES),
+    )
+    return np.array(ids, dtype=np.int64), X
+
+
+def tfidf(X: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+    """Сублинейный tf * idf; блоки слов, тегов и фандомов нормируются по отдельности и берутся с весами."""
+    X = X.astype(np.float32, copy=True)
+    X.data = (1 + np.log(X.data)) * idf[X.indices]
+    block = np.searchsorted([WORD_BUCKETS, WORD_BUCKETS + TERM_BUCKETS], X.indices, side="right")
+    key = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr)) * 3 + block
+    norms = np.sqrt(np.bincount(key, weights=X.data.astype(np.float64) ** 2, minlength=3 * X.shape[0]))
+    X.data = (X.data / norms[key] * _BLOCK_WEIGHTS[block]).astype(np.float32)
+    return X
+
+
+def _normalize(E: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(E, axis=1, keepdims=True)
+    return np.divide(E, norms, out=np.zeros_like(E), where=norms > 0)
+
+
+class Model:
+    """idf, компоненты SVD и центроиды кластеров — всё, что нужно, чтобы
+    эмбеддить новые работы в то же пространство без переобучения."""
+
+    def __init__(self, idf: np.ndarray, components: np.ndarray, centroids: np.ndarray):
+        self.idf = idf
+        self.components = components
+        self.centroids = centroids
+
+    @classmethod
+    def fit(cls, df: np.ndarray, n_docs: int, sample: sparse.csr_matrix, dim: int = SIMILAR_DIM) -> "Model":
+        """idf по частотам документов df всего корпуса, SVD — по выборке sample. Центроиды
+        ставит fit_clusters, когда эмбеддинги всех работ уже посчитаны."""
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        k = max(1, min(dim, min(sample.shape) - 1))
+        _, _, vt = svds(tfidf(sample, idf), k=k, random_state=0)
+        return cls(idf, vt.astype(np.float32), np.zeros((0, k), dtype=np.float32))
+
+    def embed(self, X: sparse.csr_matrix) -> np.ndarray:
+        return _normalize(np.asarray(tfidf(X, self.idf) @ self.components.T, dtype=np.float32))
+
+    def fit_clusters(self, E: np.ndarray, n_clusters: int, seed: int = 0) -> None:
+        """Spherical k-means по выборке эмбеддингов (до 64 точек на кластер)."""
+        rng = np.random.default_rng(seed)
+        n_clusters = max(1, min(n_clusters, len(E)))
+        points = E[rng.choice(len(E), min(len(E), 64 * n_clusters), replace=False)]
+        centroids = points[rng.choice(len(points), n_clusters, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = _argmax_rows(points, centroids)
+            onehot = sparse.csr_matrix((np.ones(len(points), dtype=np.float32), (labels, np.arange(len(points)))),
+                                       shape=(n_clusters, len(points)))
+            sums = np.asarray(onehot @ points)
+            empty = ~sums.any(axis=1)
+            # пустой кластер — на случайную точку
+            sums[empty] = points[rng.choice(len(points), int(empty.sum()))]
+            centroids = _normalize(sums)
+        self.centroids = centroids.astype(np.float32)
+
+    def assign(self, E: np.ndarray) -> np.ndarray:
+        return _argmax_rows(E, self.centroids)
+
+    def probes(self, probe: int = SIMILAR_PROBE) -> np.ndarray:
+        """Для каждого кластера — probe ближайших к нему кластеров, включая его самого."""
+        sims = self.centroids @ self.centroids.T
+        np.fill_diagonal(sims, np.inf)
+        return np.argsort(-sims, axis=1)[:, :min(probe, len(self.centroids))]
+
+    def to_db(self) -> Dict[str, bytes]:
+        return {"idf": self.idf.tobytes(), "components": self.components.tobytes(), "centroids": self.centroids.tobytes()}
+
+    @classmethod
+    def from_db(cls, row) -> "Model":
+        idf = np.frombuffer(row["idf"], dtype=np.float32)
+        components = np.frombuffer(row["components"], dtype=np.float32).reshape(-1, len(idf))
+        centroids = np.frombuffer(row["centroids"], dtype=np.float32).reshape(-1, components.shape[0])
+        return cls(idf, components, centroids)
+
+
+def _argmax_rows(E: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    step = max(1, SCORE_BLOCK // max(len(centroids), 1))
+    return np.concatenate([np.argmax(E[i:i + step] @ centroids.T, axis=1) for i in range(0, len(E), step)] or [np.zeros(0, dtype=np.int64)])
+
+
+def top_k(q_ids: np.ndarray, Q: np.ndarray, c_ids: np.ndarray, C: np.ndarray, k: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """Для каждой работы из Q — (id, id соседей, score по убыванию, строка score по всем
+    кандидатам C). Сама работа себе не сосед."""
+    step = max(1, SCORE_BLOCK // max(len(c_ids), 1))
+    k = min(k, len(c_ids))
+    for start in range(0, len(q_ids), step):
+        S = Q[start:start + step] @ C.T
+        S[q_ids[start:start + step, None] == c_ids[None, :]] = -np.inf
+        if k < len(c_ids):
+            part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(len(c_ids)), S.shape)
+        for row, idx in enumerate(part):
+            scores = S[row, idx]
+            order = np.argsort(-scores, kind="stable")
+            idx, scores = idx[order], scores[order]
+            keep = np.isfinite(scores)
+            yield int(q_ids[start + row]), c_ids[idx[keep]], scores[keep], S[row]
+
+
+def neighbours(ids: np.ndarray, E: np.ndarray, clusters: np.ndarray, probes: np.ndarray, queries: Optional[np.ndarray] = None,
+               k: int = SIMILAR_TOP_K) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """top-K по кластерам: работы кластера c сравниваются с работами кластеров probes[c].
+    queries — маска работ, для которых нужен список (по умолчанию все). Выдаёт
+    (id, id соседей, их score, id кандидатов, score по всем кандидатам)."""
+    order = np.argsort(clusters, kind="stable")
+    bounds = np.searchsorted(clusters[order], np.arange(len(probes) + 1))
+    members = [order[bounds[c]:bounds[c + 1]] for c in range(len(probes))]
+    for c in range(len(probes)):
+        q = members[c] if queries is None else members[c][queries[members[c]]]
+        if not len(q):
+            continue
+        cand = np.concatenate([members[p] for p in probes[c]])
+        for wid, n_ids, n_scores, row in top_k(ids[q], E[q], ids[cand], E[cand], k):
+            yield wid, n_ids, n_scores, ids[cand], row
+
+
+def merge_neighbours(old_ids: Sequence[int], old_scores: Sequence[float], changed: set, new: Dict[int, float],
+                     k: int = SIMILAR_TOP_K) -> Tuple[List[int], List[float]]:
+    """Прежний список без изменённых работ плюс их новые score; top-K по убыванию."""
+    merged = {i: s for i, s in zip(old_ids, old_scores) if i not in changed}
+    merged.update(new)
+    best = sorted(merged.items(), key=lambda kv: -kv[1])[:k]
+    return [i for i, _ in best], [float(s) for _, s in best]
+
+
+# ---- БД --------------------------------------------------------------------
+
+_ROWS_SQL = """
+    SELECT w.id, w.title, w.summary, ws.tag_ids, ws.fandom_ids
+    FROM works w LEFT JOIN work_search ws ON ws.work_id = w.id
+    {where} ORDER BY w.id
+"""
+
+
+def _batches(conn: Connection, ids: Optional[List[int]] = None) -> Iterator[List[Row]]:
+    sql = _ROWS_SQL.format(where="WHERE w.id = ANY(:ids)" if ids is not None else "")
+    # yield_per на самом запросе: Connection.execution_options меняет и соединение,
+    # а executemany на серверном курсоре не работает
+    result = conn.execute(text(sql).execution_options(yield_per=BATCH), {"ids": ids} if ids is not None else {})
+    for part in result.partitions():
+        yield [tuple(r) for r in part]
+
+
+def _write_embeddings(conn: Connection, ids: np.ndarray, clusters: np.ndarray, E: np.ndarray) -> None:
+    for start in range(0, len(ids), BATCH):
+        conn.execute(text("""
+            INSERT INTO work_embeddings (work_id, cluster, embedding) VALUES (:wid, :cluster, :embedding)
+            ON CONFLICT (work_id) DO UPDATE SET cluster = EXCLUDED.cluster, embedding = EXCLUDED.embedding
+        """), [
+            {"wid": int(w), "cluster": int(c), "embedding": e.tobytes()}
+            for w, c, e in zip(ids[start:start + BATCH], clusters[start:start + BATCH], E[start:start + BATCH])
+        ])
+
+
+def _pg_array(values: Iterable) -> str:
+    return "{" + ",".join(map(str, values)) + "}"
+
+
+def write_neighbours(conn: Connection, table: str, lists: Iterable[Tuple[int, Sequence[int], Sequence[float]]]) -> None:
+    """Списки (id, id соседей, score) в таблицу формы work_similar (ещё — work_also_read)."""
+    # пачка списков — плоские массивы и границы, переданные текстовыми литералами:
+    # адаптация python-списков драйвером (и executemany с массивом на строку) в разы
+    # медленнее. Разбор литерала — один раз в MATERIALIZED CTE, а не на каждую строку
+    sql = text("""
+        WITH p AS MATERIALIZED (SELECT CAST(:ids AS integer[]) AS ids, CAST(:scores AS real[]) AS scores)
+        INSERT INTO {table} (work_id, neighbour_ids, scores, computed_at)
+        SELECT t.wid, p.ids[t.lo:t.hi], p.scores[t.lo:t.hi], now()
+        FROM p, unnest(CAST(:wids AS integer[]), CAST(:lo AS integer[]), CAST(:hi AS integer[])) AS t(wid, lo, hi)
+        ON CONFLICT (work_id) DO UPDATE SET neighbour_ids = EXCLUDED.neighbour_ids, scores = EXCLUDED.scores, computed_at = now()
+    """.format(table=table))
+    batch: List[Tuple[int, Sequence[int], Sequence[float]]] = []
+
+    def flush():
+        lengths = np.array([len(n) for _, n, _ in batch], dtype=np.int64)
+        hi = np.cumsum(lengths)
+        conn.execute(sql, {
+            "wids": _pg_array(int(w) for w, _, _ in batch),
+            "lo": _pg_array((hi - lengths + 1).tolist()),
+            "hi": _pg_array(hi.tolist()),
+            "ids": _pg_array(np.concatenate([np.asarray(n, dtype=np.int64) for _, n, _ in batch]).tolist()),
+            "scores": _pg_array(np.concatenate([np.asarray(s, dtype=np.float32) for _, _, s in batch]).round(6).tolist()),
+        })
+        batch.clear()
+
+    for item in lists:
+        batch.append(item)
+        if len(batch) == BATCH:
+            flush()
+    if batch:
+        flush()
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_full(engine: Engine) -> int:
+    """Обучает модель на всех работах, пересчитывает эмбеддинги и всех соседей."""
+    timings: Dict[str, float] = {}
+    mark = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage], mark = now - mark, now
+
+    with engine.connect() as conn:
+        watermark = conn.execute(text("SELECT now()")).scalar_one()
+        n_docs = conn.execute(text("SELECT count(*) FROM works")).scalar_one()
+        if not n_docs:
+            return 0
+        # проход 1: частоты документов и выборка для SVD
+        rng = np.random.default_rng(0)
+        df = np.zeros(N_FEATURES, dtype=np.float64)
+        sample = []
+        for rows in _batches(conn):
+            _, X = featurize(rows)
+            df += np.bincount(X.indices, minlength=N_FEATURES)
+            sample.append(X[rng.random(X.shape[0]) < SVD_SAMPLE / n_docs])
+        lap("features")
+        model = Model.fit(df, n_docs, sparse.vstack(sample).tocsr())
+        lap("svd")
+
+        # проход 2: эмбеддинги; работы идут по возрастанию id
+        ids, E = [], []
+        for rows in _batches(conn):
+            batch_ids, X = featurize(rows)
+            ids.append(batch_ids)
+            E.append(model.embed(X))
+        ids, E = np.concatenate(ids), np.concatenate(E)
+        lap("embed")
+
+    model.fit_clusters(E, SIMILAR_CLUSTERS or int(np.sqrt(len(ids))))
+    clusters = model.assign(E)
+    lap("clusters")
+    # списки — в плотных массивах: миллион python-списков по K чисел занял бы гигабайты
+    k = min(SIMILAR_TOP_K, max(len(ids) - 1, 1))
+    nb_ids = np.full((len(ids), k), -1, dtype=np.int64)
+    nb_scores = np.zeros((len(ids), k), dtype=np.float32)
+    for wid, n_ids, n_scores, _, _ in neighbours(ids, E, clusters, model.probes(), k=k):
+        pos = np.searchsorted(ids, wid)
+        nb_ids[pos, :len(n_ids)], nb_scores[pos, :len(n_ids)] = n_ids, n_scores
+    lap("neighbours")
+
+    with engine.begin() as conn:
+        _write_embeddings(conn, ids, clusters, E)
+        write_neighbours(conn, "work_similar", ((wid, n[n >= 0], s[n >= 0]) for wid, n, s in zip(ids, nb_ids, nb_scores)))
+        conn.execute(text("""
+            INSERT INTO similar_model (id, built_at, watermark, idf, components, centroids)
+            VALUES (1, now(), :watermark, :idf, :components, :centroids)
+            ON CONFLICT (id) DO UPDATE SET built_at = now(), watermark = EXCLUDED.watermark, idf = EXCLUDED.idf,
+                components = EXCLUDED.components, centroids = EXCLUDED.centroids
+        """), {"watermark": watermark, **model.to_db()})
+    lap("write")
+    log.info("similar works built for %d works: %s, peak RSS %.0f MB",
+             len(ids), ", ".join(f"{k} {v:.1f}s" for k, v in timings.items()), _peak_rss_mb())
+    return len(ids)
+
+
+def refresh(engine: Engine) -> int:
+    """Пересчитывает работы, изменённые после водяной отметки. Возвращает их число;
+    без модели делает полную сборку."""
+    with engine.begin() as conn:
+        row = conn.execute(text("SELECT * FROM similar_model WHERE id = 1")).mappings().first()
+        if row is None:
+            return build_full(engine)
+        model = Model.from_db(row)
+        now = conn.execute(text("SELECT now()")).scalar_one()
+        changed = list(conn.execute(
+            text("SELECT id FROM works WHERE changed_at > :since"), {"since": row["watermark"] - WATERMARK_OVERLAP},
+        ).scalars())
+        if changed:
+            rows = [r for batch in _batches(conn, changed) for r in batch]
+            changed_ids, X = featurize(rows)
+            E_changed = model.embed(X)
+            _write_embeddings(conn, changed_ids, model.assign(E_changed), E_changed)
+            _refresh_neighbours(conn, model, changed_ids)
+        conn.execute(text("UPDATE similar_model SET watermark = :now WHERE id = 1"), {"now": now})
+    return len(changed)
+
+
+def _refresh_neighbours(conn: Connection, model: Model, changed_ids: np.ndarray) -> None:
+    probes = model.probes()
+    touched_clusters = conn.execute(
+        text("SELECT DISTINCT cluster FROM work_embeddings WHERE work_id = ANY(:ids)"), {"ids": changed_ids.tolist()},
+    ).scalars().all()
+    scope = sorted({int(p) for c in touched_clusters for p in probes[c]})
+    rows = conn.execute(
+        text("SELECT work_id, cluster, embedding FROM work_embeddings WHERE cluster = ANY(:clusters)"), {"clusters": scope},
+    ).all()
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    clusters = np.array([r[1] for r in rows], dtype=np.int64)
+    E = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+    is_changed = np.isin(ids, changed_ids)
+
+    thresholds = load_thresholds(conn, "work_similar", ids[~is_changed].tolist())
+    changed = set(changed_ids.tolist())
+    lists, incoming = [], {}
+    for wid, n_ids, n_scores, cand_ids, row in neighbours(ids, E, clusters, probes, queries=is_changed):
+        lists.append((wid, n_ids, n_scores))
+        for cid, score in zip(cand_ids.tolist(), row.tolist()):
+            if cid not in changed and score > thresholds.get(cid, -np.inf):
+                incoming.setdefault(cid, {})[wid] = score
+    write_neighbours(conn, "work_similar", lists + merge_changed(conn, "work_similar", changed, incoming))
+
+
+def load_thresholds(conn: Connection, table: str, ids: List[int], k: int = SIMILAR_TOP_K) -> Dict[int, float]:
+    """Порог входа в список работы — его K-й score; в неполный список входит любой."""
+    return dict(conn.execute(text(f"""
+        SELECT work_id, CASE WHEN cardinality(scores) < :k THEN '-Infinity'::real ELSE scores[:k] END
+        FROM {table} WHERE work_id = ANY(:ids)
+    """), {"ids": ids, "k": k}).all())
+
+
+def merge_changed(conn: Connection, table: str, changed: set, incoming: Dict[int, Dict[int, float]],
+                  k: int = SIMILAR_TOP_K) -> List[Tuple[int, List[int], List[float]]]:
+    """Чужие списки, куда изменённые работы входят теперь (incoming: {работа: {изменённая: score}})
+    или входили раньше, — слитые с новыми score."""
+    affected = conn.execute(text(f"""
+        SELECT work_id, neighbour_ids, scores FROM {table}
+        WHERE work_id = ANY(:incoming) OR (neighbour_ids && CAST(:changed AS integer[]) AND NOT work_id = ANY(:changed))
+    """), {"incoming": list(incoming), "changed": sorted(changed)}).all()
+    return [(wid, *merge_neighbours(old_ids, old_scores, changed, incoming.get(wid, {}), k)) for wid, old_ids, old_scores in affected]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Build similar-works neighbour lists")
+    p.add_argument("--full", action="store_true", help="retrain the model and recompute every work")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from backend.api.db.session import engine
+    with engine.connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": LOCK_KEY}).scalar_one():
+            log.info("another similar works build is running, skipping")
+            return
+        started = time.perf_counter()
+        n = build_full(engine) if args.full else refresh(engine)
+        log.info("similar works: %d works in %.1fs", n, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,3 @@
-from . import schemas
-from .ficbook import FicbookParser
-from .authortoday import AuthorTodayParser
+from . import schemas, dates
 
-__all__ = ["schemas", "FicbookParser", "AuthorTodayParser"]
+__all__ = ["schemas", "dates"]
@@ -0,0 +1,119 @@
+"""
+Разбор дат, как их показывают сайты: "15 января 2024, 12:30", "15.01.2024",
+"вчера в 18:05", "3 дня назад", ISO 8601.
+
+Даты без часового пояса считаются московскими (все поддерживаемые сайты
+показывают время по Москве). Относительные даты отсчитываются от `now` —
+момента скачивания страницы.
+"""
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+
+MSK = timezone(timedelta(hours=3), "MSK")
+
+# по основе слова: "января", "янв.", "январь" → 1
+_MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "мая": 5, "май": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+_UNITS = {
+    "секунд": timedelta(seconds=1), "сек": timedelta(seconds=1),
+    "минут": timedelta(minutes=1), "мин": timedelta(minutes=1),
+    "час": timedelta(hours=1),
+    "дн": timedelta(days=1), "ден": timedelta(days=1), "сутк": timedelta(days=1),
+    "недел": timedelta(weeks=1),
+    "месяц": timedelta(days=30),
+    "год": timedelta(days=365), "лет": timedelta(days=365),
+}
+
+_DAY_WORDS = {"сегодня": 0, "вчера": 1, "позавчера": 2}
+
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+_NUMERIC_RE = re.compile(r"\b(\d{1,2})\.(\d{1,2})\.(\d{2}|\d{4})\b")
+_WORDY_RE = re.compile(r"\b(\d{1,2})\s+([а-яёa-z]+)\.?(?:\s+(\d{4}))?", re.I)
+_AGO_RE = re.compile(r"(?:(\d+|[а-яё]+)\s+)?([а-яё]+)\s+назад", re.I)
+_NUMBER_WORDS = {"один": 1, "одну": 1, "одна": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5}
+
+
+def _at(d: date, text: str) -> datetime:
+    m = _TIME_RE.search(text)
+    t = time(int(m.group(1)), int(m.group(2))) if m else time(0, 0)
+    return datetime.combine(d, t, tzinfo=MSK)
+
+
+def _unit(word: str) -> Optional[timedelta]:
+    word = word.lower()
+    for stem, delta in _UNITS.items():
+        if word.startswith(stem):
+            return delta
+    return None
+
+
+def parse_ru_datetime(value: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Дата/время с часовым поясом или None, если строку разобрать не удалось."""
+    if not value:
+        return None
+    text = " ".join(str(value).split()).strip()
+    if not text:
+        return None
+    now = (now or datetime.now(MSK)).astimezone(MSK)
+
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=MSK)
+    except ValueError:
+        pass
+
+    lower = text.lower()
+    if "только что" in lower:
+        return now
+
+    for word, days_back in sorted(_DAY_WORDS.items(), key=lambda kv: -len(kv[0])):
+        if word in lower:
+            return _at(now.date() - timedelta(days=days_back), lower)
+
+    m = _AGO_RE.search(lower)
+    if m:
+        count_word, unit_word = m.group(1) or "", m.group(2)
+        if unit_word == "полчаса":
+            return now - timedelta(minutes=30)
+        delta = _unit(unit_word)
+        if delta is not None:
+            count = int(count_word) if count_word.isdigit() else _NUMBER_WORDS.get(count_word, 1)
+            return now - count * delta
+
+    m = _NUMERIC_RE.search(lower)
+    if m:
+        day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if year < 100:
+            year += 2000
+        try:
+            return _at(date(year, month, day), lower[m.end():])
+        except ValueError:
+            return None
+
+    for m in _WORDY_RE.finditer(lower):
+        month = _MONTHS.get(m.group(2)[:3])
+        if month is None:
+            continue
+        day = int(m.group(1))
+        year = int(m.group(3)) if m.group(3) else now.year
+        try:
+            result = _at(date(year, month, day), lower[m.end():])
+            # "15 декабря" без года в январе — это прошлый год
+            if not m.group(3) and result > now + timedelta(days=1):
+                result = result.replace(year=year - 1)
+        except ValueError:
+            return None
+        return result
+    return None
+
+
+def normalize_date(value: Optional[str], now: Optional[datetime] = None) -> Optional[str]:
+    """ISO 8601 для payload парсера; None, если дату не удалось понять."""
+    parsed = parse_ru_datetime(value, now)
+    return parsed.isoformat() if parsed else None
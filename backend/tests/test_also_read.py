@@ -0,0 +1,19 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from backend.cli import also_read as ar  # noqa: E402
+
+
+def test_cosine_of_coreaders(monkeypatch):
+    monkeypatch.setattr(ar, "ALSO_READ_MIN_COREADERS", 2)
+    # работы 10 и 20 читали трое одних и тех же, 30 — один из них и ещё один
+    pairs = np.array([(1, 10), (2, 10), (3, 10), (1, 20), (2, 20), (3, 20), (4, 20), (1, 30), (5, 30)])
+    data = ar.Interactions(pairs)
+    scores = {wid: dict(zip(other.tolist(), s.tolist())) for wid, other, s in data.scores(np.arange(len(data.works)))}
+    assert scores[10] == {20: pytest.approx(3 / np.sqrt(3 * 4))}
+    assert scores[20] == {10: pytest.approx(3 / np.sqrt(3 * 4))}
+    # один общий читатель — меньше порога
+    assert scores[30] == {}
+    assert data.columns(np.array([20, 99])).tolist() == [1]
@@ -0,0 +1,72 @@
+import pytest
+from backend.api.app.models import SearchFilters
+from backend.api.app import bitmap_index as bi
+
+pyroaring = pytest.importorskip("pyroaring")
+BitMap = pyroaring.BitMap
+
+
+@pytest.fixture
+def index():
+    idx = bi.BitmapIndex()
+    idx.dims["tag"] = {"AU": BitMap([1, 2, 3, 4]), "Драма": BitMap([2, 4, 6]), "Юмор": BitMap([3, 5])}
+    idx.dims["fandom"] = {"ГП": BitMap([1, 2, 3, 6])}
+    idx.dims["rating"] = {"R": BitMap([1, 3, 5]), "G": BitMap([2, 4, 6])}
+    idx.ready = True
+    return idx
+
+
+def test_and_andnot(index):
+    assert index.candidate_ids(SearchFilters(tags=["AU"], fandoms=["ГП"], exclude_tags=["Драма"])) == [1, 3]
+    assert index.candidate_ids(SearchFilters(tags=["AU", "Юмор"], rating=["R"])) == [1, 3, 5]
+
+
+def test_falls_back_to_sql(index, monkeypatch):
+    # только исключения или неизвестное значение фильтра без совпадений
+    assert index.candidate_ids(SearchFilters(exclude_tags=["AU"])) is None
+    assert index.candidate_ids(SearchFilters(query="x")) is None
+    assert index.candidate_ids(SearchFilters(tags=["нет такого"])) == []
+    monkeypatch.setattr(bi, "BITMAP_MAX_CANDIDATES", 2)
+    assert index.candidate_ids(SearchFilters(rating=["R"])) is None
+
+
+def test_stats_reports_memory(index):
+    stats = index.stats()
+    assert stats["bitmaps"]["tag"] == 3
+    assert stats["memory_bytes"] > 0
+
+
+def test_include_tags_mode(index):
+    assert index.candidate_ids(SearchFilters(include_tags=["AU", "Драма"])) == [2, 4]
+    assert index.candidate_ids(SearchFilters(include_tags=["AU", "Драма"], include_tags_mode="any")) == [1, 2, 3, 4, 6]
+    assert index.candidate_ids(SearchFilters(include_tags=["AU", "нет такого"])) == []
+
+
+def test_refresh_builds_new_version(index):
+    old = index.dims
+    old_au = old["tag"]["AU"]
+    # работа 3 потеряла AU и Юмор, получила Драма и новый тег; работа 7 — новая
+    delta = {d: {} for d in bi.DIMENSIONS}
+    delta["tag"] = {"Драма": BitMap([3]), "Флафф": BitMap([3, 7])}
+    delta["rating"] = {"R": BitMap([3, 7])}
+    delta["fandom"] = {"ГП": BitMap([3])}
+    dims = bi.BitmapIndex._apply(old, BitMap([3, 7]), delta)
+
+    assert list(dims["tag"]["AU"]) == [1, 2, 4] and list(dims["tag"]["Драма"]) == [2, 3, 4, 6]
+    assert list(dims["tag"]["Юмор"]) == [5] and list(dims["tag"]["Флафф"]) == [3, 7]
+    assert list(dims["rating"]["R"]) == [1, 3, 5, 7]
+    assert list(dims["fandom"]["ГП"]) == [1, 2, 3, 6]
+    # G и сайты не тронуты — общие со старой версией; сама старая версия не изменилась
+    assert dims["site"] is old["site"] and dims["rating"]["G"] is old["rating"]["G"]
+    assert list(old_au) == [1, 2, 3, 4] and "Флафф" not in old["tag"]
+
+
+def test_index_behind_cache_generation_is_not_used(index):
+    index.generation = 5
+    f = SearchFilters(tags=["AU"])
+    assert index.candidate_ids(f, generation=5) == [1, 2, 3, 4]
+    # upsert поколения 6 индекс ещё не перечитал — решает SQL
+    assert index.candidate_ids(f, generation=6) is None
+    index.generation = None
+    assert index.candidate_ids(f, generation=1) is None
+    assert index.candidate_ids(f) == [1, 2, 3, 4]
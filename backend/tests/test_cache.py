@@ -0,0 +1,263 @@
+import pytest
+
+from backend.api.app import cache
+from backend.api.app.cache import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_l1(monkeypatch):
+    monkeypatch.setattr(cache, "_l1", TTLCache(16, 60))
+    monkeypatch.setattr(cache, "_l1_versions", TTLCache(16, 10))
+
+
+def test_ttl_cache_lru_and_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = TTLCache(maxsize=2, ttl=10)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)  # вытесняет b — к нему дольше всего не обращались
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    now[0] += 11
+    assert c.get("a") is None
+
+
+class FakeRedis:
+    """Минимум команд Redis, которые использует cache.py."""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key) or 0) + 1)
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+class FakePipeline:
+    def __init__(self, r):
+        self.r, self.ops = r, []
+
+    def __getattr__(self, name):
+        return lambda *a, **k: self.ops.append((name, a, k))
+
+    def execute(self):
+        return [getattr(self.r, name)(*a, **k) for name, a, k in self.ops]
+
+
+class InlinePool:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_single_flight_and_stale_while_revalidate(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", r)
+    monkeypatch.setattr(cache, "redis_bytes", r)
+    monkeypatch.setattr(cache, "_refresh_pool", InlinePool())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return f"v{len(calls)}"
+
+    assert cache.cache_get_or_compute("k", compute, ttl=60) == b"v1"
+    assert cache.cache_get_or_compute("k", compute, ttl=60) == b"v1"
+    assert len(calls) == 1
+    assert "lock:k" not in r.data
+
+    # мягкий TTL истёк: отдаём старое значение, пересчёт — один раз в фоне
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + 61)
+    assert cache.cache_get_or_compute("k", compute, ttl=60) == b"v1"
+    assert len(calls) == 2
+    monkeypatch.setattr(cache.time, "time", lambda: now)
+    assert cache.cache_get_or_compute("k", compute, ttl=60) == b"v2"
+
+
+def test_waiter_gets_value_computed_by_lock_holder(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", r)
+    monkeypatch.setattr(cache, "redis_bytes", r)
+    r.data["lock:k"] = "someone-else"
+
+    def fake_sleep(_):
+        # пока ждём, держатель замка кладёт результат
+        r.data["k"] = cache.codec.encode("from-holder", cache.time.time() + 60)
+
+    monkeypatch.setattr(cache.time, "sleep", fake_sleep)
+    assert cache.cache_get_or_compute("k", lambda: "own", ttl=60) == b"from-holder"
+
+
+def test_versions_invalidate_only_affected_keys(monkeypatch):
+    from backend.api.app.models import SearchFilters
+
+    monkeypatch.setattr(cache, "redis_client", FakeRedis())
+    hp = SearchFilters(fandoms=["ГП"])
+    naruto = SearchFilters(fandoms=["Наруто"])
+    ficbook = SearchFilters(sites=["ficbook"], page=2)
+    keys = [cache.make_search_cache_key(f) for f in (hp, naruto, ficbook, SearchFilters())]
+
+    cache.bump_search_versions("authortoday", ["ГП"])
+    after = [cache.make_search_cache_key(f) for f in (hp, naruto, ficbook, SearchFilters())]
+    assert after[0] != keys[0]  # фандом работы
+    assert after[1] == keys[1]  # чужой фандом
+    assert after[2] == keys[2]  # чужой сайт
+    assert after[3] != keys[3]  # запрос без фильтров видит любое изменение
+    assert cache.make_count_cache_key(hp) != cache.make_count_cache_key(naruto)
+
+
+def test_count_and_facets_keys_ignore_paging(monkeypatch):
+    from backend.api.app.models import SearchFilters
+
+    monkeypatch.setattr(cache, "redis_client", FakeRedis())
+    a = SearchFilters(query="x", page=1, sort_by="title")
+    b = SearchFilters(query="x", page=7, page_size=50, cursor="abc")
+    assert cache.make_count_cache_key(a) == cache.make_count_cache_key(b)
+    assert cache.make_facets_cache_key(a) == cache.make_facets_cache_key(b)
+    assert cache.make_search_cache_key(a) != cache.make_search_cache_key(b)
+
+
+def test_l1_serves_fresh_values_without_redis(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", r)
+    monkeypatch.setattr(cache, "redis_bytes", r)
+    before = dict(cache.cache_stats)
+    assert cache.cache_get_or_compute("k", lambda: "v1", ttl=60) == b"v1"
+    r.data.clear()  # второй запрос Redis не трогает
+    assert cache.cache_get_or_compute("k", lambda: "v2", ttl=60) == b"v1"
+    assert cache.cache_stats["l1_hits"] - before["l1_hits"] == 1
+    assert cache.cache_stats["l2_misses"] - before["l2_misses"] == 1
+
+    # устаревшее в L1 не отдаётся — решает Redis
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + 61)
+    assert cache.cache_get_or_compute("k", lambda: "v3", ttl=60) == b"v3"
+
+
+def test_bump_publishes_and_drops_local_versions(monkeypatch):
+    from backend.api.app.models import SearchFilters
+
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", r)
+    monkeypatch.setattr(cache, "redis_bytes", r)
+    hp = SearchFilters(fandoms=["ГП"])
+    key = cache.make_search_cache_key(hp)
+    # другая реплика бампнула версию: локальная копия ещё действует
+    r.incr(f"{cache.VERSION_PREFIX}fandom:ГП")
+    assert cache.make_search_cache_key(hp) == key
+    # сообщение из канала сбрасывает её
+    cache._drop_local_versions([f"{cache.VERSION_PREFIX}fandom:ГП"])
+    assert cache.make_search_cache_key(hp) != key
+
+    cache.bump_search_versions("ficbook", ["ГП"])
+    channel, message = r.published[-1]
+    assert channel == cache.INVALIDATE_CHANNEL
+    assert f"{cache.VERSION_PREFIX}fandom:ГП" in cache.json.loads(message)
+
+
+def test_codec_roundtrip_and_legacy_entries():
+    from backend.api.app import codec
+
+    value = ('{"results":[{"summary":"' + "Гарри снова в Хогвартсе. " * 200 + '"}]}').encode("utf-8")
+    for name in ("none", "zlib", "zstd", "lz4"):
+        raw = codec.encode(value, 1234.0, compressor=name)
+        assert codec.decode(raw) == (1234.0, value)
+    assert len(codec.encode(value, 0, compressor="zlib")) < len(value) / 4
+    # короткие значения не сжимаются
+    assert codec.encode("{}", 0, compressor="zlib").endswith(b"{}")
+    # записи, сохранённые до бинарного формата
+    assert codec.decode(b"1234\n" + value) == (1234.0, value)
+    assert codec.decode(b'{"total":1}') == (0.0, b'{"total":1}')
+
+
+class AsyncFakeRedis:
+    def __init__(self, r):
+        self.r = r
+
+    def __getattr__(self, name):
+        method = getattr(self.r, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+def test_async_cache_shares_entries_with_sync_path(monkeypatch):
+    import asyncio
+
+    r = FakeRedis()
+    for name in ("redis_client", "redis_bytes"):
+        monkeypatch.setattr(cache, name, r)
+    for name in ("aredis_client", "aredis_bytes"):
+        monkeypatch.setattr(cache, name, AsyncFakeRedis(r))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "v1"
+
+    async def scenario():
+        assert await cache.acache_get_or_compute("k", compute, ttl=60) == b"v1"
+        cache._l1.clear()
+        assert await cache.acache_get_or_compute("k", compute, ttl=60) == b"v1"
+
+    asyncio.run(scenario())
+    assert len(calls) == 1 and "lock:k" not in r.data
+    cache._l1.clear()
+    assert cache.cache_get_or_compute("k", lambda: "sync", ttl=60) == b"v1"
+
+    from backend.api.app.models import SearchFilters
+    f = SearchFilters(fandoms=["ГП"], page=2)
+    search_key, count_key, generation = asyncio.run(cache.amake_search_cache_keys(f))
+    assert (search_key, count_key) == (cache.make_search_cache_key(f), cache.make_count_cache_key(f))
+    assert generation == 0
+
+
+def test_previous_generation_is_served_while_recomputing(monkeypatch):
+    from backend.api.app.models import SearchFilters
+
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", r)
+    monkeypatch.setattr(cache, "redis_bytes", r)
+    monkeypatch.setattr(cache, "_refresh_pool", InlinePool())
+    f = SearchFilters(tags=["AU"])
+    key = cache.make_search_cache_key(f)
+    assert cache.cache_get_or_compute(key, lambda: "old", ttl=60) == b"old"
+
+    # upsert бампнул глобальную версию: новый ключ пуст, отдаётся прошлое поколение,
+    # новое считается в фоне под замком
+    cache.bump_search_versions("ficbook", [])
+    key, generation = cache.make_search_cache_key(f), cache.current_generation()
+    assert generation == 1 and cache.make_facets_cache_key(f)[1] == generation
+    assert cache.cache_get_or_compute(key, lambda: "new", ttl=60) == b"old"
+    assert cache.codec.decode(r.data[key])[1] == b"new" and f"lock:{key}" not in r.data
+    assert cache.cache_get_or_compute(key, lambda: "newer", ttl=60) == b"new"
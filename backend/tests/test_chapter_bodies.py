@@ -0,0 +1,17 @@
+import pytest
+
+zstandard = pytest.importorskip("zstandard")
+
+from backend.api.app import chapters  # noqa: E402
+
+
+def test_body_roundtrip_with_trained_dictionary(monkeypatch):
+    texts = [f"<p>Глава {i}: &laquo;Гарри&raquo; шёл по коридору {i * 7}.</p>" * 40 for i in range(200)]
+    trained = zstandard.train_dictionary(4096, [t.encode() for t in texts])
+    monkeypatch.setitem(chapters._dictionaries, 7, zstandard.ZstdCompressionDict(trained.as_bytes()))
+    body = chapters.compress(texts[3], 7)
+    assert len(body) < len(chapters.compress(texts[3])) < len(texts[3].encode())
+    assert chapters.body_html({"content_html": None, "dict_id": 7, "body": body}) == texts[3]
+    # ещё не перенесённая глава читается из content_html, глава без текста — пустая
+    assert chapters.body_html({"content_html": "<p>старое</p>", "dict_id": None, "body": None}) == "<p>старое</p>"
+    assert chapters.body_html({"content_html": None, "dict_id": None, "body": None}) == ""
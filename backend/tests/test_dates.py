@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pytest
+
+from backend.parsers.dates import MSK, normalize_date, parse_ru_datetime
+
+NOW = datetime(2024, 1, 10, 15, 0, tzinfo=MSK)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2024-01-15", datetime(2024, 1, 15, tzinfo=MSK)),
+    ("15.01.2024 12:30", datetime(2024, 1, 15, 12, 30, tzinfo=MSK)),
+    ("15 января 2024, 12:30", datetime(2024, 1, 15, 12, 30, tzinfo=MSK)),
+    ("Обновлено: 3 марта 2023 г. в 09:15", datetime(2023, 3, 3, 9, 15, tzinfo=MSK)),
+    ("20 дек.", datetime(2023, 12, 20, tzinfo=MSK)),  # без года и «в будущем» — прошлый год
+    ("вчера в 18:05", datetime(2024, 1, 9, 18, 5, tzinfo=MSK)),
+    ("3 часа назад", datetime(2024, 1, 10, 12, 0, tzinfo=MSK)),
+    ("неделю назад", datetime(2024, 1, 3, 15, 0, tzinfo=MSK)),
+    ("31.02.2024", None),
+    ("в процессе", None),
+])
+def test_parse_ru_datetime(text, expected):
+    assert parse_ru_datetime(text, NOW) == expected
+
+
+def test_normalize_date_returns_iso():
+    assert normalize_date("сегодня, 08:00", NOW) == "2024-01-10T08:00:00+03:00"
+    assert normalize_date("", NOW) is None
@@ -0,0 +1,35 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from backend.api.app.models import SearchFilters  # noqa: E402
+from backend.api.app.search import build_search_query  # noqa: E402
+from backend.workers.normalizer import dedup  # noqa: E402
+
+
+def _text(seed: int, n: int = 600) -> list:
+    rng = np.random.default_rng(seed)
+    return [f"слово{i}" for i in rng.integers(0, 5000, n)]
+
+
+def test_crosspost_with_other_markup_is_near_duplicate():
+    words = _text(1)
+    original = ["<p>" + " ".join(words[:300]) + "</p>", "<p>" + " ".join(words[300:]) + "</p>"]
+    # другой сайт: своя разметка, регистр и правка в паре мест
+    edited = words[:100] + ["вставка"] + words[100:500] + words[510:]
+    crosspost = ["<div class='text'>" + " ".join(w.upper() for w in edited) + "&nbsp;</div>"]
+    a = dedup.signature(dedup.shingles(dedup.words(original)))
+    b = dedup.signature(dedup.shingles(dedup.words(crosspost)))
+    other = dedup.signature(dedup.shingles(dedup.words([" ".join(_text(2))])))
+    assert dedup.similarity(a, b) >= dedup.DEDUP_THRESHOLD
+    assert dedup.similarity(a, other) < 0.1
+    # хотя бы одна общая LSH-корзина у дублей и ни одной у разных текстов
+    assert set(dedup.buckets(a)) & set(dedup.buckets(b))
+    assert not set(dedup.buckets(a)) & set(dedup.buckets(other))
+
+
+def test_collapse_duplicates_hides_non_canonical_works():
+    sql, _ = build_search_query(SearchFilters(collapse_duplicates=True))
+    assert "NOT EXISTS (SELECT 1 FROM work_duplicates d WHERE d.work_id = works.id)" in sql
+    sql, _ = build_search_query(SearchFilters())
+    assert "work_duplicates" not in sql
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("zstandard")
+
+from datetime import datetime, timezone  # noqa: E402
+
+from backend.api.app import etags  # noqa: E402
+
+
+def test_conditional_headers():
+    headers = etags.validators('W/"abc"', datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc))
+    assert headers["Last-Modified"] == "Thu, 01 Oct 2026 12:00:00 GMT"
+    assert etags.is_not_modified(headers, '"zzz", "abc"', None)
+    assert etags.is_not_modified(headers, "*", None)
+    # If-None-Match важнее If-Modified-Since
+    assert not etags.is_not_modified(headers, '"zzz"', "Thu, 01 Oct 2026 12:00:00 GMT")
+    assert etags.is_not_modified(headers, None, "Thu, 01 Oct 2026 12:00:00 GMT")
+    assert not etags.is_not_modified(headers, None, "Thu, 01 Oct 2026 11:59:59 GMT")
+    assert not etags.is_not_modified(headers, None, "не дата")
+
+
+def test_work_version_tracks_content():
+    toc = [(1, "Начало", b"\x01" * 16)]
+    v = etags.work_version({"title": "Т", "words": 10}, ["f1"], ["t1"], [], toc)
+    assert v == etags.work_version({"words": 10, "title": "Т"}, ["f1"], ["t1"], [], toc)
+    assert v != etags.work_version({"title": "Т", "words": 10}, ["f1"], ["t1"], [], [(1, "Начало", b"\x02" * 16)])
+    assert len(v) == 16 and etags.work_etag(v) == f'"{v.hex()}"'
+
+
+def test_missing_representation_never_matches():
+    # нет глав — нет ETag, и If-None-Match: * не превращает 404 в 304
+    headers = etags.validators(None, None)
+    assert "ETag" not in headers
+    assert not etags.is_not_modified(headers, "*", None)
+    assert not etags.is_not_modified(headers, None, "Thu, 01 Oct 2026 12:00:00 GMT")
@@ -0,0 +1,123 @@
+"""Планы поиска на живом Postgres: частые пары (фильтр, сортировка) отдают первую
+страницу сканом индекса из миграции 0010, без сортировки всей выборки.
+
+Нужна отдельная пустая БД, накатанная до head:
+    TEST_DATABASE_URL=postgresql+psycopg://... pytest backend/tests/test_search_plans.py
+Данные сидируются в транзакции и откатываются.
+"""
+import os
+from typing import Iterator, List
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend.api.app import search
+from backend.api.app.models import SearchFilters
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+# authortoday — 2% работ, frozen — 2.5%: фильтры селективные, сканировать индекс
+# сортировки целиком и отбрасывать чужие строки невыгодно
+SEED_SQL = """
+INSERT INTO works (site_id, site_work_id, title, summary, language, rating, status, word_count,
+                   likes_count, comments_count, updated_at, published_at)
+SELECT CASE WHEN g % 50 = 0 THEN :at ELSE :fb END, 'plan-' || g, 'T' || g, '', 'ru',
+       (ARRAY['G', 'PG-13', 'R', 'NC-17'])[1 + g % 4],
+       CASE WHEN g % 40 = 1 THEN 'frozen' WHEN g % 2 = 0 THEN 'completed' ELSE 'in_progress' END,
+       (g * 7919) % 200000,
+       CASE WHEN g % 10 = 0 THEN NULL ELSE (g * 131) % 5000 END,
+       (g * 17) % 300,
+       timestamptz '2020-01-01' + ((g * 7907) % 1500) * interval '1 day',
+       timestamptz '2019-01-01' + ((g * 31) % 1500) * interval '1 day'
+FROM generate_series(1, 50000) g
+"""
+
+
+@pytest.fixture(scope="module")
+def conn() -> Iterator:
+    engine = create_engine(TEST_DATABASE_URL)
+    with engine.connect() as c:
+        tx = c.begin()
+        c.execute(text("INSERT INTO sites (code, name) VALUES ('ficbook', 'Ficbook'), ('authortoday', 'Author.Today') ON CONFLICT (code) DO NOTHING"))
+        ids = dict(c.execute(text("SELECT code, id FROM sites")).all())
+        c.execute(text(SEED_SQL), {"fb": ids["ficbook"], "at": ids["authortoday"]})
+        c.execute(text("ANALYZE works"))
+        search._work_search_available = None
+        yield c
+        tx.rollback()
+    engine.dispose()
+
+
+def _page_plan(conn, filters: SearchFilters) -> List[str]:
+    """Узлы под LIMIT страницы, читающие works ('Index Scan:<индекс>', 'Seq Scan', ...)
+    или сортирующие ('Sort'). Сортировка уже выбранной страницы над LIMIT не в счёт."""
+    sql, params = search.build_search_query(filters, search.has_work_search(conn))
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar_one()
+
+    # CTE p встраивается планировщиком: страница — поддерево первого Limit
+    def find_limit(node):
+        if node["Node Type"] == "Limit":
+            return node
+        for child in node.get("Plans", []):
+            found = find_limit(child)
+            if found is not None:
+                return found
+        return None
+
+    nodes: List[str] = []
+
+    def walk(node):
+        if node.get("Relation Name") == "works":
+            nodes.append(f"{node['Node Type']}:{node.get('Index Name', '')}".rstrip(":"))
+        elif "Sort" in node["Node Type"]:
+            nodes.append("Sort")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(find_limit(plan[0]["Plan"]))
+    return nodes
+
+
+@pytest.mark.parametrize("filters, index", [
+    (SearchFilters(), "ix_works_relevance_sort"),
+    (SearchFilters(sort_by="kudos"), "ix_works_likes_sort"),
+    (SearchFilters(sort_by="comments"), "ix_works_comments_sort"),
+    (SearchFilters(sort_by="popularity"), "ix_works_popularity_sort"),
+    (SearchFilters(sort_by="kudos", likes_min=4000), "ix_works_likes_sort"),
+    (SearchFilters(sort_by="kudos", sites=["authortoday"]), "ix_works_site_likes_sort"),
+    (SearchFilters(sort_by="updated", sites=["authortoday"]), "ix_works_site_updated_sort"),
+    (SearchFilters(sort_by="updated", status=["frozen"]), "ix_works_status_updated_sort"),
+    (SearchFilters(sort_by="updated", sort_order="asc", status=["frozen"]), "ix_works_status_updated_sort"),
+])
+def test_page_is_read_in_index_order(conn, filters, index):
+    assert _page_plan(conn, filters) == [f"Index Scan:{index}"]
+
+
+def test_cursor_page_seeks_into_composite_index(conn):
+    f = SearchFilters(sort_by="kudos", sites=["authortoday"], page_size=20)
+    sql, params = search.build_search_query(f, search.has_work_search(conn))
+    rows = conn.execute(text(sql), params).mappings().all()
+    next_page = f.model_copy(update={"cursor": search.encode_cursor(f, rows[19])})
+    assert _page_plan(conn, next_page) == ["Index Scan:ix_works_site_likes_sort"]
+
+
+def test_fuzzy_search_reads_trigram_index(conn):
+    f = SearchFilters(query="T12345", fuzzy=True)
+    sql, params = search.build_search_query(f, search.has_work_search(conn))
+    conn.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :t, true)"), {"t": search.fuzzy_threshold(f)})
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar_one()
+
+    indexes, works_nodes = set(), []
+
+    def walk(node):
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        if node.get("Relation Name") == "works":
+            works_nodes.append(node["Node Type"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    assert "idx_works_title_trgm_expr" in indexes
+    assert "Seq Scan" not in works_nodes
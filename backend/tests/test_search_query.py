@@ -0,0 +1,248 @@
+import asyncio
+import pytest
+from backend.api.app import search
+from backend.api.app.models import SearchFilters
+from backend.api.app.dictionaries import Term, Terms
+from backend.api.app.search import build_search_query, encode_cursor, decode_cursor, count_search_async, COUNT_EXACT_LIMIT, build_facets_query, known_total
+
+
+@pytest.fixture(autouse=True)
+def no_projection(monkeypatch):
+    monkeypatch.setattr(search, "_work_search_available", False)
+
+
+def terms(works=1000, **counts) -> Terms:
+    """Словарь тегов (и фандома "ГП") для фильтров: id — порядковый номер с 1."""
+    found = {("tag", name): Term(i, n) for i, (name, n) in enumerate(counts.items(), 1)}
+    found[("fandom", "ГП")] = Term(1, 10)
+    return Terms(works, found)
+
+
+def test_offset_mode_default():
+    sql, params = build_search_query(SearchFilters(page=3, page_size=10))
+    assert f"ORDER BY COALESCE(updated_at, {search.NO_DATE_SQL}) DESC, COALESCE(likes_count, 0) DESC, id DESC" in sql
+    assert params["offset"] == 20
+    # одна лишняя строка — признак следующей страницы
+    assert params["limit"] == 11
+    # связи подгружаются в том же запросе, только для строк страницы
+    assert "ARRAY(SELECT t.name FROM work_tags wt JOIN tags t ON t.id = wt.tag_id WHERE wt.work_id = p.id ORDER BY wt.position)" in sql
+    assert "LEFT JOIN authors a ON a.id = p.author_id" in sql
+
+
+def test_cursor_roundtrip_and_seek():
+    f = SearchFilters(sort_by="kudos", sort_order="asc", page_size=5)
+    cursor = encode_cursor(f, {"id": 42, "sort_key_0": 17})
+    assert decode_cursor(f, cursor) == ([17], 42)
+
+    sql, params = build_search_query(f.model_copy(update={"cursor": cursor, "page": 100}))
+    assert "(COALESCE(likes_count, 0), id) > (:cursor_0, :cursor_id)" in sql
+    assert params["cursor_0"] == 17 and params["cursor_id"] == 42
+    assert params["offset"] == 0
+
+
+def test_date_cursor_and_range_filters():
+    from datetime import date, datetime
+    from backend.parsers.dates import MSK
+
+    f = SearchFilters(sort_by="updated", date_updated_after=date(2024, 1, 1), date_updated_before=date(2024, 1, 31))
+    updated = datetime(2024, 1, 15, 12, 30, tzinfo=MSK)
+    cursor = encode_cursor(f, {"id": 7, "sort_key_0": updated})
+    assert decode_cursor(f, cursor) == ([updated], 7)
+
+    sql, params = build_search_query(f)
+    assert "updated_at >= :updated_at_from" in sql and "updated_at < :updated_at_to" in sql
+    # обе границы включительно: до начала следующего дня по Москве
+    assert params["updated_at_from"] == datetime(2024, 1, 1, tzinfo=MSK)
+    assert params["updated_at_to"] == datetime(2024, 2, 1, tzinfo=MSK)
+
+
+def test_cursor_for_other_sort_is_rejected():
+    cursor = encode_cursor(SearchFilters(sort_by="title"), {"id": 1, "sort_key_0": "a"})
+    with pytest.raises(ValueError):
+        build_search_query(SearchFilters(sort_by="kudos", cursor=cursor))
+    with pytest.raises(ValueError):
+        build_search_query(SearchFilters(cursor="not-a-cursor"))
+
+
+class _FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one(self):
+        return self.value
+
+
+class _FakeConn:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.sql = []
+
+    def execute(self, stmt, params=None):
+        self.sql.append(str(stmt))
+        return _FakeResult(self.values.pop(0))
+
+
+class _AsyncConn(_FakeConn):
+    async def execute(self, stmt, params=None):
+        return super().execute(stmt, params)
+
+
+def test_count_exact_below_limit():
+    conn = _AsyncConn(7)
+    assert asyncio.run(count_search_async(conn, SearchFilters(rating=["R"]))) == (7, True)
+    assert len(conn.sql) == 1
+
+
+def test_count_falls_back_to_planner_estimate():
+    plan = [{"Plan": {"Plan Rows": 250000}}]
+    conn = _AsyncConn(COUNT_EXACT_LIMIT + 1, plan)
+    assert asyncio.run(count_search_async(conn, SearchFilters())) == (250000, False)
+    assert conn.sql[1].startswith("EXPLAIN")
+
+
+def test_total_known_only_on_last_offset_page():
+    f = SearchFilters(page=3, page_size=20)
+    assert known_total(f, 3, 20, 7, has_more=False) == (47, True)
+    assert known_total(f, 3, 20, 20, has_more=True) is None
+    # страница дальше конца: строк нет, total нужно считать
+    assert known_total(SearchFilters(page=50, page_size=20), 50, 20, 0, has_more=False) is None
+    assert known_total(SearchFilters(), 1, 20, 0, has_more=False) == (0, True)
+    assert known_total(SearchFilters(cursor="c"), 1, 20, 3, has_more=False) is None
+
+
+def test_query_uses_tsvector_and_rank():
+    sql, params = build_search_query(SearchFilters(query="Гарри"))
+    assert "search_vector @@" in sql
+    assert "ORDER BY COALESCE(ts_rank_cd(search_vector" in sql
+    assert params["ts_q"] == "Гарри"
+    # search_vector не уходит клиенту
+    assert "works.*" not in sql
+
+
+def test_facets_reuse_filters_in_single_query():
+    sql, params = build_facets_query(SearchFilters(rating=["R", "NC-17"], tags=["AU"], page=4), terms=terms(AU=5))
+    assert sql.count("rating = ANY(:ratings)") == 1
+    assert "LIMIT :limit" not in sql
+    assert params["ratings"] == ["R", "NC-17"] and params["tags"] == [1]
+
+
+def test_projection_folds_relation_filters_into_array_predicates():
+    f = SearchFilters(tags=["AU"], fandoms=["ГП"], exclude_tags=["Драма"])
+    sql, params = build_search_query(f, use_projection=True, terms=terms(AU=5, Драма=3))
+    assert "work_tags wt WHERE wt.work_id = works.id AND" not in sql
+    assert sql.count("FROM work_search ws") == 1
+    assert "ws.tag_ids && CAST(:tags AS integer[])" in sql and params["tags"] == [1]
+    assert "NOT (ws.tag_ids && CAST(:exclude_tags AS integer[]))" in sql and params["exclude_tags"] == [2]
+    assert params["fandoms"] == [1]
+
+
+def test_unknown_terms_filter_by_ids():
+    known = terms(AU=5)
+    # "любое из": неизвестное значение выпадает из списка id
+    sql, params = build_search_query(SearchFilters(tags=["AU", "Нет такого"], exclude_tags=["Нет такого"]), terms=known)
+    assert "wt.tag_id = ANY(:tags)" in sql and params["tags"] == [1]
+    assert "exclude_tags" not in params and "NOT EXISTS" not in sql
+    # И по тегу, которого нет в словаре, — пустой результат без обращения к связям
+    sql, _ = build_search_query(SearchFilters(include_tags=["AU", "Нет такого"]), terms=known)
+    assert "WHERE FALSE" in sql and "work_tags wt0" not in sql
+    with pytest.raises(ValueError):
+        build_search_query(SearchFilters(tags=["AU"]))
+
+
+def test_stat_thresholds_and_popularity_sort():
+    sql, params = build_search_query(SearchFilters(likes_min=10, comments_min=2, sort_by="popularity", status=["completed"]))
+    assert "COALESCE(likes_count, 0) >= :likes_min" in sql and params["likes_min"] == 10
+    assert "COALESCE(comments_count, 0) >= :comments_min" in sql and params["comments_min"] == 2
+    assert "ORDER BY (COALESCE(likes_count, 0) + COALESCE(comments_count, 0)) DESC, id DESC" in sql
+    # одно значение — равенство, чтобы работал индекс (status, ключ сортировки, id)
+    assert "status = :statuses" in sql and params["statuses"] == "completed"
+    sql, params = build_search_query(SearchFilters(status=["completed", "frozen"], sites=["ficbook"]))
+    assert "status = ANY(:statuses)" in sql
+    assert "works.site_id = (SELECT s.id FROM sites s WHERE s.code = :site)" in sql
+
+
+def test_include_tags_all_leads_with_rarest_tag(monkeypatch):
+    monkeypatch.setattr(search, "TAG_CANDIDATES_MAX", 10)
+    f = SearchFilters(include_tags=["AU", "Редкий", "Драма", "AU"], exclude_tags=["Слэш"])
+    frequent = terms(AU=900, Драма=300, Редкий=200, Слэш=100)
+    sql, params = build_search_query(f, terms=frequent)
+    # ожидается ~54 совпадения > порога: полусоединения, первым — самый редкий тег
+    assert "works.id IN (SELECT wt0.work_id FROM work_tags wt0 WHERE wt0.tag_id = :include_tag_0)" in sql
+    assert "EXISTS (SELECT 1 FROM work_tags wt2 WHERE wt2.work_id = works.id AND wt2.tag_id = :include_tag_2)" in sql
+    # id тегов: Редкий=3, Драма=2, AU=1
+    assert [params[f"include_tag_{i}"] for i in range(3)] == [3, 2, 1]
+    assert "include_tag_3" not in params
+    # исключения — анти-соединение, без NOT IN
+    assert "NOT EXISTS (SELECT 1 FROM work_tags wt WHERE wt.work_id = works.id AND wt.tag_id = ANY(:exclude_tags))" in sql
+    assert "NOT IN" not in sql
+
+    sql, params = build_search_query(f.model_copy(update={"include_tags_mode": "any"}), terms=frequent)
+    assert "wt.tag_id = ANY(:include_tags)" in sql and "include_tag_0" not in params
+    assert params["include_tags"] == [1, 3, 2]
+
+
+def test_bounded_tag_match_is_collected_as_candidates(monkeypatch):
+    monkeypatch.setattr(search, "TAG_CANDIDATES_MAX", 100)
+    f = SearchFilters(include_tags=["AU", "Редкий"])
+    rare = terms(AU=900, Редкий=20)
+    sql, _ = build_search_query(f, terms=rare)
+    assert "works.id = ANY(ARRAY(SELECT wt0.work_id FROM work_tags wt0 WHERE wt0.tag_id = :include_tag_0 AND EXISTS" in sql
+
+    sql, params = build_search_query(f, use_projection=True, terms=rare)
+    assert "works.id = ANY(ARRAY(SELECT ws.work_id FROM work_search ws WHERE ws.tag_ids @> CAST(:include_tags AS integer[])))" in sql
+    assert params["include_tags"] == [1, 2]
+    sql, _ = build_search_query(f, use_projection=True, terms=terms(AU=900, Редкий=800))
+    assert "ws.tag_ids @> CAST(:include_tags AS integer[])" in sql and "ANY(ARRAY(" not in sql
+
+
+class _RowsResult(_FakeResult):
+    def all(self):
+        return self.value
+
+    def scalar(self):
+        return self.value
+
+
+class _LookupConn(_FakeConn):
+    def execute(self, stmt, params=None):
+        self.sql.append(str(stmt))
+        return _RowsResult(self.values.pop(0))
+
+
+def test_term_misses_are_not_cached(monkeypatch):
+    from backend.api.app import dictionaries
+    from backend.api.app.cache import TTLCache
+
+    monkeypatch.setattr(dictionaries, "_terms", TTLCache(maxsize=100, ttl=300))
+    conn = _LookupConn()
+    f = SearchFilters(tags=["AU", "Новый"])
+
+    conn.values = [[("tag", "AU", 1, 5)], 1000]
+    assert dictionaries.load(conn, f).found == {("tag", "AU"): Term(1, 5)}
+    # тег появился в словаре после первого запроса — второй запрос его видит
+    conn.values = [[("tag", "Новый", 2, 1)]]
+    assert dictionaries.load(conn, f).found == {("tag", "AU"): Term(1, 5), ("tag", "Новый"): Term(2, 1)}
+    assert len(conn.sql) == 3
+    # найденные значения кэшируются
+    assert dictionaries.load(conn, f).works == 1000 and len(conn.sql) == 3
+
+
+def test_fuzzy_mode_uses_trigram_operator_and_similarity():
+    from backend.api.app.fuzzy import expand_query
+
+    assert expand_query("Garri  Potter") == ["garri potter", "пфккш зщееук", "гарри поттер"]
+    assert expand_query("ufhhb gjnnth")[1] == "гарри поттер"
+    assert expand_query("Гарри", expand=False) == ["гарри"]
+
+    f = SearchFilters(query="Garri Potter", fuzzy=True, similarity_threshold=0.05)
+    sql, params = build_search_query(f)
+    # выражение индекса idx_works_title_trgm_expr, по оператору % на каждый вариант
+    assert "public.f_unaccent(lower(title)) % public.f_unaccent(:fuzzy_q2)" in sql and "ILIKE" not in sql
+    assert params["fuzzy_q2"] == "гарри поттер" and params["ts_q"] == "Garri Potter"
+    assert "ORDER BY GREATEST(GREATEST(similarity(public.f_unaccent(lower(title))" in sql
+    assert search.fuzzy_threshold(f) == str(search.FUZZY_MIN_THRESHOLD)
+    assert search.fuzzy_threshold(SearchFilters(query="x")) is None
+    # курсор одной сортировки не подходит к другой
+    cursor = encode_cursor(f, {"id": 1, "sort_key_0": 0.5, "sort_key_1": 3})
+    with pytest.raises(ValueError):
+        build_search_query(f.model_copy(update={"fuzzy": False, "cursor": cursor}))
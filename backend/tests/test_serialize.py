@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+
+from backend.api.app import chapters
+from backend.api.app.models import Author, Chapter, ChapterTocEntry, SearchResponse, Work
+from backend.api.app.serialize import chapter_dict, search_page_json, toc_dict
+from backend.parsers.dates import MSK
+
+ROWS = [
+    {
+        "id": 1, "title": "Зима", "summary": "Кратко", "language": "ru", "rating": "R", "status": "completed",
+        "word_count": 1200, "likes_count": 5, "comments_count": 0, "updated_at": datetime(2024, 1, 1, 12, 0, tzinfo=MSK),
+        "original_url": "https://ficbook.net/readfic/1", "author_id": 7, "author_name": "Автор",
+        "author_url": "https://ficbook.net/authors/7", "tags": ["AU"], "fandoms": ["ГП"], "warnings": [],
+    },
+    {
+        "id": 2, "title": "Без автора", "summary": None, "language": None, "rating": None, "status": None,
+        "word_count": None, "likes_count": None, "comments_count": None, "updated_at": None,
+        "original_url": None, "author_id": None, "author_name": None, "author_url": None,
+        "tags": None, "fandoms": ["Наруто"], "warnings": None,
+    },
+]
+
+
+def _old_work(r):
+    # так строки превращались в ответ до быстрого пути
+    return Work(
+        id=str(r["id"]),
+        title=r["title"],
+        authors=[Author(id=str(r["author_id"]) if r.get("author_id") else None, name=r.get("author_name") or "", url=r.get("author_url"))],
+        summary=r.get("summary") or "",
+        language=r.get("language"),
+        fandoms=list(r.get("fandoms") or []),
+        tags=list(r.get("tags") or []),
+        warnings=list(r.get("warnings") or []),
+        rating=r.get("rating"),
+        status=r.get("status"),
+        word_count=r.get("word_count"),
+        kudos_count=r.get("likes_count"),
+        comments_count=r.get("comments_count"),
+        updated_at=r.get("updated_at"),
+        url=r.get("original_url"),
+    )
+
+
+def test_search_page_json_matches_pydantic_output():
+    meta = dict(total=2, page=1, page_size=20, total_pages=1, total_exact=True, next_cursor=None)
+    old = SearchResponse(works=[_old_work(r) for r in ROWS], **meta).model_dump_json(exclude_none=True)
+    assert json.loads(search_page_json(ROWS, **meta)) == json.loads(old)
+
+
+def test_chapter_dict_matches_response_model():
+    row = {"id": 3, "work_id": 1, "chapter_number": 2, "title": None, "content_html": None}
+    old = Chapter(id="3", work_id="1", number=2, title=None, content="").model_dump()
+    assert chapter_dict(row) == old
+
+
+def test_toc_entry_from_upsert_metadata():
+    html = "<p>Привет, &laquo;мир&raquo;!</p><p>Глава-вторая</p>"
+    row = {"chapter_number": 1, "title": "Пролог", "word_count": chapters.word_count(html), "content_hash": chapters.content_hash(html)}
+    entry = toc_dict(row)
+    assert entry == ChapterTocEntry.model_validate(entry).model_dump()
+    assert entry["word_count"] == 4 and len(entry["content_hash"]) == 2 * chapters.HASH_BYTES
+    assert chapters.content_hash(html + " ") != row["content_hash"]
@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from backend.cli import similar_works as sw  # noqa: E402
+
+VOCAB = {
+    10: "Гарри Поттер Хогвартс волшебник палочка дракон Снейп Малфой зелье",
+    11: "ниндзя деревня листа Саске Какаши техника чакра клан",
+    12: "Геральт ведьмак Цири Йеннифэр чудовище меч контракт",
+}
+
+
+def _corpus():
+    rng = np.random.default_rng(0)
+    rows = []
+    for fandom, vocab in VOCAB.items():
+        words = vocab.split()
+        for _ in range(10):
+            rows.append((len(rows) + 1, None, " ".join(rng.choice(words, 8)), [1 + len(rows) % 3], [fandom]))
+    return rows
+
+
+def test_neighbours_share_fandom():
+    rows = _corpus()
+    ids, X = sw.featurize(rows)
+    model = sw.Model.fit(np.bincount(X.indices, minlength=sw.N_FEATURES), len(ids), X, dim=8)
+    E = model.embed(X)
+    model.fit_clusters(E, 3)
+    fandom = {r[0]: r[4][0] for r in rows}
+    result = list(sw.neighbours(ids, E, model.assign(E), model.probes(), k=3))
+    assert len(result) == len(rows)
+    for wid, n_ids, scores, _, _ in result:
+        assert wid not in n_ids
+        assert list(scores) == sorted(scores, reverse=True)
+        assert all(fandom[n] == fandom[wid] for n in n_ids)
+
+
+def test_model_roundtrip():
+    ids, X = sw.featurize(_corpus())
+    model = sw.Model.fit(np.bincount(X.indices, minlength=sw.N_FEATURES), len(ids), X, dim=4)
+    E = model.embed(X)
+    model.fit_clusters(E, 2)
+    restored = sw.Model.from_db(model.to_db())
+    assert np.allclose(restored.embed(X), E)
+    assert (restored.assign(E) == model.assign(E)).all()
+
+
+def test_merge_replaces_changed_scores():
+    # 7 изменилась: прежний score забыт, новый встаёт на своё место; 9 вошла впервые
+    ids, scores = sw.merge_neighbours([5, 7, 8], [0.9, 0.8, 0.7], {7, 9}, {7: 0.5, 9: 0.85}, k=3)
+    assert ids == [5, 9, 8]
+    assert scores == pytest.approx([0.9, 0.85, 0.7])
@@ -0,0 +1,217 @@
+"""
+Дубли и кросспосты: одна и та же работа на ficbook, Author.Today и AO3.
+
+- Текст глав без разметки режется на шинглы по DEDUP_SHINGLE слов. MinHash-подпись
+  из DEDUP_BANDS * DEDUP_ROWS хеш-функций: доля совпавших позиций двух подписей —
+  оценка сходства Жаккара множеств шинглов.
+- Подпись делится на DEDUP_BANDS полос по DEDUP_ROWS значений, хеш полосы —
+  LSH-корзина (minhash_buckets). Кандидаты в дубли — работы с общей корзиной:
+  DEDUP_BANDS индексных поисков вместо сравнения со всеми работами. Пара со
+  сходством s делит хотя бы одну корзину с вероятностью 1 - (1 - s^r)^b; при
+  20 полосах по 6 это 0.998 для s = 0.8, 0.27 для 0.5 и 0.014 для 0.3.
+- Кандидат — дубль, если оценка по подписям не ниже DEDUP_THRESHOLD.
+- Дубли собираются в кластер; каноническая работа — опубликованная раньше
+  остальных (при равенстве — меньший id). У остальных членов строка в
+  work_duplicates, поиск с collapse_duplicates их скрывает.
+- Upsert блокирует только корзины своей работы: параллельные нормализаторы ждут
+  друг друга, лишь если их работы — возможные дубли. Общая блокировка
+  work_duplicates — только на пересборку кластера, у работ с дублями.
+
+Вызывается из perform_upsert в его транзакции, когда в payload есть главы.
+"""
+import hashlib
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from ...api.app.chapters import plain_words
+
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "5"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "20"))
+DEDUP_ROWS = int(os.getenv("DEDUP_ROWS", "6"))
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# короче — не сравниваем: у пары коротких текстов высокое сходство ничего не значит
+DEDUP_MIN_SHINGLES = int(os.getenv("DEDUP_MIN_SHINGLES", "100"))
+
+N_HASHES = DEDUP_BANDS * DEDUP_ROWS
+# простое больше 2^32: (a*x + b) mod P — универсальное семейство над 32-битными хешами шинглов
+_P = np.uint64(4294967311)
+_rng = np.random.default_rng(20240501)
+# a < 2^31: a*x + b не переполняет uint64
+_A = _rng.integers(1, 1 << 31, N_HASHES, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, N_HASHES, dtype=np.uint64)
+# сколько хеш-функций за раз: матрица (функции × шинглы) в памяти
+_CHUNK = 8
+_MASK = np.uint64(0xFFFFFFFF)
+
+_LOCK_KEY = "work_duplicates"
+
+
+def words(chapters_html: Iterable[str]) -> List[str]:
+    """Слова текста без разметки, в нижнем регистре, ё = е."""
+    return [w.lower().replace("ё", "е") for chunk in chapters_html for w in plain_words(chunk)]
+
+
+def shingles(tokens: List[str], size: int = DEDUP_SHINGLE) -> np.ndarray:
+    """32-битные хеши уникальных шинглов из size слов подряд."""
+    if len(tokens) < size:
+        return np.zeros(0, dtype=np.uint64)
+    h = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+    window = np.lib.stride_tricks.sliding_window_view(h, size)
+    # полиномиальный хеш окна по модулю 2^32; uint64 переполняется по модулю 2^64 — младшие биты верны
+    acc = np.zeros(len(window), dtype=np.uint64)
+    for i in range(size):
+        acc = acc * np.uint64(1000003) + window[:, i]
+    return np.unique(acc & _MASK)
+
+
+def signature(hashes: np.ndarray) -> np.ndarray:
+    """MinHash-подпись: минимум каждой хеш-функции по шинглам, uint32[N_HASHES]."""
+    sig = np.empty(N_HASHES, dtype=np.uint32)
+    for start in range(0, N_HASHES, _CHUNK):
+        a, b = _A[start:start + _CHUNK, None], _B[start:start + _CHUNK, None]
+        # значения mod P бывают больше 2^32 - 1 (на 15) — маска их почти не смещает
+        sig[start:start + _CHUNK] = (((a * hashes[None, :] + b) % _P) & _MASK).min(axis=1)
+    return sig
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Оценка сходства Жаккара по двум подписям."""
+    return float(np.mean(a == b))
+
+
+def buckets(sig: np.ndarray) -> List[int]:
+    """LSH-корзины по полосам подписи: bigint со знаком, по одной на полосу."""
+    bands = sig.reshape(DEDUP_BANDS, DEDUP_ROWS)
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "little", signed=True)
+        for band in bands
+    ]
+
+
+def _clusters(conn: Connection, ids: List[int]) -> Dict[int, int]:
+    """{работа: каноническая} для всех членов кластеров, в которые входят ids.
+    Работа вне кластера — сама себе каноническая."""
+    return dict(conn.execute(text("""
+        WITH c AS (
+            SELECT DISTINCT coalesce(d.canonical_id, t.id) AS canonical_id
+            FROM unnest(CAST(:ids AS integer[])) AS t(id)
+            LEFT JOIN work_duplicates d ON d.work_id = t.id
+        )
+        SELECT d.work_id, d.canonical_id FROM work_duplicates d JOIN c USING (canonical_id)
+        UNION ALL
+        SELECT canonical_id, canonical_id FROM c
+    """), {"ids": ids}).all())
+
+
+def _canonical(conn: Connection, members: Set[int]) -> int:
+    return conn.execute(text("""
+        SELECT id FROM works WHERE id = ANY(:ids) ORDER BY published_at NULLS LAST, id LIMIT 1
+    """), {"ids": sorted(members)}).scalar_one()
+
+
+def _find_duplicates(conn: Connection, work_id: int, sig: np.ndarray, bucket_ids: List[int]) -> List[int]:
+    candidates = conn.execute(text("""
+        SELECT m.work_id, m.signature FROM work_minhash m
+        WHERE m.work_id IN (
+            SELECT b.work_id FROM minhash_buckets b
+            JOIN unnest(CAST(:bands AS smallint[]), CAST(:buckets AS bigint[])) AS q(band, bucket)
+              ON b.band = q.band AND b.bucket = q.bucket
+            WHERE b.work_id <> :wid
+        )
+    """), {"wid": work_id, "bands": list(range(DEDUP_BANDS)), "buckets": bucket_ids}).all()
+    return [
+        cid for cid, raw in candidates
+        if len(raw) == sig.nbytes and similarity(sig, np.frombuffer(raw, dtype=np.uint32)) >= DEDUP_THRESHOLD
+    ]
+
+
+def _lock_buckets(conn: Connection, work_id: int, bucket_ids: List[int]) -> None:
+    """Блокировки до конца транзакции на корзины работы — прежние и новые.
+    Кандидаты в дубли — работы с общей корзиной, поэтому ждут друг друга только
+    возможные дубли: две копии, пришедшие одновременно, иначе не увидели бы
+    корзины друг друга. По возрастанию ключа — без взаимоблокировок."""
+    old = conn.execute(text("SELECT bucket FROM minhash_buckets WHERE work_id = :wid"), {"wid": work_id}).scalars()
+    keys = sorted({*old, *bucket_ids})
+    if keys:
+        # unnest отдаёт элементы в порядке массива
+        conn.execute(text("SELECT pg_advisory_xact_lock(k) FROM unnest(CAST(:keys AS bigint[])) AS k"), {"keys": keys})
+
+
+def update_work(conn: Connection, work_id: int, chapters_html: Iterable[str]) -> Set[int]:
+    """Пересчитывает подпись работы и её кластер дублей.
+    Возвращает id других работ, у которых сменилась каноническая (или они вышли
+    из кластера / вошли в него) — их выдача с collapse_duplicates изменилась."""
+    # шинглы и подпись — до блокировок: это основная работа процессора
+    hashes = shingles(words(chapters_html))
+    sig = signature(hashes) if len(hashes) >= DEDUP_MIN_SHINGLES else None
+    bucket_ids = buckets(sig) if sig is not None else []
+    _lock_buckets(conn, work_id, bucket_ids)
+    conn.execute(text("DELETE FROM minhash_buckets WHERE work_id = :wid"), {"wid": work_id})
+    duplicates: List[int] = []
+    if sig is None:
+        conn.execute(text("DELETE FROM work_minhash WHERE work_id = :wid"), {"wid": work_id})
+    else:
+        conn.execute(text("""
+            INSERT INTO work_minhash (work_id, signature, shingles) VALUES (:wid, :sig, :n)
+            ON CONFLICT (work_id) DO UPDATE SET signature = EXCLUDED.signature, shingles = EXCLUDED.shingles
+        """), {"wid": work_id, "sig": sig.tobytes(), "n": len(hashes)})
+        conn.execute(text("""
+            INSERT INTO minhash_buckets (band, bucket, work_id)
+            SELECT DISTINCT q.band, q.bucket, :wid
+            FROM unnest(CAST(:bands AS smallint[]), CAST(:buckets AS bigint[])) AS q(band, bucket)
+        """), {"wid": work_id, "bands": list(range(DEDUP_BANDS)), "buckets": bucket_ids})
+        duplicates = _find_duplicates(conn, work_id, sig, bucket_ids)
+    in_cluster = conn.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM work_duplicates WHERE work_id = :wid OR canonical_id = :wid)
+    """), {"wid": work_id}).scalar_one()
+    if not duplicates and not in_cluster:
+        return set()
+    # кластер шире корзин работы (дубли дублей) — его пересборка под общей блокировкой.
+    # Её берут только работы с дублями, и всегда после блокировок корзин
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": _LOCK_KEY})
+    return _regroup(conn, work_id, duplicates)
+
+
+def _regroup(conn: Connection, work_id: int, duplicates: List[int]) -> Set[int]:
+    before = _clusters(conn, [work_id, *duplicates])
+    # новый кластер работы — она, её дубли и их кластеры целиком;
+    # прежние соседи, которые больше не дубли, остаются кластером без неё
+    joined = {before[d] for d in duplicates}
+    merged = {m for m, c in before.items() if c in joined} | {work_id}
+    left = {m for m, c in before.items() if c == before[work_id]} - merged
+    after: Dict[int, int] = {m: m for m in before}
+    for members in (merged, left):
+        if len(members) > 1:
+            canonical = _canonical(conn, members)
+            after.update({m: canonical for m in members})
+    if after == before:
+        return set()
+    ids = sorted(before)
+    conn.execute(text("DELETE FROM work_duplicates WHERE work_id = ANY(:ids)"), {"ids": ids})
+    rows = [(m, c) for m, c in after.items() if m != c]
+    if rows:
+        conn.execute(text("""
+            INSERT INTO work_duplicates (work_id, canonical_id)
+            SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:canonical AS integer[]))
+        """), {"ids": [m for m, _ in rows], "canonical": [c for _, c in rows]})
+    return {m for m in before if after[m] != before[m]} - {work_id}
+
+
+def search_scopes(conn: Connection, work_ids: Set[int]) -> List[Tuple[Optional[str], List[str]]]:
+    """(код сайта, фандомы) работ — для bump_search_versions после коммита."""
+    if not work_ids:
+        return []
+    return [(site, list(fandoms)) for site, fandoms in conn.execute(text("""
+        SELECT s.code, coalesce(array_agg(DISTINCT f.name) FILTER (WHERE f.name IS NOT NULL), '{}')
+        FROM works w
+        JOIN sites s ON s.id = w.site_id
+        LEFT JOIN work_fandoms wf ON wf.work_id = w.id
+        LEFT JOIN fandoms f ON f.id = wf.fandom_id
+        WHERE w.id = ANY(:ids)
+        GROUP BY s.code
+    """), {"ids": sorted(work_ids)}).all()]
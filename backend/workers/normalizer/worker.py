@@ -1,9 +1,16 @@
-from typing import Dict, Any, List
-from sqlalchemy import select
+import logging
+from typing import Dict, Any
+from sqlalchemy import select, text, func
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from ..celery_app import app
 from ...api.db.session import SessionLocal
 from ...api.db import models as dbm
+from ...api.app import chapters, dictionaries, etags
+from ...api.app.cache import bump_search_versions
+from ...parsers.dates import parse_ru_datetime
+from . import dedup
+
+log = logging.getLogger(__name__)
 
 
 def perform_upsert(payload: Dict[str, Any]) -> str:
@@ -28,7 +35,7 @@ def perform_upsert(payload: Dict[str, Any]) -> str:
 
         # work upsert по (site_id, original_url)
         key_site_work = (site.id, payload.get("original_url") or payload.get("id") or "")
-        stmt = pg_insert(dbm.Work.__table__).values(
+        fields = dict(
             site_work_id=key_site_work[1],
             site_id=site.id,
             title=payload.get("title") or "",
@@ -40,54 +47,145 @@ def perform_upsert(payload: Dict[str, Any]) -> str:
             word_count=int(payload.get("word_count") or 0),
             likes_count=payload.get("likes_count"),
             comments_count=payload.get("comments_count"),
-            published_at=payload.get("published_at"),
-            updated_at=payload.get("updated_at"),
+            # парсеры присылают ISO 8601; старые payload — текст со страницы
+            published_at=parse_ru_datetime(payload.get("published_at")),
+            updated_at=parse_ru_datetime(payload.get("updated_at")),
             original_url=payload.get("original_url"),
             author_id=author.id,
-        ).on_conflict_do_update(
+        )
+        ins = pg_insert(dbm.Work.__table__).values(**fields, changed_at=func.now())
+        stmt = ins.on_conflict_do_update(
             index_elements=[dbm.Work.site_id, dbm.Work.site_work_id],
             set_={
-                "title": pg_insert.excluded.title,
-                "summary": pg_insert.excluded.summary,
-                "language": pg_insert.excluded.language,
-                "rating": pg_insert.excluded.rating,
-                "category": pg_insert.excluded.category,
-                "status": pg_insert.excluded.status,
-                "word_count": pg_insert.excluded.word_count,
-                "likes_count": pg_insert.excluded.likes_count,
-                "comments_count": pg_insert.excluded.comments_count,
-                "updated_at": pg_insert.excluded.updated_at,
-                "original_url": pg_insert.excluded.original_url,
-                "author_id": pg_insert.excluded.author_id,
+                "title": ins.excluded.title,
+                "summary": ins.excluded.summary,
+                "language": ins.excluded.language,
+                "rating": ins.excluded.rating,
+                "category": ins.excluded.category,
+                "status": ins.excluded.status,
+                "word_count": ins.excluded.word_count,
+                "likes_count": ins.excluded.likes_count,
+                "comments_count": ins.excluded.comments_count,
+                "updated_at": ins.excluded.updated_at,
+                "original_url": ins.excluded.original_url,
+                "author_id": ins.excluded.author_id,
+                "changed_at": ins.excluded.changed_at,
             },
         ).returning(dbm.Work.id)
         work_id = db.execute(stmt).scalar_one()
 
-        # связки
-        def replace_rel(table, column, values: List[str]):
-            db.execute(table.__table__.delete().where(table.work_id == work_id))
-            for v in values:
-                if v:
-                    db.add(table(work_id=work_id, **{column: v}))
+        # связки: имена -> id словаря (intern), строки (work_id, id, позиция).
+        # Возвращает прежние значения {имя: id} — для пересчёта частот и инвалидации кэша
+        conn = db.connection()
+
+        def replace_rel(kind: str, table: str, column: str, ids: Dict[str, int]) -> Dict[str, int]:
+            old = dict(db.execute(text(f"""
+                DELETE FROM {table} r USING {dictionaries.KINDS[kind]} d
+                WHERE r.work_id = :wid AND d.id = r.{column}
+                RETURNING d.name, d.id
+            """), {"wid": work_id}).all())
+            if ids:
+                db.execute(text(f"""
+                    INSERT INTO {table} (work_id, {column}, position)
+                    SELECT :wid, t.id, t.position FROM unnest(CAST(:ids AS integer[])) WITH ORDINALITY AS t(id, position)
+                """), {"wid": work_id, "ids": list(ids.values())})
+            return old
+
+        fandom_ids = dictionaries.intern(conn, "fandom", payload.get("fandoms") or [])
+        tag_ids = dictionaries.intern(conn, "tag", payload.get("tags") or [])
+        warning_ids = dictionaries.intern(conn, "warning", payload.get("warnings") or [])
+        old_fandoms = replace_rel("fandom", "work_fandoms", "fandom_id", fandom_ids)
+        old_tags = replace_rel("tag", "work_tags", "tag_id", tag_ids)
+        old_warnings = replace_rel("warning", "work_warnings", "warning_id", warning_ids)
+
+        # Частоты в словарях — дельтой ±1 только по значениям, которые у работы
+        # появились или пропали: без count(*) по связям и без блокировки строк
+        # популярных значений, если набор не изменился
+        def shift_counts(kind: str, old: Dict[str, int], new: Dict[str, int]):
+            delta = {i: 1 for i in set(new.values()) - set(old.values())}
+            delta.update({i: -1 for i in set(old.values()) - set(new.values())})
+            if not delta:
+                return
+            ids = sorted(delta)
+            db.execute(text(f"""
+                UPDATE {dictionaries.KINDS[kind]} d SET usage_count = greatest(d.usage_count + t.delta, 0)
+                FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS integer[])) AS t(id, delta)
+                WHERE d.id = t.id
+            """), {"ids": ids, "deltas": [delta[i] for i in ids]})
 
-        replace_rel(dbm.WorkFandom, "fandom", payload.get("fandoms") or [])
-        replace_rel(dbm.WorkTag, "tag", payload.get("tags") or [])
-        replace_rel(dbm.WorkWarning, "warning", payload.get("warnings") or [])
+        shift_counts("fandom", old_fandoms, fandom_ids)
+        shift_counts("tag", old_tags, tag_ids)
+        shift_counts("warning", old_warnings, warning_ids)
+
+        # проекция для фильтров поиска — в той же транзакции, что и связки
+        ws = pg_insert(dbm.WorkSearch.__table__).values(
+            work_id=work_id,
+            tag_ids=list(tag_ids.values()),
+            fandom_ids=list(fandom_ids.values()),
+            warning_ids=list(warning_ids.values()),
+        )
+        db.execute(ws.on_conflict_do_update(
+            index_elements=[dbm.WorkSearch.work_id],
+            set_={"tag_ids": ws.excluded.tag_ids, "fandom_ids": ws.excluded.fandom_ids, "warning_ids": ws.excluded.warning_ids},
+        ))
 
         # главы
         chs = payload.get("chapters") or []
+        dedup_scopes = []
         if chs:
             db.execute(dbm.Chapter.__table__.delete().where(dbm.Chapter.work_id == work_id))
+            bodies = {}
             for ch in chs:
+                content_html = ch.get("content_html") or ""
+                content_hash = chapters.content_hash(content_html)
+                bodies[content_hash] = content_html
                 db.add(dbm.Chapter(
                     work_id=work_id,
                     chapter_number=int(ch.get("chapter_number") or 1),
                     title=ch.get("title"),
-                    content_html=ch.get("content_html") or "",
+                    word_count=chapters.word_count(content_html),
+                    content_hash=content_hash,
                 ))
+            # текст — сжатым в chapter_bodies; не изменившиеся главы уже там
+            chapters.store_bodies(conn, bodies)
+            # дубли и кросспосты: у работ, сменивших каноническую, поменялась выдача collapse_duplicates
+            regrouped = dedup.update_work(conn, work_id, (ch.get("content_html") or "" for ch in chs))
+            dedup_scopes = dedup.search_scopes(conn, regrouped)
+
+        # версия для ETag: карточка, связки и оглавление (главы из payload или прежние).
+        # modified_at сдвигается, только если версия изменилась
+        db.flush()
+        toc = db.execute(text(
+            "SELECT chapter_number, title, content_hash FROM chapters WHERE work_id = :id ORDER BY chapter_number"
+        ), {"id": work_id}).all()
+        version = etags.work_version(fields, fandom_ids, tag_ids, warning_ids, toc)
+
+        # поисковый вектор зависит от автора и тегов/фандомов — пересобираем после связок.
+        # o — строка до UPDATE: изменилась ли версия
+        changed = db.execute(text("""
+            UPDATE works w SET search_vector = public.works_search_vector(w.id),
+                               modified_at = CASE WHEN w.version_hash IS DISTINCT FROM :version THEN now() ELSE w.modified_at END,
+                               version_hash = :version
+            FROM (SELECT id, version_hash FROM works WHERE id = :id) o
+            WHERE w.id = o.id
+            RETURNING o.version_hash IS DISTINCT FROM :version
+        """), {"id": work_id, "version": version}).scalar_one()
+        # версия покрывает карточку, связки и оглавление (site_id — в карточке); перезалив
+        # без правок не сдвигает поколения кэша поиска — иначе общее поколение росло бы
+        # с частотой обхода и длинный TTL не работал бы
+        changed = changed or set(old_fandoms) != set(fandom_ids)
 
         db.commit()
-        return str(work_id)
+
+    # после коммита: иначе пересчёт под новой версией мог бы прочитать старые данные
+    try:
+        if changed:
+            bump_search_versions(site_code, [*old_fandoms, *fandom_ids])
+        for scope_site, scope_fandoms in dedup_scopes:
+            bump_search_versions(scope_site, scope_fandoms)
+    except Exception:
+        log.exception("failed to bump search cache versions for work %s", work_id)
+    return str(work_id)
 
 
 @app.task(name="normalize.upsert_work")
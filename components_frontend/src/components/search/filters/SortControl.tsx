@@ -24,6 +24,7 @@ export function SortControl({ sortBy, sortOrder, onSortByChange, onSortOrderChan
     { value: "created", label: "Date Created" },
     { value: "title", label: "Title" },
     { value: "kudos", label: "Kudos" },
+    { value: "popularity", label: "Popularity" },
     { value: "word_count", label: "Word Count" },
   ]
 
@@ -13,6 +13,7 @@ import re
 import time
 import requests
 from .schemas import ParsedWork
+from backend.parsers.dates import normalize_date
 
 
 def extract_text(el):
@@ -138,10 +139,11 @@ def parse_authortoday_html(html: str, url: str) -> Dict[str, Any]:
                     word_count = int(m.group(1))
 
     # Дата обновления
-    updated_at = ""
+    updated_at = None
     date_elem = soup.select_one(".updated-date, .last-update, .date")
     if date_elem:
-        updated_at = extract_text(date_elem)
+        # машинное время в атрибуте точнее подписи ("вчера в 18:05")
+        updated_at = normalize_date(date_elem.get("data-time") or date_elem.get("datetime") or extract_text(date_elem))
 
     # Фандомы
     fandoms: List[str] = []
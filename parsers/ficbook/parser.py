@@ -13,6 +13,7 @@ import re
 import time
 import requests
 from .schemas import ParsedWork
+from backend.parsers.dates import normalize_date
 
 
 def extract_text(el):
@@ -80,7 +81,7 @@ def parse_ficbook_html(html: str, url: str) -> Dict[str, Any]:
         if m:
             word_count = int(m.group(1).replace(" ", ""))
 
-    updated_at = parse_meta_dd(soup, "Обновлено")
+    updated_at = normalize_date(parse_meta_dd(soup, "Обновлено"))
 
     fandoms: List[str] = []
     for a in soup.select(".tags a[data-entity='fandom'], a[href*='/fanfiction']"):